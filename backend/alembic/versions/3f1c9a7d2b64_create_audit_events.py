@@ -0,0 +1,60 @@
+"""create_audit_events
+
+Revision ID: 3f1c9a7d2b64
+Revises: e8c5dfb0756d
+Create Date: 2026-10-19 16:02:37.118204
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b64'
+down_revision: Union[str, None] = 'e8c5dfb0756d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# months of partitions created up front; app.jobs.audit_partitions keeps adding them
+INITIAL_MONTHS = 12
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    # declarative partitioning is not expressible through op.create_table
+    op.execute("""
+        CREATE TABLE audit_events (
+            id UUID NOT NULL,
+            occurred_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            actor_id VARCHAR(255) NOT NULL,
+            actor_role VARCHAR(20),
+            action VARCHAR(50) NOT NULL,
+            patient_id VARCHAR(255),
+            document_id INTEGER,
+            ip_address VARCHAR(45),
+            PRIMARY KEY (id, occurred_at)
+        ) PARTITION BY RANGE (occurred_at)
+    """)
+    op.create_index('ix_audit_events_patient_id_occurred_at', 'audit_events', ['patient_id', 'occurred_at'])
+    op.create_index('ix_audit_events_actor_id_occurred_at', 'audit_events', ['actor_id', 'occurred_at'])
+    # catches anything outside the monthly ranges, so inserts never fail for lack of a partition
+    op.execute("CREATE TABLE audit_events_default PARTITION OF audit_events DEFAULT")
+    start = date.today().replace(day=1)
+    for i in range(INITIAL_MONTHS):
+        month = _add_months(start, i)
+        op.execute(
+            f"CREATE TABLE audit_events_y{month:%Y}m{month:%m} PARTITION OF audit_events "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+
+
+def downgrade() -> None:
+    # dropping the parent drops every partition
+    op.drop_table('audit_events')
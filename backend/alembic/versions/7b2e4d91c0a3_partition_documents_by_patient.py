@@ -0,0 +1,70 @@
+"""partition_documents_by_patient
+
+Revision ID: 7b2e4d91c0a3
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-19 17:21:05.630418
+
+Rebuilds documents as a table hash-partitioned by patient_id. Every route
+reads documents for one patient at a time, so each query lands in a single
+partition and vacuum, index maintenance and cache footprint are per
+partition instead of per table.
+
+The copy runs in the migration's transaction under an ACCESS EXCLUSIVE lock,
+so writes to documents wait for it: on a large table, run it in a
+maintenance window. DOCUMENT_PARTITIONS (default 16) is fixed once migrated;
+changing it means running this rebuild again.
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4d91c0a3'
+down_revision: Union[str, None] = '3f1c9a7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DOCUMENT_PARTITIONS = int(os.getenv("DOCUMENT_PARTITIONS", 16))
+
+
+def _rebuild(partitioned: bool) -> None:
+    op.execute("LOCK TABLE documents IN ACCESS EXCLUSIVE MODE")
+    # LIKE keeps columns, NOT NULLs, defaults (the id sequence) and checks;
+    # keys and indexes are added back once the rows are in
+    op.execute(
+        "CREATE TABLE documents_new (LIKE documents INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        + (" PARTITION BY HASH (patient_id)" if partitioned else "")
+    )
+    if partitioned:
+        for remainder in range(DOCUMENT_PARTITIONS):
+            op.execute(
+                f"CREATE TABLE documents_p{remainder:02d} PARTITION OF documents_new "
+                f"FOR VALUES WITH (MODULUS {DOCUMENT_PARTITIONS}, REMAINDER {remainder})"
+            )
+    op.execute("INSERT INTO documents_new SELECT * FROM documents")
+    # the sequence would be dropped with the old table otherwise
+    op.execute("ALTER SEQUENCE documents_id_seq OWNED BY documents_new.id")
+    op.drop_table('documents')
+    op.rename_table('documents_new', 'documents')
+
+    # a partitioned table's unique keys must include the partition key
+    op.create_primary_key('documents_pkey', 'documents', ['id', 'patient_id'] if partitioned else ['id'])
+    op.create_foreign_key('documents_patient_id_fkey', 'documents', 'users', ['patient_id'], ['auth0_user_id'])
+    op.create_foreign_key('documents_uploaded_by_id_fkey', 'documents', 'users', ['uploaded_by_id'], ['auth0_user_id'])
+    op.create_index(op.f('ix_documents_patient_id'), 'documents', ['patient_id'], unique=False)
+    op.create_index(op.f('ix_documents_uploaded_by_id'), 'documents', ['uploaded_by_id'], unique=False)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    _rebuild(partitioned=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    _rebuild(partitioned=False)
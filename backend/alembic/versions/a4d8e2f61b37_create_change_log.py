@@ -0,0 +1,39 @@
+"""create_change_log
+
+Revision ID: a4d8e2f61b37
+Revises: 7b2e4d91c0a3
+Create Date: 2026-10-19 18:40:52.215873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8e2f61b37'
+down_revision: Union[str, None] = '7b2e4d91c0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('change_log',
+    sa.Column('seq', sa.BigInteger(), nullable=False),
+    sa.Column('occurred_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('patient_id', sa.String(length=255), nullable=False),
+    sa.Column('doctor_id', sa.String(length=255), nullable=True),
+    sa.Column('document_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_index('ix_change_log_patient_id_seq', 'change_log', ['patient_id', 'seq'], unique=False)
+    op.create_index('ix_change_log_doctor_id_seq', 'change_log', ['doctor_id', 'seq'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_change_log_doctor_id_seq', table_name='change_log')
+    op.drop_index('ix_change_log_patient_id_seq', table_name='change_log')
+    op.drop_table('change_log')
@@ -0,0 +1,35 @@
+"""add_file_info_to_documents
+
+Revision ID: c5e19b7a3d20
+Revises: a4d8e2f61b37
+Create Date: 2026-10-19 21:12:37.604219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e19b7a3d20'
+down_revision: Union[str, None] = 'a4d8e2f61b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Nullable without defaults, so adding them rewrites no rows; on the
+# partitioned table they are added to every partition. Existing documents are
+# filled in by app.jobs.backfill_file_info.
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('documents', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.add_column('documents', sa.Column('detected_content_type', sa.String(length=100), nullable=True))
+    op.add_column('documents', sa.Column('page_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('documents', 'page_count')
+    op.drop_column('documents', 'detected_content_type')
+    op.drop_column('documents', 'sha256')
+    op.drop_column('documents', 'size_bytes')
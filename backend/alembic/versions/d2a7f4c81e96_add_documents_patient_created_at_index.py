@@ -0,0 +1,30 @@
+"""add_documents_patient_created_at_index
+
+Revision ID: d2a7f4c81e96
+Revises: c5e19b7a3d20
+Create Date: 2026-10-19 21:48:19.331742
+
+Backs the doctors' recent uploads feed: per patient, documents newest first,
+with id as the tie-breaker of the keyset cursor. On the partitioned table the
+index is built on every partition; Postgres cannot build it CONCURRENTLY
+there, so writes to documents wait while it is created.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a7f4c81e96'
+down_revision: Union[str, None] = 'c5e19b7a3d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_documents_patient_id_created_at_id', 'documents', ['patient_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_documents_patient_id_created_at_id', table_name='documents')
@@ -0,0 +1,28 @@
+"""add_updated_at_to_documents
+
+Revision ID: e8c5dfb0756d
+Revises: 88cb61d1df10
+Create Date: 2026-10-19 14:45:12.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c5dfb0756d'
+down_revision: Union[str, None] = '88cb61d1df10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    # existing rows were last touched no later than their creation as far as we know
+    op.execute("UPDATE documents SET updated_at = created_at")
+
+
+def downgrade() -> None:
+    op.drop_column('documents', 'updated_at')
@@ -0,0 +1,45 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core import bulkheads
+from app.core.lifespan import check_readiness
+from app.core.metrics import render_latest
+
+# Operational endpoints, mounted at the root rather than under /api
+
+OPS_TOKEN = os.getenv("OPS_TOKEN")
+
+router = APIRouter(tags=["ops"])
+
+# when OPS_TOKEN is set, internal endpoints require it in X-Ops-Token
+def require_ops_token(x_ops_token: Optional[str] = Header(None)):
+    if OPS_TOKEN and not hmac.compare_digest(x_ops_token or "", OPS_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid ops token")
+
+# thread pool occupancy per bulkhead
+@router.get("/ops/bulkheads", dependencies=[Depends(require_ops_token)])
+async def get_bulkheads():
+    return bulkheads.snapshot()
+
+# Prometheus text exposition for this worker process
+@router.get("/metrics", dependencies=[Depends(require_ops_token)], response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
+
+# liveness: the process is up and serving; deliberately checks nothing else
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# readiness: every dependency answers, with the latency of each check
+@router.get("/readyz")
+async def readyz():
+    checks = await check_readiness()
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "unavailable", "checks": checks},
+        status_code=200 if ready else 503,
+        headers={"Cache-Control": "no-store"},
+    )
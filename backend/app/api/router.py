@@ -2,9 +2,13 @@ from fastapi import APIRouter
 from app.api.auth import router as auth_router
 from app.api.routes.doctors import router as doctors_router
 from app.api.routes.patients import router as patients_router
+from app.api.routes.audit import router as audit_router
+from app.api.routes.events import router as events_router
 
 router = APIRouter()
 
 router.include_router(auth_router, tags=["auth"])
 router.include_router(doctors_router, tags=["doctors"])
 router.include_router(patients_router, tags=["patients"])
+router.include_router(audit_router, tags=["audit"])
+router.include_router(events_router, tags=["events"])
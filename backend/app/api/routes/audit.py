@@ -0,0 +1,65 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from app.core.permissions import require_permission
+from app.db import get_db
+from app.models.models import AuditEvent
+from app.api.schemas import AuditEventPageOut
+from app.core.responses import model_response
+from app.core.bulkheads import bulkhead
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+DEFAULT_WINDOW = timedelta(days=30)
+
+def encode_cursor(event: AuditEvent) -> str:
+    raw = f"{event.occurred_at.isoformat()}|{event.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        occurred_at, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(occurred_at), uuid.UUID(event_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# page through audit events, newest first. `since` defaults to the last 30 days
+# so Postgres only scans the matching monthly partitions
+@router.get("/events", response_model=AuditEventPageOut)
+@bulkhead("db")
+def list_audit_events(
+    patient_id: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    user = Depends(require_permission("read:audit")),
+    db: Session = Depends(get_db)
+):
+    if since is None:
+        since = datetime.utcnow() - DEFAULT_WINDOW
+    query = select(AuditEvent).where(AuditEvent.occurred_at >= since)
+    if until is not None:
+        query = query.where(AuditEvent.occurred_at < until)
+    if patient_id is not None:
+        query = query.where(AuditEvent.patient_id == patient_id)
+    if actor_id is not None:
+        query = query.where(AuditEvent.actor_id == actor_id)
+    if action is not None:
+        query = query.where(AuditEvent.action == action)
+    if cursor is not None:
+        # keyset: strictly older than the last event of the previous page
+        query = query.where(tuple_(AuditEvent.occurred_at, AuditEvent.id) < tuple_(*decode_cursor(cursor)))
+
+    events = db.execute(
+        query.order_by(AuditEvent.occurred_at.desc(), AuditEvent.id.desc()).limit(limit + 1)
+    ).scalars().all()
+    next_cursor = encode_cursor(events[limit - 1]) if len(events) > limit else None
+    return model_response(AuditEventPageOut, {"events": events[:limit], "next_cursor": next_cursor})
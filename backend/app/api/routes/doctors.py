@@ -1,33 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, File, UploadFile
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Form, File, UploadFile, Query, Request
+from sqlalchemy import func, select, true, tuple_
+from sqlalchemy.orm import Session, aliased
 from app.core.permissions import require_role
 from app.services.checkUser import check_user
 from app.db import get_db
 from app.models.models import User, Document
-from app.services.s3 import upload_file, generate_presigned_url, delete_file, S3_BUCKET_NAME
-from typing import Optional
+from app.services.s3 import upload_file, generate_presigned_url, delete_file, delete_files, S3_BUCKET_NAME
+from app.services.download import build_download_response
+from app.api.schemas import PatientOut, PatientDetailOut, PatientRecordOut, DoctorOut, DocumentOut, UploadedDocumentOut, RecentDocumentOut, RecentDocumentsPageOut, BatchUploadOut, PreviewUrlOut, DocumentChangesOut, PatientChangesOut
+from app.core.responses import model_response
+from app.core.bulkheads import bulkhead
+from app.core.http_cache import weak_etag, cache_headers, check_not_modified
+from app.core.fields import FIELDS_QUERY, parse_fields, sparse_schema, load_fields, fields_tag
+from app.services.versions import documents_version, patients_version
+from app.services import audit, changes, encryption
+from app.services.archive import archive_entry, build_archive_response, select_documents
+from app.services.file_info import FileInspector
+from app.services.panel_export import FORMATS as PANEL_EXPORT_FORMATS, build_panel_export_response
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+import base64
+import binascii
+import logging
 import os
 import uuid
 
 router = APIRouter(prefix="/doctors", tags=["doctors"])
 
+logger = logging.getLogger(__name__)
+
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", 50))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", 4))
+
+# unique storage key for an uploaded file, keeping its extension
+def _document_key(patient_id: str, filename: str) -> str:
+    base, ext = os.path.splitext(filename)
+    return f"documents/{patient_id}/{uuid.uuid4()}{ext}"
+
+# keyset cursor of the recent uploads feed: the last document's (created_at, id)
+def _encode_recent_cursor(document: Document) -> str:
+    raw = f"{document.created_at.isoformat()}|{document.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_recent_cursor(cursor: str):
+    try:
+        created_at, document_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(document_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 # get doctor profile 
-@router.get("/profile")
-def get_doctor_profile(user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+@router.get("/profile", response_model=DoctorOut)
+@bulkhead("db")
+def get_doctor_profile(request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+  selected = parse_fields(DoctorOut, fields)
   doctor = check_user(user, db)
 
-  return {
-    "doctor_id": doctor.auth0_user_id,
-    "email": doctor.email,
-    "first_name": doctor.first_name,
-    "last_name": doctor.last_name,
-    "phone": doctor.phone,
-    "created_at": doctor.created_at,
-    "updated_at": doctor.updated_at
-  }
+  etag = weak_etag("doctor", doctor.auth0_user_id, doctor.updated_at, *fields_tag(selected))
+  not_modified = check_not_modified(request, etag)
+  if not_modified:
+    return not_modified
+
+  return model_response(sparse_schema(DoctorOut, selected), doctor, headers=cache_headers(etag))
 
 # update doctor profile
-@router.put("/profile")
+@router.put("/profile", response_model=DoctorOut)
+@bulkhead("db")
 def update_doctor_profile(
     first_name: Optional[str] = Form(None),
     last_name: Optional[str] = Form(None),
@@ -46,39 +85,56 @@ def update_doctor_profile(
     
     db.commit()
     db.refresh(doctor)
-    return {
-        "doctor_id": doctor.auth0_user_id,
-        "email": doctor.email,
-        "first_name": doctor.first_name,
-        "last_name": doctor.last_name,
-        "phone": doctor.phone,
-        "date_of_birth": doctor.date_of_birth,
-        "created_at": doctor.created_at,
-        "updated_at": doctor.updated_at
-    }
+    return model_response(DoctorOut, doctor)
 
 # get doctor's patients
-@router.get("/patients")
-def get_doctor_patients(user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+@router.get("/patients", response_model=List[PatientOut])
+@bulkhead("db")
+def get_doctor_patients(request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+  selected = parse_fields(PatientOut, fields)
   doctor = check_user(user, db)
 
-  patients = doctor.patients  
-  return [
-    {
-      "patient_id": patient.auth0_user_id,
-      "email": patient.email,
-      "first_name": patient.first_name,
-      "last_name": patient.last_name,
-      "date_of_birth": patient.date_of_birth,
-      "phone": patient.phone,
-      "created_at": patient.created_at
-    }
-    for patient in patients
-  ]
+  etag = weak_etag("patients", doctor.auth0_user_id, *patients_version(db, doctor.auth0_user_id), *fields_tag(selected))
+  not_modified = check_not_modified(request, etag)
+  if not_modified:
+    return not_modified
+
+  patients = db.query(User).filter(User.doctor_id == doctor.auth0_user_id).options(
+    *load_fields(User, PatientOut, selected)
+  ).all()
+  return model_response(sparse_schema(PatientOut, selected), patients, many=True, headers=cache_headers(etag))
+
+# sync the doctor's patient panel: the whole panel without `since`, only what changed after it with
+@router.get("/patients/changes", response_model=PatientChangesOut)
+@bulkhead("db")
+def get_doctor_patient_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    user = Depends(require_role("doctor")),
+    db: Session = Depends(get_db)
+):
+    doctor = check_user(user, db)
+    return model_response(PatientChangesOut, changes.patient_changes(db, doctor.auth0_user_id, since, limit))
+
+# stream the whole patient panel with document counts, as CSV or NDJSON, for
+# reporting; declared before /patients/{patient_id}
+@router.get("/patients/export")
+@bulkhead("db")
+def export_doctor_patients(
+    request: Request,
+    format: str = Query("csv", pattern=f"^({'|'.join(PANEL_EXPORT_FORMATS)})$"),
+    user = Depends(require_role("doctor")),
+    db: Session = Depends(get_db)
+):
+    doctor = check_user(user, db)
+    audit.record_access(user, doctor.role, audit.PATIENT_EXPORT, None, request=request)
+    return build_panel_export_response(doctor.auth0_user_id, format)
 
 # get doctor's patient by id
-@router.get("/patients/{patient_id}")
-def get_doctor_patient(patient_id: str,  user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+@router.get("/patients/{patient_id}", response_model=PatientDetailOut)
+@bulkhead("db")
+def get_doctor_patient(patient_id: str, request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+    selected = parse_fields(PatientDetailOut, fields)
     doctor = check_user(user, db)
     
     if not doctor.can_upload_for_patient(patient_id):
@@ -88,24 +144,26 @@ def get_doctor_patient(patient_id: str,  user = Depends(require_role("doctor")),
         User.auth0_user_id == patient_id,
         User.role == "patient",
         User.doctor_id == doctor.auth0_user_id
-    ).first()
+    ).options(*load_fields(User, PatientDetailOut, selected, "updated_at")).first()
     
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    return {
-        "patient_id": patient.auth0_user_id,
-        "email": patient.email,
-        "first_name": patient.first_name,
-        "last_name": patient.last_name,
-        "date_of_birth": patient.date_of_birth,
-        "phone": patient.phone,
-        "created_at": patient.created_at,
-        "documents_count": len(patient.owned_documents)
-    }
+    documents_count = db.query(func.count(Document.id)).filter(Document.patient_id == patient_id).scalar()
+    etag = weak_etag("patient", patient.auth0_user_id, patient.updated_at, documents_count, *fields_tag(selected))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    schema = sparse_schema(PatientDetailOut, selected)
+    detail = schema.model_validate(patient)
+    if "documents_count" in schema.model_fields:
+        detail = detail.model_copy(update={"documents_count": documents_count})
+    return model_response(schema, detail, headers=cache_headers(etag))
 
 # update patient information
-@router.put("/patients/{patient_id}")
+@router.put("/patients/{patient_id}", response_model=PatientOut)
+@bulkhead("db")
 def update_patient(
     patient_id: str,
     first_name: Optional[str] = Form(None),
@@ -131,19 +189,11 @@ def update_patient(
     
     db.commit()
     db.refresh(patient)
-    return {
-        "patient_id": patient.auth0_user_id,
-        "email": patient.email,
-        "first_name": patient.first_name,
-        "last_name": patient.last_name,
-        "date_of_birth": patient.date_of_birth,
-        "phone": patient.phone,
-        "created_at": patient.created_at,
-        "updated_at": patient.updated_at
-    }
+    return model_response(PatientOut, patient)
 
 # unassign patient from doctor
 @router.delete("/patients/{patient_id}")
+@bulkhead("db")
 def unassign_patient(patient_id: str, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
     doctor = check_user(user, db)
     patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
@@ -158,7 +208,8 @@ def unassign_patient(patient_id: str, user = Depends(require_role("doctor")), db
     return {"message": "Patient unassigned successfully", "patient_id": patient_id}
 
 # add patient to doctor's list
-@router.post("/add-patient")
+@router.post("/add-patient", response_model=PatientRecordOut)
+@bulkhead("db")
 def add_patient_to_doctor(patient_auth0_id: str = Form(...), user=Depends(require_role("doctor")), db: Session = Depends(get_db)):
     doctor = check_user(user, db)
     
@@ -176,22 +227,93 @@ def add_patient_to_doctor(patient_auth0_id: str = Form(...), user=Depends(requir
     db.commit()
     db.refresh(patient)
     
-    return {
-        "auth0_user_id": patient.auth0_user_id,
-        "email": patient.email,
-        "first_name": patient.first_name,
-        "last_name": patient.last_name,
-        "phone": patient.phone,
-        "date_of_birth": patient.date_of_birth,
-        "role": patient.role,
-        "doctor_id": patient.doctor_id,
-        "created_at": patient.created_at,
-        "updated_at": patient.updated_at,
-    }
+    return model_response(PatientRecordOut, patient)
+
+# The newest `limit` documents of the doctor's patients matching `conditions`.
+#
+# documents is hash partitioned by patient_id, so no single index scan yields
+# the feed in order across patients, and a plain join gathers and sorts every
+# matching document of the panel before the LIMIT. On Postgres each patient is
+# therefore read through a LATERAL subquery: a scan of one partition's
+# ix_documents_patient_id_created_at_id, newest first, that stops after
+# `limit` rows. The outer sort only merges patients x limit rows, however
+# many documents the panel holds. Elsewhere (sqlite in development) the plain
+# join is kept.
+def _recent_documents_query(dialect: str, doctor_id: str, conditions: list, patient_id: Optional[str], limit: int):
+    patients = [User.doctor_id == doctor_id]
+    if patient_id is not None:
+        patients.append(User.auth0_user_id == patient_id)
+    if dialect != "postgresql":
+        return (
+            select(Document, User.first_name, User.last_name)
+            .where(User.auth0_user_id == Document.patient_id, *patients, *conditions)
+            .order_by(Document.created_at.desc(), Document.id.desc())
+            .limit(limit)
+        )
+    latest = (
+        select(Document)
+        .where(Document.patient_id == User.auth0_user_id, *conditions)
+        .order_by(Document.created_at.desc(), Document.id.desc())
+        .limit(limit)
+        .lateral("latest")
+    )
+    recent = aliased(Document, latest)
+    return (
+        select(recent, User.first_name, User.last_name)
+        .select_from(User)
+        .join(latest, true())
+        .where(*patients)
+        .order_by(recent.created_at.desc(), recent.id.desc())
+        .limit(limit)
+    )
+
+# documents uploaded for any of the doctor's patients, newest first, one
+# keyset page at a time, from one statement (see _recent_documents_query)
+@router.get("/documents/recent", response_model=RecentDocumentsPageOut)
+@bulkhead("db")
+def get_recent_documents(
+    request: Request,
+    patient_id: Optional[str] = None,
+    uploaded_by_id: Optional[str] = None,
+    content_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    user = Depends(require_role("doctor")),
+    db: Session = Depends(get_db)
+):
+    doctor = check_user(user, db)
+    conditions = []
+    if patient_id is not None:
+        conditions.append(Document.patient_id == patient_id)
+    if uploaded_by_id is not None:
+        conditions.append(Document.uploaded_by_id == uploaded_by_id)
+    if content_type is not None:
+        conditions.append(Document.content_type == content_type)
+    if cursor is not None:
+        # keyset: strictly older than the last document of the previous page
+        conditions.append(tuple_(Document.created_at, Document.id) < tuple_(*_decode_recent_cursor(cursor)))
+
+    query = _recent_documents_query(
+        db.get_bind().dialect.name, doctor.auth0_user_id, conditions, patient_id, limit + 1
+    )
+    rows = db.execute(query).all()
+    next_cursor = _encode_recent_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    rows = rows[:limit]
+    for listed_patient_id in dict.fromkeys(document.patient_id for document, _, _ in rows):
+        audit.record_access(user, doctor.role, audit.DOCUMENT_LIST, listed_patient_id, request=request)
+    documents = [
+        RecentDocumentOut.model_validate(document).model_copy(
+            update={"patient_first_name": first_name, "patient_last_name": last_name}
+        )
+        for document, first_name, last_name in rows
+    ]
+    return model_response(RecentDocumentsPageOut, {"documents": documents, "next_cursor": next_cursor})
 
 # get all documents for a patient
-@router.get("/patients/{patient_id}/documents")
-def get_patient_documents(patient_id: str, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+@router.get("/patients/{patient_id}/documents", response_model=List[DocumentOut])
+@bulkhead("db")
+def get_patient_documents(patient_id: str, request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+    selected = parse_fields(DocumentOut, fields)
     doctor = check_user(user, db)
     patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
     if not patient:
@@ -200,19 +322,66 @@ def get_patient_documents(patient_id: str, user = Depends(require_role("doctor")
     if patient.doctor_id != doctor.auth0_user_id:
         raise HTTPException(status_code=403, detail="You cannot access this patient")
     
-    documents = patient.owned_documents
-    return [
-        {
-            "document_id": document.id,
-            "filename": document.filename,
-            "description": document.description,
-            "created_at": document.created_at
-        }
-        for document in documents
-    ]
+    audit.record_access(user, doctor.role, audit.DOCUMENT_LIST, patient_id, request=request)
+    etag = weak_etag("documents", patient_id, *documents_version(db, patient_id), *fields_tag(selected))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    documents = db.query(Document).filter(Document.patient_id == patient_id).options(
+        *load_fields(Document, DocumentOut, selected)
+    ).all()
+    return model_response(sparse_schema(DocumentOut, selected), documents, many=True, headers=cache_headers(etag))
+
+# sync a patient's documents: all of them without `since`, only what changed after it with
+@router.get("/patients/{patient_id}/documents/changes", response_model=DocumentChangesOut)
+@bulkhead("db")
+def get_patient_document_changes(
+    patient_id: str,
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    user = Depends(require_role("doctor")),
+    db: Session = Depends(get_db)
+):
+    doctor = check_user(user, db)
+    patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    if patient.doctor_id != doctor.auth0_user_id:
+        raise HTTPException(status_code=403, detail="You cannot access this patient")
+    
+    audit.record_access(user, doctor.role, audit.DOCUMENT_LIST, patient_id, request=request)
+    return model_response(DocumentChangesOut, changes.document_changes(db, patient_id, since, limit))
+
+# stream a ZIP of a patient's documents (all, or the `document_id`s given)
+# with a manifest; declared before the {document_id} routes
+@router.get("/patients/{patient_id}/documents/export")
+@bulkhead("db")
+def export_patient_documents(
+    patient_id: str,
+    request: Request,
+    document_id: Optional[List[int]] = Query(None),
+    user = Depends(require_role("doctor")),
+    db: Session = Depends(get_db)
+):
+    doctor = check_user(user, db)
+    patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    if patient.doctor_id != doctor.auth0_user_id:
+        raise HTTPException(status_code=403, detail="You cannot access this patient")
+
+    documents = select_documents(db, patient_id, document_id)
+    for document in documents:
+        audit.record_access(user, doctor.role, audit.DOCUMENT_EXPORT, patient_id, document.id, request)
+    return build_archive_response(patient_id, [archive_entry(document) for document in documents])
 
 # add new document for a patient
-@router.post("/patients/{patient_id}/documents/upload")
+@router.post("/patients/{patient_id}/documents/upload", response_model=UploadedDocumentOut)
+@bulkhead("storage")
 def add_patient_document(
     patient_id: str,
     file: UploadFile = File(...),
@@ -234,14 +403,13 @@ def add_patient_document(
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
     
-    # Generate unique filename and S3 key
-    base, ext = os.path.splitext(file.filename)
-    unique_name = f"{uuid.uuid4()}{ext}"
-    s3_key = f"documents/{patient_id}/{unique_name}"
+    s3_key = _document_key(patient_id, file.filename)
+    # size, checksum, type and page count, read off the bytes as they are sent
+    inspector = FileInspector(file.file)
     
     try:
         # Upload file to S3
-        presigned_url = upload_file(file.file, S3_BUCKET_NAME, s3_key)
+        presigned_url = upload_file(inspector, S3_BUCKET_NAME, s3_key)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {e}")
     
@@ -251,23 +419,112 @@ def add_patient_document(
         content_type=file.content_type,
         description=description.strip() if description and description.strip() else None,
         patient_id=patient_id,
-        uploaded_by_id=doctor.auth0_user_id
+        uploaded_by_id=doctor.auth0_user_id,
+        **inspector.result()
     )
     db.add(document)
     db.commit()
     db.refresh(document)
-    return {
-        "document_id": document.id,
-        "filename": document.filename,
-        "file_path": document.file_path,
-        "content_type": document.content_type,
-        "description": document.description,
-        "created_at": document.created_at
-    }
+    return model_response(UploadedDocumentOut, document)
+
+# add several documents for a patient in one request: authorized once, stored
+# BATCH_UPLOAD_CONCURRENCY files at a time and recorded in a single transaction.
+# Results are per file, in request order; 207 if any file failed
+@router.post("/patients/{patient_id}/documents/batch-upload", response_model=BatchUploadOut)
+@bulkhead("storage")
+def add_patient_documents(
+    patient_id: str,
+    files: List[UploadFile] = File(...),
+    description: Optional[str] = Form(None),
+    user = Depends(require_role("doctor")),
+    db: Session = Depends(get_db)
+):
+    doctor = check_user(user, db)
+    patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    if patient.doctor_id != doctor.auth0_user_id:
+        raise HTTPException(status_code=403, detail="You cannot access this patient")
+
+    if not doctor.can_upload_for_patient(patient_id):
+        raise HTTPException(status_code=403, detail="You cannot upload documents for this patient")
+
+    if len(files) > BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_UPLOAD_MAX_FILES} files per upload")
+
+    description = description.strip() if description and description.strip() else None
+
+    def store(file: UploadFile):
+        if not file.filename:
+            raise ValueError("No filename provided")
+        s3_key = _document_key(patient_id, file.filename)
+        inspector = FileInspector(file.file)
+        upload_file(inspector, S3_BUCKET_NAME, s3_key)
+        return s3_key, inspector.result()
+
+    # storage calls are I/O bound: this request's own small pool, on top of the
+    # one storage bulkhead slot it holds
+    with ThreadPoolExecutor(max_workers=min(BATCH_UPLOAD_CONCURRENCY, len(files))) as executor:
+        futures = [executor.submit(store, file) for file in files]
+
+    results = []
+    uploaded = []  # (index in results, document)
+    for file, future in zip(files, futures):
+        try:
+            s3_key, file_info = future.result()
+        except Exception as e:
+            results.append({"filename": file.filename or "", "status": "failed", "error": f"Error uploading file: {e}"})
+            continue
+        document = Document(
+            filename=file.filename,
+            file_path=s3_key,
+            content_type=file.content_type,
+            description=description,
+            patient_id=patient_id,
+            uploaded_by_id=doctor.auth0_user_id,
+            **file_info
+        )
+        uploaded.append((len(results), document))
+        results.append({"filename": file.filename, "status": "uploaded"})
+
+    if uploaded:
+        documents = [document for _, document in uploaded]
+        keys = [document.file_path for document in documents]
+        db.add_all(documents)
+        try:
+            db.flush()
+            ids = [document.id for document in documents]
+            db.commit()
+        except Exception:
+            db.rollback()
+            # app.jobs.reconcile_storage removes whatever is left behind
+            try:
+                failed = delete_files(S3_BUCKET_NAME, keys)
+            except Exception:
+                logger.exception("could not delete %d uploaded objects after a failed insert", len(keys))
+            else:
+                if failed:
+                    logger.error("could not delete %d uploaded objects after a failed insert: %s",
+                                 len(failed), ", ".join(failed))
+            raise
+        # one query for all of them, rather than a refresh per row
+        stored = {d.id: d for d in db.query(Document).filter(
+            Document.patient_id == patient_id, Document.id.in_(ids)
+        )}
+        for (index, _), document_id in zip(uploaded, ids):
+            results[index]["document"] = stored[document_id]
+
+    status_code = 200 if len(uploaded) == len(files) else 207
+    return model_response(BatchUploadOut, {
+        "results": results, "uploaded": len(uploaded), "failed": len(files) - len(uploaded)
+    }, status_code=status_code)
 
 # get document by id for a patient
-@router.get("/patients/{patient_id}/documents/{document_id}")
-def get_patient_document(patient_id: str, document_id: int, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+@router.get("/patients/{patient_id}/documents/{document_id}", response_model=DocumentOut)
+@bulkhead("db")
+def get_patient_document(patient_id: str, document_id: int, request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+    selected = parse_fields(DocumentOut, fields)
     doctor = check_user(user, db)
     patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
     if not patient:
@@ -276,19 +533,23 @@ def get_patient_document(patient_id: str, document_id: int, user = Depends(requi
     if patient.doctor_id != doctor.auth0_user_id:
         raise HTTPException(status_code=403, detail="You cannot access this patient")
     
-    document = db.query(Document).filter(Document.id == document_id).filter(Document.patient_id == patient_id).first()
+    document = db.query(Document).filter(Document.id == document_id).filter(Document.patient_id == patient_id).options(
+        *load_fields(Document, DocumentOut, selected, "updated_at")
+    ).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return {
-        "document_id": document.id,
-        "filename": document.filename,
-        "description": document.description,
-        "created_at": document.created_at
-    }
+    audit.record_access(user, doctor.role, audit.DOCUMENT_VIEW, patient_id, document.id, request)
+    etag = weak_etag("document", document.id, document.updated_at, *fields_tag(selected))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    return model_response(sparse_schema(DocumentOut, selected), document, headers=cache_headers(etag))
 
 # update document for a patient  
-@router.put("/patients/{patient_id}/documents/{document_id}")
+@router.put("/patients/{patient_id}/documents/{document_id}", response_model=DocumentOut)
+@bulkhead("storage")
 def update_patient_document(
     patient_id: str, 
     document_id: int,
@@ -313,18 +574,18 @@ def update_patient_document(
         raise HTTPException(status_code=404, detail="Document not found")
     
     if file and file.filename:
-        # Generate unique filename and S3 key
-        base, ext = os.path.splitext(file.filename)
-        unique_name = f"{uuid.uuid4()}{ext}"
-        s3_key = f"documents/{patient_id}/{unique_name}"
+        s3_key = _document_key(patient_id, file.filename)
+        inspector = FileInspector(file.file)
         
         try:
             # Upload new file to S3
-            presigned_url = upload_file(file.file, S3_BUCKET_NAME, s3_key)
+            presigned_url = upload_file(inspector, S3_BUCKET_NAME, s3_key)
             # Update document with new file info
             document.filename = file.filename
             document.file_path = s3_key
             document.content_type = file.content_type
+            for name, value in inspector.result().items():
+                setattr(document, name, value)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error uploading file: {e}")
     
@@ -334,16 +595,11 @@ def update_patient_document(
     
     db.commit()
     db.refresh(document)
-    return {
-        "document_id": document.id,
-        "filename": document.filename,
-        "content_type": document.content_type,
-        "description": document.description,
-        "created_at": document.created_at
-    }
+    return model_response(DocumentOut, document)
 
 # delete document for a patient
 @router.delete("/patients/{patient_id}/documents/{document_id}")
+@bulkhead("storage")
 def delete_patient_document(patient_id: str, document_id: int, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
     doctor = check_user(user, db)
     patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
@@ -369,8 +625,9 @@ def delete_patient_document(patient_id: str, document_id: int, user = Depends(re
     return {"message": "Document deleted successfully", "document_id": document_id}
 
 # get document preview URL for a patient (for preview)
-@router.get("/patients/{patient_id}/documents/{document_id}/preview")
-def get_patient_document_preview_url(patient_id: str, document_id: int, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+@router.get("/patients/{patient_id}/documents/{document_id}/preview", response_model=PreviewUrlOut)
+@bulkhead("storage")
+def get_patient_document_preview_url(patient_id: str, document_id: int, request: Request, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
     doctor = check_user(user, db)
     patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
     if not patient:
@@ -383,6 +640,10 @@ def get_patient_document_preview_url(patient_id: str, document_id: int, user = D
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    audit.record_access(user, doctor.role, audit.DOCUMENT_PREVIEW_URL, patient_id, document.id, request)
+    if encryption.enabled():
+        # storage only holds ciphertext: the client fetches the download route with its token
+        return {"url": request.url.path[:-len("preview")] + "download", "direct": False}
     try:
         response_headers = {
             'ResponseContentDisposition': 'inline'
@@ -402,3 +663,21 @@ def get_patient_document_preview_url(patient_id: str, document_id: int, user = D
         "url": signed_url
     }
 
+# stream a patient's document content, honouring Range and conditional headers
+@router.get("/patients/{patient_id}/documents/{document_id}/download")
+@bulkhead("storage")
+def download_patient_document(patient_id: str, document_id: int, request: Request, attachment: bool = False, user = Depends(require_role("doctor")), db: Session = Depends(get_db)):
+    doctor = check_user(user, db)
+    patient = db.query(User).filter(User.auth0_user_id == patient_id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    if patient.doctor_id != doctor.auth0_user_id:
+        raise HTTPException(status_code=403, detail="You cannot access this patient")
+    
+    document = db.query(Document).filter(Document.id == document_id).filter(Document.patient_id == patient_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    audit.record_access(user, doctor.role, audit.DOCUMENT_DOWNLOAD, patient_id, document.id, request)
+    return build_download_response(request, document, attachment=attachment)
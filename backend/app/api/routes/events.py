@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.core.security import get_current_user
+from app.core.bulkheads import bulkhead
+from app.core.metrics import EVENT_STREAMS
+from app.db import get_db
+from app.services.checkUser import check_user
+from app.services import events
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# server-sent events for the current user: document and patient panel changes
+@router.get("/stream")
+@bulkhead("db")
+def stream_events(user = Depends(get_current_user), db: Session = Depends(get_db)):
+    current = check_user(user, db)
+    if not events.hub.can_accept(current.auth0_user_id):
+        EVENT_STREAMS.inc("rejected")
+        raise HTTPException(status_code=503, detail="Too many event streams", headers={"Retry-After": "5"})
+    
+    # the panel as of now; clients resync through the change feeds after "ready"
+    patient_ids = [p.auth0_user_id for p in current.patients] if current.is_doctor() else []
+    return StreamingResponse(
+        events.event_stream(current.auth0_user_id, current.role, patient_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
+from fastapi import APIRouter, Depends, HTTPException, Form, Query, Request
 from sqlalchemy.orm import Session
 from app.core.permissions import require_role
 from app.services.checkUser import check_user
 from app.db import get_db
 from app.models.models import User, Document
-from app.services.s3 import generate_presigned_url, S3_BUCKET_NAME
-from typing import Optional
+from app.services.s3 import generate_presigned_url
+from app.services.download import build_download_response
+from app.api.schemas import PatientOut, PatientRecordOut, DoctorOut, DocumentOut, PreviewUrlOut, DocumentChangesOut
+from app.core.responses import model_response
+from app.core.bulkheads import bulkhead
+from app.core.http_cache import weak_etag, cache_headers, check_not_modified
+from app.core.fields import FIELDS_QUERY, parse_fields, sparse_schema, load_fields, fields_tag
+from app.services.versions import documents_version
+from app.services import audit, changes, encryption
+from app.services.archive import archive_entry, build_archive_response, select_documents
+from typing import List, Optional
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/patients", tags=["patients"])
@@ -17,7 +26,8 @@ class PatientDetailVerificationRequest(BaseModel):
     phone: Optional[str] = None
     date_of_birth: Optional[str] = None
 
-@router.post("/verify-details")
+@router.post("/verify-details", response_model=PatientRecordOut)
+@bulkhead("db")
 def verify_patient_details(request: PatientDetailVerificationRequest, user=Depends(require_role("doctor")), db: Session = Depends(get_db)):
     
     patient = db.query(User).filter(User.email == request.email.lower().strip(), User.role == "patient").first()
@@ -46,37 +56,25 @@ def verify_patient_details(request: PatientDetailVerificationRequest, user=Depen
         error_message = "Patient details don't match:\n" + "\n".join(field_mismatches)
         raise HTTPException(status_code=400, detail=error_message)
     
-    return {
-        "auth0_user_id": patient.auth0_user_id,
-        "email": patient.email,
-        "first_name": patient.first_name,
-        "last_name": patient.last_name,
-        "phone": patient.phone,
-        "date_of_birth": patient.date_of_birth,
-        "role": patient.role,
-        "created_at": patient.created_at,
-        "updated_at": patient.updated_at,
-        "doctor_id": patient.doctor_id
-    }
+    return model_response(PatientRecordOut, patient)
 
 # get patient profile
-@router.get("/profile")
-def get_patient_profile(user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+@router.get("/profile", response_model=PatientOut)
+@bulkhead("db")
+def get_patient_profile(request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+    selected = parse_fields(PatientOut, fields)
     patient = check_user(user, db)
     
-    return {
-        "patient_id": patient.auth0_user_id,
-        "email": patient.email,
-        "first_name": patient.first_name,
-        "last_name": patient.last_name,
-        "date_of_birth": patient.date_of_birth,
-        "phone": patient.phone,
-        "doctor_id": patient.doctor_id,
-        "created_at": patient.created_at
-    }
+    etag = weak_etag("patient-profile", patient.auth0_user_id, patient.updated_at, *fields_tag(selected))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    return model_response(sparse_schema(PatientOut, selected), patient, headers=cache_headers(etag))
 
 # update patient profile 
-@router.put("/profile")
+@router.put("/profile", response_model=PatientOut)
+@bulkhead("db")
 def update_patient_profile(
     first_name: Optional[str] = Form(None),
     last_name: Optional[str] = Form(None),
@@ -95,21 +93,13 @@ def update_patient_profile(
     
     db.commit()
     db.refresh(patient)
-    return {
-        "patient_id": patient.auth0_user_id,
-        "email": patient.email,
-        "first_name": patient.first_name,
-        "last_name": patient.last_name,
-        "date_of_birth": patient.date_of_birth,
-        "phone": patient.phone,
-        "doctor_id": patient.doctor_id,
-        "created_at": patient.created_at,
-        "updated_at": patient.updated_at
-    }
+    return model_response(PatientOut, patient)
 
 # get doctor for a patient
-@router.get("/doctor")
-def get_patient_doctor(user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+@router.get("/doctor", response_model=DoctorOut)
+@bulkhead("db")
+def get_patient_doctor(request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+    selected = parse_fields(DoctorOut, fields)
     patient = check_user(user, db)
     
     if not patient.doctor_id:
@@ -118,61 +108,95 @@ def get_patient_doctor(user = Depends(require_role("patient")), db: Session = De
     doctor = db.query(User).filter(
         User.auth0_user_id == patient.doctor_id,
         User.role == "doctor"
-    ).first()
+    ).options(*load_fields(User, DoctorOut, selected, "updated_at")).first()
     
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     
-    return {
-        "doctor_id": doctor.auth0_user_id,
-        "email": doctor.email,
-        "first_name": doctor.first_name,
-        "last_name": doctor.last_name,
-        "phone": doctor.phone,
-        "created_at": doctor.created_at
-    }
+    etag = weak_etag("doctor", doctor.auth0_user_id, doctor.updated_at, *fields_tag(selected))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    return model_response(sparse_schema(DoctorOut, selected), doctor, headers=cache_headers(etag))
 
 # get all documents for a patient
-@router.get("/documents")
-def get_patient_documents(user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+@router.get("/documents", response_model=List[DocumentOut])
+@bulkhead("db")
+def get_patient_documents(request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+    selected = parse_fields(DocumentOut, fields)
     patient = check_user(user, db)
     
-    documents = patient.owned_documents
-    return [
-        {
-            "document_id": document.id,
-            "filename": document.filename,
-            "description": document.description,
-            "uploaded_by_id": document.uploaded_by_id,
-            "created_at": document.created_at
-        }
-        for document in documents
-    ]
+    audit.record_access(user, patient.role, audit.DOCUMENT_LIST, patient.auth0_user_id, request=request)
+    etag = weak_etag("documents", patient.auth0_user_id, *documents_version(db, patient.auth0_user_id), *fields_tag(selected))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    documents = db.query(Document).filter(Document.patient_id == patient.auth0_user_id).options(
+        *load_fields(Document, DocumentOut, selected)
+    ).all()
+    return model_response(sparse_schema(DocumentOut, selected), documents, many=True, headers=cache_headers(etag))
+
+# sync the patient's documents: all of them without `since`, only what changed after it with
+@router.get("/documents/changes", response_model=DocumentChangesOut)
+@bulkhead("db")
+def get_patient_document_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    user = Depends(require_role("patient")),
+    db: Session = Depends(get_db)
+):
+    patient = check_user(user, db)
+    
+    audit.record_access(user, patient.role, audit.DOCUMENT_LIST, patient.auth0_user_id, request=request)
+    return model_response(DocumentChangesOut, changes.document_changes(db, patient.auth0_user_id, since, limit))
+
+# stream a ZIP of the patient's own documents (all, or the `document_id`s given)
+# with a manifest
+@router.get("/documents/export")
+@bulkhead("db")
+def export_patient_documents(
+    request: Request,
+    document_id: Optional[List[int]] = Query(None),
+    user = Depends(require_role("patient")),
+    db: Session = Depends(get_db)
+):
+    patient = check_user(user, db)
+
+    documents = select_documents(db, patient.auth0_user_id, document_id)
+    for document in documents:
+        audit.record_access(user, patient.role, audit.DOCUMENT_EXPORT, patient.auth0_user_id, document.id, request)
+    return build_archive_response(patient.auth0_user_id, [archive_entry(document) for document in documents])
 
 # get document by id for a patient
-@router.get("/documents/{document_id}")
-def get_patient_document(document_id: int, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+@router.get("/documents/{document_id}", response_model=DocumentOut)
+@bulkhead("db")
+def get_patient_document(document_id: int, request: Request, fields: Optional[str] = FIELDS_QUERY, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+    selected = parse_fields(DocumentOut, fields)
     patient = check_user(user, db)
     
     document = db.query(Document).filter(
         Document.id == document_id,
         Document.patient_id == patient.auth0_user_id
-    ).first()
+    ).options(*load_fields(Document, DocumentOut, selected, "updated_at")).first()
     
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return {
-        "document_id": document.id,
-        "filename": document.filename,
-        "description": document.description,
-        "uploaded_by_id": document.uploaded_by_id,
-        "created_at": document.created_at
-    }
+    audit.record_access(user, patient.role, audit.DOCUMENT_VIEW, patient.auth0_user_id, document.id, request)
+    etag = weak_etag("document", document.id, document.updated_at, *fields_tag(selected))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
+    return model_response(sparse_schema(DocumentOut, selected), document, headers=cache_headers(etag))
 
 # get document preview URL for a patient (their own documents)
-@router.get("/documents/{document_id}/preview")
-def get_patient_document_preview_url(document_id: int, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+@router.get("/documents/{document_id}/preview", response_model=PreviewUrlOut)
+@bulkhead("storage")
+def get_patient_document_preview_url(document_id: int, request: Request, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
     patient = check_user(user, db)
     
     # Check that the document belongs to this patient
@@ -184,6 +208,10 @@ def get_patient_document_preview_url(document_id: int, user = Depends(require_ro
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    audit.record_access(user, patient.role, audit.DOCUMENT_PREVIEW_URL, patient.auth0_user_id, document.id, request)
+    if encryption.enabled():
+        # storage only holds ciphertext: the client fetches the download route with its token
+        return {"url": request.url.path[:-len("preview")] + "download", "direct": False}
     try:
         # Generate presigned URL with content type for proper preview
         response_headers = {
@@ -204,10 +232,31 @@ def get_patient_document_preview_url(document_id: int, user = Depends(require_ro
         "url": signed_url
     }
 
-@router.get("/{patient_id}")
-def get_patient(patient_id: str, current_user=Depends(require_role("doctor")), db: Session = Depends(get_db)):
+# stream a document's content for a patient (their own documents), honouring Range and conditional headers
+@router.get("/documents/{document_id}/download")
+@bulkhead("storage")
+def download_patient_document(document_id: int, request: Request, attachment: bool = False, user = Depends(require_role("patient")), db: Session = Depends(get_db)):
+    patient = check_user(user, db)
+    
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.patient_id == patient.auth0_user_id
+    ).first()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    audit.record_access(user, patient.role, audit.DOCUMENT_DOWNLOAD, patient.auth0_user_id, document.id, request)
+    return build_download_response(request, document, attachment=attachment)
+
+@router.get("/{patient_id}", response_model=PatientRecordOut)
+@bulkhead("db")
+def get_patient(patient_id: str, fields: Optional[str] = FIELDS_QUERY, current_user=Depends(require_role("doctor")), db: Session = Depends(get_db)):
+    selected = parse_fields(PatientRecordOut, fields)
     
-    patient = db.query(User).filter(User.auth0_user_id == patient_id, User.role == "patient").first()
+    patient = db.query(User).filter(User.auth0_user_id == patient_id, User.role == "patient").options(
+        *load_fields(User, PatientRecordOut, selected, "doctor_id")
+    ).first()
     
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -217,16 +266,5 @@ def get_patient(patient_id: str, current_user=Depends(require_role("doctor")), d
     if patient.doctor_id != doctor.auth0_user_id:
         raise HTTPException(status_code=403, detail="You don't have access to this patient")
     
-    return {
-        "auth0_user_id": patient.auth0_user_id,
-        "email": patient.email,
-        "first_name": patient.first_name,
-        "last_name": patient.last_name,
-        "phone": patient.phone,
-        "date_of_birth": patient.date_of_birth,
-        "role": patient.role,
-        "created_at": patient.created_at,
-        "updated_at": patient.updated_at,
-        "doctor_id": patient.doctor_id
-    }
+    return model_response(sparse_schema(PatientRecordOut, selected), patient)
 
@@ -0,0 +1,130 @@
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+
+# Response shapes shared by the doctor and patient routes.
+# All of them validate straight from ORM rows (from_attributes).
+
+class ResponseModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+class PatientOut(ResponseModel):
+    patient_id: str = Field(validation_alias=AliasChoices("auth0_user_id", "patient_id"))
+    email: str
+    first_name: str
+    last_name: str
+    date_of_birth: Optional[datetime] = None
+    phone: Optional[str] = None
+    doctor_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class PatientDetailOut(PatientOut):
+    documents_count: int = 0
+
+# full user row, keyed by auth0_user_id (patient verification / assignment)
+class PatientRecordOut(ResponseModel):
+    auth0_user_id: str
+    email: str
+    first_name: str
+    last_name: str
+    phone: Optional[str] = None
+    date_of_birth: Optional[datetime] = None
+    role: str
+    doctor_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class DoctorOut(ResponseModel):
+    doctor_id: str = Field(validation_alias=AliasChoices("auth0_user_id", "doctor_id"))
+    email: str
+    first_name: str
+    last_name: str
+    phone: Optional[str] = None
+    date_of_birth: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class DocumentOut(ResponseModel):
+    document_id: int = Field(validation_alias=AliasChoices("id", "document_id"))
+    filename: str
+    content_type: Optional[str] = None
+    description: Optional[str] = None
+    uploaded_by_id: str
+    created_at: Optional[datetime] = None
+    # unknown (None) for documents not yet backfilled
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None
+    detected_content_type: Optional[str] = None
+    page_count: Optional[int] = None
+
+class UploadedDocumentOut(DocumentOut):
+    file_path: str
+
+# a document in the doctors' recent uploads feed, across their patients
+class RecentDocumentOut(DocumentOut):
+    patient_id: str
+    patient_first_name: Optional[str] = None
+    patient_last_name: Optional[str] = None
+
+class RecentDocumentsPageOut(BaseModel):
+    documents: List[RecentDocumentOut]
+    next_cursor: Optional[str] = None
+
+# batch upload: one result per file, in request order; `document` is set for
+# uploaded files and `error` for failed ones
+class BatchUploadResultOut(BaseModel):
+    filename: str
+    status: str
+    document: Optional[UploadedDocumentOut] = None
+    error: Optional[str] = None
+
+class BatchUploadOut(BaseModel):
+    results: List[BatchUploadResultOut]
+    uploaded: int
+    failed: int
+
+# `direct` URLs are presigned storage URLs; otherwise `url` is the API's
+# download route, which needs the caller's access token
+class PreviewUrlOut(BaseModel):
+    url: str
+    direct: bool = True
+
+# change feeds: `reset` means the changes are the whole collection, replace
+# the local copy; otherwise apply them in order. Deletes carry only the id.
+class DocumentChangeOut(BaseModel):
+    op: str
+    document_id: int
+    document: Optional[DocumentOut] = None
+
+class DocumentChangesOut(BaseModel):
+    changes: List[DocumentChangeOut]
+    cursor: int
+    has_more: bool = False
+    reset: bool = False
+
+class PatientChangeOut(BaseModel):
+    op: str
+    patient_id: str
+    patient: Optional[PatientOut] = None
+
+class PatientChangesOut(BaseModel):
+    changes: List[PatientChangeOut]
+    cursor: int
+    has_more: bool = False
+    reset: bool = False
+
+class AuditEventOut(ResponseModel):
+    id: uuid.UUID
+    occurred_at: datetime
+    actor_id: str
+    actor_role: Optional[str] = None
+    action: str
+    patient_id: Optional[str] = None
+    document_id: Optional[int] = None
+    ip_address: Optional[str] = None
+
+class AuditEventPageOut(BaseModel):
+    events: List[AuditEventOut]
+    next_cursor: Optional[str] = None
@@ -1,8 +1,24 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import router as api_router
+from app.api.ops import router as ops_router
+from app.core.responses import DefaultResponse
+from app.core.compression import CompressionMiddleware
+from app.core.admission import AdmissionControlMiddleware
+from app.core.metrics import MetricsMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.querycount import QueryDebugMiddleware
+from app.core.lifespan import lifespan
 
-app = FastAPI()
+# Settings come from the environment; for local runs load .env with
+# `uvicorn app.app:app --env-file .env`, in production run `python -m app.server`.
+# Importing this module does no I/O, connections are opened and warmed up by
+# the lifespan.
+app = FastAPI(default_response_class=DefaultResponse, lifespan=lifespan)
+
+# Shed load before it queues up in the thread pool. Registered before CORS so
+# that CORS (outermost) still decorates the 429/503 rejections.
+app.add_middleware(AdmissionControlMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -13,4 +29,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(api_router, prefix="/api")
\ No newline at end of file
+# Compress large JSON bodies (lists); streamed downloads and exports pass through
+app.add_middleware(CompressionMiddleware)
+
+# Opt-in per-request sampling profiler (PROFILE_TOKEN / PROFILE_SAMPLE_RATE), inert otherwise
+app.add_middleware(ProfilingMiddleware)
+
+# QUERY_DEBUG: per-request statement counts and repeated-statement (N+1) warnings, inert otherwise
+app.add_middleware(QueryDebugMiddleware)
+
+# Outermost: latency histograms and Server-Timing cover everything below, including shed requests
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(api_router, prefix="/api")
+app.include_router(ops_router)
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Admission control: per-route-class concurrency limits with bounded wait
+# queues, plus a per-principal token bucket. Requests that cannot be admitted
+# within ADMISSION_QUEUE_TIMEOUT fail fast with 503 + Retry-After instead of
+# piling up in the thread pool.
+
+# class=concurrency:queue_length
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "read=32:64,write=16:32,upload=4:8,transfer=8:16")
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 2.0))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+# per-principal token bucket: sustained requests/second and burst size (0 disables)
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", 20))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", 40))
+ADMISSION_MAX_PRINCIPALS = int(os.getenv("ADMISSION_MAX_PRINCIPALS", 10000))
+
+# (methods, path pattern, route class); first match wins, unmatched paths are not limited.
+# Event streams stay open for minutes: they have no limits here (the class is
+# not in ADMISSION_LIMITS) and are capped by app.services.events instead.
+ROUTE_CLASSES = [
+    ({"GET"}, re.compile(r"^/api/events/stream$"), "stream"),
+    ({"GET", "HEAD"}, re.compile(r"^/api/.*/(download|export[^/]*)$"), "transfer"),
+    ({"POST", "PUT"}, re.compile(r"^/api/.*/documents(/|$)"), "upload"),
+    ({"GET", "HEAD"}, re.compile(r"^/api/"), "read"),
+    ({"POST", "PUT", "PATCH", "DELETE"}, re.compile(r"^/api/"), "write"),
+]
+
+def classify(method: str, path: str) -> Optional[str]:
+    for methods, pattern, route_class in ROUTE_CLASSES:
+        if method in methods and pattern.search(path):
+            return route_class
+    return None
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, values = item.partition("=")
+        concurrency, _, queue = values.partition(":")
+        limits[name.strip()] = (int(concurrency), int(queue or 0))
+    return limits
+
+class ConcurrencyLimiter:
+    """At most `limit` holders; up to `max_queue` waiters, served FIFO."""
+
+    def __init__(self, limit: int, max_queue: int) -> None:
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters = deque()
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            return True
+        if len(self.waiters) >= self.max_queue:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self._abandon(waiter)
+        except asyncio.CancelledError:
+            if self._abandon(waiter):
+                self.release()
+            raise
+
+    def _abandon(self, waiter) -> bool:
+        # the slot may have been handed over just as we gave up
+        if waiter.done():
+            return True
+        waiter.cancel()
+        self.waiters.remove(waiter)
+        return False
+
+    def release(self) -> None:
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # hand the slot straight to the next waiter, in_flight is unchanged
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: float, max_principals: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_principals = max_principals
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, principal: str) -> float:
+        """Consume one token; returns 0 if admitted, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(principal, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self.buckets[principal] = (tokens, now)
+        if len(self.buckets) > self.max_principals:
+            self.buckets.popitem(last=False)
+        return wait
+
+def _principal(scope: Scope) -> str:
+    # the raw bearer token is unforgeable for another user, unlike its unverified claims
+    authorization = Headers(scope=scope).get("authorization")
+    if authorization:
+        return hashlib.sha1(authorization.encode()).hexdigest()
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "anonymous"
+
+class AdmissionControlMiddleware:
+    def __init__(self, app: ASGIApp, limits: str = ADMISSION_LIMITS, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 rate: float = ADMISSION_RATE, burst: float = ADMISSION_BURST,
+                 retry_after: int = ADMISSION_RETRY_AFTER) -> None:
+        self.app = app
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.limiters = {name: ConcurrencyLimiter(*values) for name, values in parse_limits(limits).items()}
+        self.buckets = TokenBuckets(rate, burst, ADMISSION_MAX_PRINCIPALS) if rate > 0 else None
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send, status_code: int, detail: str,
+                      retry_after: int) -> None:
+        response = JSONResponse({"detail": detail}, status_code=status_code,
+                                headers={"Retry-After": str(retry_after)})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = classify(scope["method"], scope["path"])
+        limiter = self.limiters.get(route_class)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if self.buckets is not None:
+            wait = self.buckets.take(_principal(scope))
+            if wait:
+                await self._reject(scope, receive, send, 429, "Too many requests", max(1, math.ceil(wait)))
+                return
+
+        if not await limiter.acquire(self.queue_timeout):
+            await self._reject(scope, receive, send, 503, "Server is busy, try again shortly", self.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,73 @@
+import functools
+import os
+from typing import Any, Callable, Dict, Iterator, AsyncIterator
+import anyio
+import anyio.to_thread
+from anyio import CapacityLimiter
+from app.core import profiling
+
+# Separately sized thread pools ("bulkheads") for blocking work, so that slow
+# storage transfers cannot take every thread that cheap DB reads need.
+#   storage - S3 calls and streamed transfers
+#   db      - routes whose blocking work is SQL
+#   cpu     - CPU-bound work such as JWT signature verification
+BULKHEAD_SIZES = {
+    "storage": int(os.getenv("BULKHEAD_STORAGE_THREADS", 8)),
+    "db": int(os.getenv("BULKHEAD_DB_THREADS", 24)),
+    "cpu": int(os.getenv("BULKHEAD_CPU_THREADS", 4)),
+}
+
+_limiters: Dict[str, CapacityLimiter] = {}
+
+# created lazily: anyio limiters need a running event loop
+def get_limiter(name: str) -> CapacityLimiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters[name] = CapacityLimiter(BULKHEAD_SIZES[name])
+    return limiter
+
+async def run(name: str, func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking callable on a worker thread, holding a token of pool `name`."""
+    call = functools.partial(profiling.attached, func, *args, **kwargs)
+    return await anyio.to_thread.run_sync(call, limiter=get_limiter(name))
+
+_EXHAUSTED = object()
+
+async def iterate(name: str, iterator: Iterator) -> AsyncIterator:
+    """Drain a blocking iterator (e.g. a storage stream) through pool `name`."""
+    iterator = iter(iterator)
+    while True:
+        item = await run(name, next, iterator, _EXHAUSTED)
+        if item is _EXHAUSTED:
+            return
+        yield item
+
+def bulkhead(name: str):
+    """Assign a sync route (or dependency) to pool `name` instead of the shared default pool.
+
+    The wrapper keeps the wrapped signature, so FastAPI still resolves the
+    route's parameters and dependencies as before.
+    """
+    if name not in BULKHEAD_SIZES:
+        raise ValueError(f"unknown bulkhead: {name}")
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run(name, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> Dict[str, dict]:
+    """Current occupancy of every pool, including anyio's default one."""
+    limiters = {name: get_limiter(name) for name in BULKHEAD_SIZES}
+    limiters["default"] = anyio.to_thread.current_default_thread_limiter()
+    stats = {}
+    for name, limiter in limiters.items():
+        statistics = limiter.statistics()
+        stats[name] = {
+            "size": int(statistics.total_tokens),
+            "busy": statistics.borrowed_tokens,
+            "waiting": statistics.tasks_waiting,
+        }
+    return stats
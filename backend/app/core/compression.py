@@ -0,0 +1,119 @@
+import gzip
+import os
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+COMPRESSION_CONTENT_TYPES = os.getenv(
+    "COMPRESSION_CONTENT_TYPES",
+    "application/json,application/problem+json,text/plain,text/html,text/css,application/javascript",
+)
+
+def _parse_accept_encoding(header: str) -> dict:
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+class CompressionMiddleware:
+    """gzip/brotli for complete, buffered responses of allowlisted content types.
+
+    Streamed bodies (StreamingResponse: downloads, exports, event streams) and
+    ranged or already-encoded responses are passed through untouched, as is
+    anything smaller than `minimum_size` where the framing costs more than it saves.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 gzip_level: int = COMPRESSION_GZIP_LEVEL, brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+                 content_types: str = COMPRESSION_CONTENT_TYPES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types = {t.strip().lower() for t in content_types.split(",") if t.strip()}
+
+    def _choose_encoding(self, scope: Scope):
+        accepted = _parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def _is_candidate(self, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        if message["status"] < 200 or message["status"] in (204, 206, 304):
+            return False
+        if "content-encoding" in headers or "content-range" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return content_type in self.content_types
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def wrapped_send(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                if not self._is_candidate(message):
+                    passthrough = True
+                    await send(message)
+                    return
+                # hold the headers until we know whether the body is buffered
+                start_message = message
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self._compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, wrapped_send)
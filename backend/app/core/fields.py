@@ -0,0 +1,63 @@
+from functools import lru_cache
+from typing import Any, FrozenSet, List, Optional
+from fastapi import HTTPException, Query
+from pydantic import AliasChoices, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+# Sparse fieldsets: `?fields=document_id,filename` returns only those fields.
+#
+# The allowlist is the response schema itself. The selection narrows the
+# serializer to a schema with just those fields (so nothing else is read off
+# the rows) and, where the route queries its rows, the SELECT to the columns
+# behind them via load_only; primary keys are always loaded. Without `fields`
+# responses are unchanged.
+
+FIELDS_QUERY = Query(None, description="comma-separated response fields to return (default: all)")
+
+def parse_fields(schema: Any, fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    """The requested field names, or None for all; 400 on names the schema does not have."""
+    if fields is None:
+        return None
+    requested = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    if not requested:
+        raise HTTPException(status_code=400, detail="fields must name at least one field")
+    unknown = requested - set(schema.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}; allowed: {', '.join(schema.model_fields)}",
+        )
+    return requested
+
+@lru_cache(maxsize=None)
+def _sparse_schema(schema: Any, fields: FrozenSet[str]) -> Any:
+    selected = {name: (info.annotation, info) for name, info in schema.model_fields.items() if name in fields}
+    return create_model(f"{schema.__name__}Fields", __config__=schema.model_config, **selected)
+
+def sparse_schema(schema: Any, fields: Optional[FrozenSet[str]]) -> Any:
+    """`schema` narrowed to `fields`, for model_response; `schema` itself when fields is None."""
+    return schema if fields is None else _sparse_schema(schema, fields)
+
+def _column_name(model: Any, schema: Any, field: str) -> Optional[str]:
+    columns = inspect(model).column_attrs.keys()
+    alias = schema.model_fields[field].validation_alias
+    names = list(alias.choices) if isinstance(alias, AliasChoices) else [alias] if isinstance(alias, str) else []
+    for name in names + [field]:
+        if name in columns:
+            return name
+    return None  # computed by the route, e.g. documents_count
+
+def load_fields(model: Any, schema: Any, fields: Optional[FrozenSet[str]], *required: str) -> List:
+    """Query options loading only the columns behind `fields`, plus `required` (e.g. for the ETag)."""
+    if fields is None:
+        return []
+    mapper = inspect(model)
+    names = {_column_name(model, schema, field) for field in fields} | set(required)
+    names |= {mapper.get_property_by_column(column).key for column in mapper.primary_key}
+    names.discard(None)
+    return [load_only(*(getattr(model, name) for name in sorted(names)))]
+
+def fields_tag(fields: Optional[FrozenSet[str]]) -> tuple:
+    """ETag parts telling fieldsets apart; empty for the full representation."""
+    return () if fields is None else (",".join(sorted(fields)),)
@@ -0,0 +1,68 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+from app.core.metrics import record_cache
+
+# Validators and conditional request helpers (RFC 9110 section 13)
+
+# JSON reads may be stored by the browser but must be revalidated every time
+API_CACHE_CONTROL = os.getenv("API_CACHE_CONTROL", "private, no-cache")
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our current ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = _opaque_tag(etag)
+    return any(_opaque_tag(candidate.strip()) == current for candidate in if_none_match.split(","))
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: Optional[datetime]) -> bool:
+    since = parse_http_date(if_modified_since)
+    if since is None or last_modified is None:
+        return False
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have one second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+def not_modified_response(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+
+def weak_etag(*parts) -> str:
+    """Weak validator from the values that change whenever the representation does."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": API_CACHE_CONTROL}
+
+# returns a 304 response when the client already holds this version, else None
+def check_not_modified(request: Request, etag: str) -> Optional[Response]:
+    hit = etag_matches(request.headers.get("if-none-match"), etag)
+    record_cache("etag", hit)
+    if hit:
+        return not_modified_response(etag, {"Cache-Control": API_CACHE_CONTROL})
+    return None
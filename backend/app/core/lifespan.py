@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+import anyio
+import anyio.to_thread
+from fastapi import FastAPI
+from app import db
+from app.core import security
+from app.services import audit, events, s3
+
+# Startup and shutdown of the process-wide resources, in dependency order:
+# database engine (plus a few pre-opened pool connections), JWT signing keys,
+# storage client. Importing the app touches none of them; until startup has
+# run, the first requests would pay for all of it.
+#
+# Only a missing configuration aborts startup. An unreachable dependency is
+# logged and left to /readyz, which keeps the instance out of rotation until
+# the dependency answers.
+
+logger = logging.getLogger(__name__)
+
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", 4))
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", 2.0))
+
+def _check_database() -> None:
+    db.ping()
+
+def _check_jwks() -> None:
+    security.ensure_jwks()
+
+def _check_storage() -> None:
+    # also opens the client's first pooled TLS connection
+    s3.ping_bucket(s3.S3_BUCKET_NAME)
+
+READINESS_CHECKS: Dict[str, Callable[[], None]] = {
+    "database": _check_database,
+    "jwks": _check_jwks,
+    "storage": _check_storage,
+}
+
+async def run_check(check: Callable[[], None], timeout: Optional[float] = None) -> dict:
+    timeout = READINESS_TIMEOUT if timeout is None else timeout
+    start = time.perf_counter()
+    result = {"ok": False}
+    # abandon_on_cancel=True: a hung dependency must not hang the probe along with it
+    with anyio.move_on_after(timeout):
+        try:
+            await anyio.to_thread.run_sync(check, abandon_on_cancel=True)
+            result["ok"] = True
+        except Exception as e:
+            # the probe is unauthenticated: details go to the log only
+            logger.warning("readiness check %s failed: %s", check.__name__, e)
+            result["error"] = type(e).__name__
+    if not result["ok"] and "error" not in result:
+        result["error"] = f"timed out after {timeout}s"
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+async def check_readiness() -> Dict[str, dict]:
+    results: Dict[str, dict] = {}
+
+    async def check(name: str) -> None:
+        results[name] = await run_check(READINESS_CHECKS[name])
+
+    async with anyio.create_task_group() as tg:
+        for name in READINESS_CHECKS:
+            tg.start_soon(check, name)
+    return {name: results[name] for name in READINESS_CHECKS}
+
+async def _warm_up(name: str, func: Callable, *args) -> None:
+    start = time.perf_counter()
+    try:
+        await anyio.to_thread.run_sync(func, *args)
+    except Exception:
+        logger.exception("warm-up of %s failed; /readyz will report it", name)
+        return
+    logger.info("warmed up %s in %.1f ms", name, (time.perf_counter() - start) * 1000)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # configuration errors are fatal, connection errors are not
+    db.init_engine()
+    await _warm_up("database", db.warm_pool, min(DB_WARM_CONNECTIONS, db.DB_POOL_SIZE))
+    await _warm_up("jwks", _check_jwks)
+    await _warm_up("storage", _check_storage)
+    audit.buffer.start()
+    events.hub.start(db.get_engine())
+    try:
+        yield
+    finally:
+        # open event streams end first, pending audit events go out before the pool closes
+        events.hub.stop()
+        await anyio.to_thread.run_sync(events.hub.join)
+        await anyio.to_thread.run_sync(audit.buffer.stop)
+        db.dispose_engine()
@@ -0,0 +1,245 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core import bulkheads
+
+# In-process metrics in the Prometheus text format, plus per-request stage
+# timings that are reported back in a Server-Timing header. Each worker
+# process keeps its own registry; scrape every worker.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = ['%s="%s"' % (name, str(value).replace('"', "'").replace("\n", " ")) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *label_values) -> int:
+        series = self._values.get(label_values)
+        return series[-1] if series else 0
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._values.items()]
+        for label_values, series in items:
+            for bound, bucket_count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {bucket_count}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}"
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status",
+    ("method", "route", "status"),
+)
+STAGE_DURATION = Histogram(
+    "http_request_stage_duration_seconds", "Time spent per request stage (auth, check_user, db, storage)",
+    ("stage",),
+)
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement execution time")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements issued per request", ("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 50, 100),
+)
+STORAGE_CALL_DURATION = Histogram(
+    "storage_call_duration_seconds", "Object storage API call latency by operation", ("operation",),
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+DB_REPEATED_STATEMENTS = Counter(
+    "db_repeated_statement_requests_total",
+    "Requests that repeated one statement shape (likely N+1), counted only with QUERY_DEBUG", ("route",),
+)
+AUDIT_EVENTS = Counter("audit_events_total", "Audit events by outcome (queued, written, rejected)", ("outcome",))
+AUDIT_FLUSH_FAILURES = Counter("audit_flush_failures_total", "Audit batch writes that failed and were retried")
+EVENT_STREAMS = Counter(
+    "event_streams_total", "Event streams by outcome (opened, closed, overflowed, rejected)", ("outcome",),
+)
+EVENTS_DELIVERED = Counter("events_delivered_total", "Events queued to open event streams")
+
+REGISTRY = [REQUEST_DURATION, STAGE_DURATION, DB_QUERY_DURATION, DB_QUERIES_PER_REQUEST,
+            STORAGE_CALL_DURATION, CACHE_REQUESTS, DB_REPEATED_STATEMENTS, AUDIT_EVENTS, AUDIT_FLUSH_FAILURES,
+            EVENT_STREAMS, EVENTS_DELIVERED]
+
+class RequestTimings:
+    """Stage durations for one request; shared by the threads that serve it."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        entries = []
+        for stage, seconds in self.stages.items():
+            entry = f"{stage};dur={seconds * 1000:.1f}"
+            if self.counts[stage] > 1:
+                entry += f';desc="{self.counts[stage]} calls"'
+            entries.append(entry)
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_DURATION.observe(seconds, stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+# --- SQLAlchemy: every statement on every engine ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_times"].pop()
+    DB_QUERY_DURATION.observe(elapsed)
+    record_stage("db", elapsed)
+
+# --- boto: per-operation latency of real API calls (presigning makes none) ---
+
+def _before_storage_call(context, **kwargs):
+    context["metrics_start"] = time.perf_counter()
+
+def _after_storage_call(model, context, **kwargs):
+    start = context.pop("metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    STORAGE_CALL_DURATION.observe(elapsed, model.name)
+    record_stage("storage", elapsed)
+
+def instrument_boto_client(client):
+    client.meta.events.register("before-call.s3.*", _before_storage_call)
+    client.meta.events.register("after-call.s3.*", _after_storage_call)
+    return client
+
+def render_latest() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.append("# HELP thread_pool_threads Configured threads per pool")
+    lines.append("# TYPE thread_pool_threads gauge")
+    pools = bulkheads.snapshot()
+    for pool, stats in pools.items():
+        lines.append(f'thread_pool_threads{{pool="{pool}"}} {stats["size"]}')
+    lines.append("# HELP thread_pool_busy Threads currently in use per pool")
+    lines.append("# TYPE thread_pool_busy gauge")
+    for pool, stats in pools.items():
+        lines.append(f'thread_pool_busy{{pool="{pool}"}} {stats["busy"]}')
+    lines.append("# HELP thread_pool_waiting Tasks waiting for a thread per pool")
+    lines.append("# TYPE thread_pool_waiting gauge")
+    for pool, stats in pools.items():
+        lines.append(f'thread_pool_waiting{{pool="{pool}"}} {stats["waiting"]}')
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """Times each request, exposes the stage breakdown as Server-Timing."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timings.reset(token)
+            route = scope.get("route")
+            route_template = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], route_template, str(status))
+            DB_QUERIES_PER_REQUEST.observe(timings.counts.get("db", 0), route_template)
@@ -2,7 +2,7 @@ from fastapi import Depends, HTTPException, status
 from app.core.security import get_current_user
 
 def require_role(required_role: str):
-  def role_checker(current_user: dict = Depends(get_current_user)) -> dict:
+  async def role_checker(current_user: dict = Depends(get_current_user)) -> dict:
     if required_role not in current_user.get('roles', []):
       raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
@@ -12,7 +12,7 @@ def require_role(required_role: str):
   return role_checker
 
 def require_permission(required_permission: str):
-  def permission_checker(current_user: dict = Depends(get_current_user)) -> dict:
+  async def permission_checker(current_user: dict = Depends(get_current_user)) -> dict:
     if required_permission not in current_user.get('permissions', []):
       raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,156 @@
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Opt-in stack-sampling profiler for single requests.
+#
+# A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or at
+# random with probability PROFILE_SAMPLE_RATE. A sampler thread then reads the
+# stacks of the worker threads serving that request (every bulkhead hop
+# attaches its thread) and writes collapsed stacks - the input format of
+# flamegraph.pl and speedscope - to PROFILE_DIR. Token-triggered requests also
+# get a short summary in X-Profile-Summary. With neither setting configured the
+# middleware does nothing but pass requests through.
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 30))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", 2))
+MAX_STACK_DEPTH = 128
+
+class RequestProfile:
+    def __init__(self, interval: float = PROFILE_INTERVAL, max_seconds: float = PROFILE_MAX_SECONDS) -> None:
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.threads = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[_fold(frame)] += 1
+                    self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 3) -> str:
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        parts = [f"samples={self.samples}"]
+        for leaf, count in leaves.most_common(top):
+            parts.append(f"{leaf} {100 * count // max(self.samples, 1)}%")
+        # header values must stay latin-1 and single line
+        return "; ".join(parts).encode("latin-1", "replace").decode("latin-1")
+
+def _fold(frame) -> str:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":"))
+        frame = frame.f_back
+    # collapsed format: ";" separates frames, the last space separates the count
+    return ";".join(reversed(labels))
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+def attached(func: Callable, *args, **kwargs):
+    """Call func, sampling the current thread if the request is being profiled."""
+    profile = _current_profile.get()
+    if profile is None:
+        return func(*args, **kwargs)
+    ident = threading.get_ident()
+    profile.threads.add(ident)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.threads.discard(ident)
+
+def _output_path(scope: Scope) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:80]
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{slug}-{random.getrandbits(32):08x}.folded"
+    return os.path.join(PROFILE_DIR, name)
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.enabled = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+        self.active = 0
+
+    def _requested(self, scope: Scope) -> bool:
+        supplied = Headers(scope=scope).get("x-profile")
+        return bool(PROFILE_TOKEN and supplied and hmac.compare_digest(supplied, PROFILE_TOKEN))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self._requested(scope)
+        sampled = not requested and PROFILE_DIR and random.random() < PROFILE_SAMPLE_RATE
+        if not (requested or sampled) or self.active >= PROFILE_MAX_CONCURRENT:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        self.active += 1
+        profile.start()
+        stopped = False
+
+        def finish() -> Optional[str]:
+            nonlocal stopped
+            if stopped:
+                return None
+            stopped = True
+            profile.stop()
+            self.active -= 1
+            if not PROFILE_DIR:
+                return None
+            path = _output_path(scope)
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(path, "w") as f:
+                f.write(profile.collapsed())
+            return path
+
+        async def send_with_profile(message: Message) -> None:
+            # the handler is done once headers go out; streamed bodies aren't profiled
+            if message["type"] == "http.response.start":
+                path = finish()
+                if requested:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("X-Profile-Summary", profile.summary())
+                    if path:
+                        headers.append("X-Profile-File", os.path.basename(path))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current_profile.reset(token)
+            finish()
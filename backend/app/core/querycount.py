@@ -0,0 +1,117 @@
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import DB_REPEATED_STATEMENTS
+
+# Statement counting per request, with N+1 detection.
+#
+# The per-request count is always exported (db_queries_per_request). With
+# QUERY_DEBUG on, every statement is also reduced to its shape - the SQL with
+# literals, placeholders and IN lists collapsed - and a request that issues one
+# shape QUERY_REPEAT_THRESHOLD times or more, typically a lazy relationship
+# loaded inside a loop, is logged and flagged in X-Query-Repeats.
+#
+# capture_queries() records every statement while it is active, whichever
+# request or thread issues it; tests use it to hold routes to a query budget.
+
+logger = logging.getLogger(__name__)
+
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "").lower() in ("1", "true", "yes", "on")
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 3))
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+class QueryLog:
+    def __init__(self) -> None:
+        self.statements: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str) -> None:
+        with self._lock:
+            self.statements.append(statement)
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statement shapes issued at least `threshold` times, most frequent first."""
+        shapes = Counter(statement_shape(statement) for statement in self.statements)
+        return [(shape, n) for shape, n in shapes.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        return "\n".join(f"  {i + 1}. {_WHITESPACE.sub(' ', s).strip()}" for i, s in enumerate(self.statements))
+
+_current_log: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+_captures: List[QueryLog] = []
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    log = _current_log.get()
+    if log is not None:
+        log.record(statement)
+    for capture in list(_captures):
+        capture.record(statement)
+
+@contextmanager
+def capture_queries():
+    """Collect every statement executed while the block runs."""
+    log = QueryLog()
+    _captures.append(log)
+    try:
+        yield log
+    finally:
+        _captures.remove(log)
+
+class QueryDebugMiddleware:
+    def __init__(self, app: ASGIApp, enabled: bool = QUERY_DEBUG, threshold: int = QUERY_REPEAT_THRESHOLD) -> None:
+        self.app = app
+        self.enabled = enabled
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _current_log.set(log)
+
+        async def send_with_counts(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Query-Count", str(log.count))
+                repeated = log.repeated(self.threshold)
+                if repeated:
+                    headers.append("X-Query-Repeats", str(len(repeated)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_counts)
+        finally:
+            _current_log.reset(token)
+            repeated = log.repeated(self.threshold)
+            if repeated:
+                route = scope.get("route")
+                route_template = getattr(route, "path_format", None) or scope["path"]
+                DB_REPEATED_STATEMENTS.inc(route_template)
+                for shape, n in repeated:
+                    logger.warning("possible N+1 on %s %s: %d x %s", scope["method"], route_template, n, shape)
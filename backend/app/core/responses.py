@@ -0,0 +1,34 @@
+from functools import lru_cache
+from typing import Any, List, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Plain dict responses (messages, errors) go through orjson when it is installed
+DefaultResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+@lru_cache(maxsize=None)
+def _adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+def model_response(schema: Any, data: Any, many: bool = False, status_code: int = 200,
+                   headers: Optional[dict] = None) -> Response:
+    """Serialize ORM rows (or model instances) to JSON bytes with pydantic-core.
+
+    Returning a Response from a route bypasses FastAPI's response_model
+    re-validation and jsonable_encoder; the route's response_model is still
+    used for the OpenAPI schema.
+    """
+    adapter = _adapter(List[schema] if many else schema)
+    value = adapter.validate_python(data, from_attributes=True)
+    return Response(
+        content=adapter.dump_json(value),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
@@ -1,17 +1,66 @@
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from jose import jwt, JWTError
 import requests
 import os
-import dotenv
+import threading
+import time
+from typing import Optional
 from app.db import get_db
+from app.core import bulkheads
+from app.core.metrics import timed, record_cache
 from sqlalchemy.orm import Session
 
 bearer = HTTPBearer()
 
-JWKS = requests.get(
-    f"https://{os.getenv('AUTH0_DOMAIN')}/.well-known/jwks.json"
-).json()
+# The signing keys are fetched on first use (or by the app lifespan), and
+# refetched when a token names a key id we have not seen, i.e. after the issuer
+# rotates its keys. Refetches are spaced at least JWKS_MIN_REFRESH_SECONDS apart
+# so tokens with made-up key ids cannot hammer the issuer.
+JWKS_TIMEOUT = float(os.getenv("JWKS_TIMEOUT", 5))
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_SECONDS", 60))
+
+_jwks: Optional[dict] = None
+_jwks_fetched_at = 0.0
+_jwks_lock = threading.Lock()
+
+def fetch_jwks() -> dict:
+    response = requests.get(
+        f"https://{os.getenv('AUTH0_DOMAIN')}/.well-known/jwks.json",
+        timeout=JWKS_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+def load_jwks(jwks: Optional[dict] = None) -> dict:
+    """Install a key set, fetching it from the issuer unless one is given."""
+    global _jwks, _jwks_fetched_at
+    with _jwks_lock:
+        _jwks = jwks if jwks is not None else fetch_jwks()
+        _jwks_fetched_at = time.monotonic()
+        return _jwks
+
+def ensure_jwks() -> dict:
+    return _jwks if _jwks is not None else load_jwks()
+
+def _find_key(jwks: Optional[dict], kid: str) -> Optional[dict]:
+    if jwks is None:
+        return None
+    return next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None)
+
+def get_signing_key(kid: str) -> Optional[dict]:
+    key = _find_key(_jwks, kid)
+    record_cache("jwks", key is not None)
+    if key is not None:
+        return key
+    if _jwks is not None and time.monotonic() - _jwks_fetched_at < JWKS_MIN_REFRESH_SECONDS:
+        return None
+    try:
+        jwks = load_jwks()
+    except (requests.RequestException, ValueError):
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Unable to fetch signing keys")
+    return _find_key(jwks, kid)
 
 def get_token_auth_header(
     creds: HTTPAuthorizationCredentials = Depends(bearer)
@@ -19,28 +68,45 @@ def get_token_auth_header(
 
     return creds.credentials
 
-def verify_jwt(token: str) -> dict:
-    header = jwt.get_unverified_header(token)
-    key = next(
-        (k for k in JWKS["keys"] if k["kid"] == header["kid"]),
-        None
-    )
-    if not key:
-        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid token header")
+def _unverified_kid(token: str) -> Optional[str]:
+    try:
+        return jwt.get_unverified_header(token).get("kid")
+    except JWTError as e:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, str(e))
+
+def decode_jwt(token: str, key: dict) -> dict:
+    """Check the signature and claims against an already resolved signing key."""
     try:
-        payload = jwt.decode(
-            token,
-            key,
-            algorithms=["RS256"],
-            audience=os.getenv("API_AUDIENCE"),
-            issuer=f"https://{os.getenv('AUTH0_DOMAIN')}/"
-        )
+        with timed("auth"):
+            return jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=os.getenv("API_AUDIENCE"),
+                issuer=f"https://{os.getenv('AUTH0_DOMAIN')}/"
+            )
     except JWTError as e:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, str(e))
-    return payload
 
-def get_current_user(token: str = Depends(get_token_auth_header), db: Session = Depends(get_db)) -> dict:
-    payload = verify_jwt(token)
+def verify_jwt(token: str) -> dict:
+    key = get_signing_key(_unverified_kid(token))
+    if not key:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid token header")
+    return decode_jwt(token, key)
+
+# async so that only the signature check itself takes a thread from the cpu
+# pool. A key id we do not have means a refetch from the issuer, which is
+# network I/O held under _jwks_lock: it waits in the default threadpool, so a
+# slow issuer during a rotation cannot take the cpu slots every request needs
+async def get_current_user(token: str = Depends(get_token_auth_header), db: Session = Depends(get_db)) -> dict:
+    kid = _unverified_kid(token)
+    if _find_key(_jwks, kid) is not None:
+        key = get_signing_key(kid)
+    else:
+        key = await run_in_threadpool(get_signing_key, kid)
+    if not key:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid token header")
+    payload = await bulkheads.run("cpu", decode_jwt, token, key)
     auth0_user_id = payload.get('sub')  # Auth0 user ID
     email = payload.get('email')
     name = payload.get('name')
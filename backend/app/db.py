@@ -1,26 +1,70 @@
 import os
-from sqlalchemy import create_engine
+from typing import Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from dotenv import load_dotenv
 
-load_dotenv()
+# The engine is created on first use (normally by the app lifespan), so that
+# importing the app needs neither DATABASE_URL nor a reachable database.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("no database url found")
+engine: Optional[Engine] = None
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL, 
-    pool_pre_ping=True,  # Good for connection health checks
-)
-
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+SessionLocal = sessionmaker(autoflush=False, autocommit=False)
 
 class Base(DeclarativeBase):
     pass
 
+def init_engine(database_url: Optional[str] = None) -> Engine:
+    global engine
+    if engine is not None:
+        return engine
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("no database url found")
+    options = {}
+    if not database_url.startswith("sqlite"):
+        options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+    engine = create_engine(
+        database_url,
+        pool_pre_ping=True,  # Good for connection health checks
+        **options,
+    )
+    SessionLocal.configure(bind=engine)
+    return engine
+
+def get_engine() -> Engine:
+    return engine if engine is not None else init_engine()
+
+def warm_pool(connections: int) -> int:
+    """Open `connections` pooled connections up front; returns how many were opened."""
+    target = get_engine()
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = target.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        # closing returns them to the pool, where they stay open
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+def ping() -> None:
+    with get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+def dispose_engine() -> None:
+    global engine
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
 def get_db():
+    if engine is None:
+        init_engine()
     db = SessionLocal()
     try:
         yield db
@@ -0,0 +1,5 @@
+# Maintenance jobs, run as `python -m app.jobs.<name>`
+from dotenv import load_dotenv
+
+# Jobs are entry points of their own: read .env before app modules read their settings
+load_dotenv()
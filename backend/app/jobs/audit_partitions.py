@@ -0,0 +1,64 @@
+"""Create the upcoming monthly partitions of audit_events.
+
+The migration creates twelve months of partitions plus a DEFAULT one; run
+this regularly (e.g. a daily cron) so future months always have their own
+partition before the first event lands in them. A month is only created
+while the DEFAULT partition holds none of its rows, which is the case as
+long as the job runs ahead of time.
+
+    python -m app.jobs.audit_partitions [--months-ahead 3]
+"""
+import argparse
+from datetime import date
+from typing import Iterator, List
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.db import init_engine
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"audit_events_y{month:%Y}m{month:%m}"
+
+def upcoming_months(today: date, months_ahead: int) -> Iterator[date]:
+    start = today.replace(day=1)
+    for i in range(months_ahead + 1):
+        yield add_months(start, i)
+
+def ensure_partitions(engine: Engine, today: date, months_ahead: int = 3, out=print) -> List[str]:
+    if engine.dialect.name != "postgresql":
+        out("audit_events is only partitioned on postgresql, nothing to do")
+        return []
+    created = []
+    with engine.begin() as connection:
+        existing = set(connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'audit_events'"
+        )).scalars())
+        for month in upcoming_months(today, months_ahead):
+            name = partition_name(month)
+            if name in existing:
+                continue
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF audit_events "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+            out(f"created {name}")
+    return created
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--months-ahead", type=int, default=3,
+                        help="make sure partitions exist for this many months after the current one")
+    args = parser.parse_args(argv)
+
+    created = ensure_partitions(init_engine(), date.today(), args.months_ahead)
+    print(f"created={len(created)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Fill in size, sha256, detected type and page count of documents uploaded before they were recorded.
+
+Documents without a sha256 are read in id order, one keyset page at a time;
+the objects of a page are streamed from storage (decrypted, like a download)
+a few at a time and the page is committed before the next is read, so the job
+can be stopped and rerun at any point. Documents whose object is missing are
+reported and left NULL.
+
+Each page is written with one Core UPDATE that moves updated_at forward, so
+list and detail ETags change, plus a change_log upsert per document in the
+same transaction, so change-feed clients fetch the filled-in columns. The
+per-document SSE events the ORM would publish are skipped: a backfill would
+flood every open stream, and the feed and ETags already carry the change.
+
+    python -m app.jobs.backfill_file_info [--batch-size 100] [--concurrency 4]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+from app.db import SessionLocal, init_engine
+from app.models.models import Document
+from app.services.changes import record_document_upserts
+from app.services.file_info import FILE_INFO_COLUMNS, inspect_chunks
+from app.services.s3 import stream_file, S3_BUCKET_NAME
+
+def read_file_info(file_path: str) -> dict:
+    return inspect_chunks(stream_file(S3_BUCKET_NAME, file_path))
+
+documents = Document.__table__
+
+# executemany over the page
+_UPDATE = (
+    update(documents)
+    .where(documents.c.id == bindparam("b_id"), documents.c.patient_id == bindparam("b_patient_id"))
+    .values(updated_at=func.now(), **{name: bindparam(name) for name in FILE_INFO_COLUMNS})
+)
+
+def backfill(db: Session, batch_size: int = 100, concurrency: int = 4, out=print) -> dict:
+    stats = {"updated": 0, "failed": 0}
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        while True:
+            rows = db.execute(
+                select(documents.c.id, documents.c.patient_id, documents.c.file_path)
+                .where(documents.c.sha256.is_(None), documents.c.id > last_id)
+                .order_by(documents.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            futures = [executor.submit(read_file_info, row.file_path) for row in rows]
+            params = []
+            filled = []
+            for row, future in zip(rows, futures):
+                try:
+                    file_info = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    out(f"document {row.id}: {e}")
+                    continue
+                params.append({"b_id": row.id, "b_patient_id": row.patient_id, **file_info})
+                filled.append(row)
+            if params:
+                db.execute(_UPDATE, params)
+                record_document_upserts(db, filled)
+            db.commit()
+            stats["updated"] += len(params)
+            out(f"done up to document {last_id}")
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--batch-size", type=int, default=100, help="documents per page and commit")
+    parser.add_argument("--concurrency", type=int, default=4, help="objects read from storage at a time")
+    args = parser.parse_args(argv)
+
+    init_engine()
+    db = SessionLocal()
+    try:
+        stats = backfill(db, args.batch_size, args.concurrency)
+    finally:
+        db.close()
+    print(f"updated={stats['updated']} failed={stats['failed']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Generate synthetic doctors, patients and documents at production scale.
+
+Rows are produced lazily and loaded in batches - with COPY on Postgres,
+multi-row INSERTs elsewhere - never through the ORM, so memory stays flat at
+any scale. Distributions are skewed the way real practices are: a few
+doctors hold many patients and a few patients many documents, with a long
+tail of small ones (Zipf, exponents --doctor-skew and --document-skew). Ranks
+are sampled directly rather than from a table of weights, so the only state
+kept per patient is its doctor. A share of patients is left unassigned, as
+check_doctor_patient_constraint allows.
+
+    python -m app.jobs.generate_data --doctors 10000 --patients 1000000 --documents 20000000
+    python -m app.jobs.generate_data --doctors 20 --patients 2000 --documents 40000 --storage-dir /tmp/objects
+
+Ids are derived from --prefix and the row number, so load into an empty
+database or pick a new prefix for each run. With --storage-dir (or --upload,
+for an S3-compatible store behind S3_ENDPOINT_URL) a small placeholder
+object is written for every document, under the same key as its file_path.
+"""
+import argparse
+import bisect
+import csv
+import io
+import math
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, islice
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.db import init_engine
+from app.models.models import User, Document
+
+USER_COLUMNS = ("auth0_user_id", "email", "first_name", "last_name", "role", "date_of_birth", "phone",
+                "doctor_id", "created_at", "updated_at")
+DOCUMENT_COLUMNS = ("filename", "file_path", "content_type", "description", "patient_id", "uploaded_by_id",
+                    "created_at", "updated_at")
+
+FIRST_NAMES = ("James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+               "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Wei", "Priya", "Mohammed", "Sofia",
+               "Hiroshi", "Fatima", "Carlos", "Olga", "Kwame", "Ana", "Liam", "Aisha", "Mateo", "Yuki")
+LAST_NAMES = ("Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+              "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+              "Lee", "Nguyen", "Patel", "Kim", "Chen", "Okafor", "Ivanova", "Tanaka", "Haddad", "Kowalski")
+# (extension, content type, weight)
+DOCUMENT_TYPES = (
+    ("pdf", "application/pdf", 60),
+    ("jpg", "image/jpeg", 20),
+    ("png", "image/png", 10),
+    ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", 10),
+)
+DOCUMENT_KINDS = ("lab-results", "referral", "discharge-summary", "imaging-report", "prescription",
+                  "consent-form", "insurance-card", "vaccination-record", "visit-notes", "x-ray")
+DESCRIPTIONS = (None, None, None, "Uploaded after visit", "Follow-up requested", "Scanned copy", "Signed by patient")
+
+def _log1p_over(x: float) -> float:
+    return math.log1p(x) / x if abs(x) > 1e-8 else 1.0 - x / 2
+
+def _expm1_over(x: float) -> float:
+    return math.expm1(x) / x if abs(x) > 1e-8 else 1.0 + x / 2
+
+class ZipfSampler:
+    """Picks index i in [0, n) with probability ~ 1 / (i + 1) ** skew, in constant memory.
+
+    Rejection-inversion (Hörmann and Derflinger): invert the integral of the
+    density in closed form and reject the few draws that land outside the
+    discrete bars; on average well under two uniforms per sample.
+    """
+
+    def __init__(self, n: int, skew: float) -> None:
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        self.n = n
+        self.skew = skew
+        self.h_integral_x1 = self._h_integral(1.5) - 1.0
+        self.h_integral_n = self._h_integral(n + 0.5)
+        self.threshold = 2.0 - self._h_integral_inverse(self._h_integral(2.5) - self._h(2.0))
+
+    def _h(self, x: float) -> float:
+        return math.exp(-self.skew * math.log(x))
+
+    def _h_integral(self, x: float) -> float:
+        log_x = math.log(x)
+        return _expm1_over((1.0 - self.skew) * log_x) * log_x
+
+    def _h_integral_inverse(self, x: float) -> float:
+        t = max(x * (1.0 - self.skew), -1.0)
+        return math.exp(_log1p_over(t) * x)
+
+    def __call__(self, rng: random.Random) -> int:
+        while True:
+            u = self.h_integral_n + rng.random() * (self.h_integral_x1 - self.h_integral_n)
+            x = self._h_integral_inverse(u)
+            k = min(max(int(x + 0.5), 1), self.n)
+            if k - x <= self.threshold or u >= self._h_integral(k + 0.5) - self._h(k):
+                return k - 1
+
+def shuffled_index(rng: random.Random, n: int) -> Callable[[int], int]:
+    """A random bijection of range(n) as an affine map, instead of a shuffled list of n ints."""
+    multiplier = 1
+    if n > 1:
+        multiplier = rng.randrange(1, n)
+        while math.gcd(multiplier, n) != 1:
+            multiplier = rng.randrange(1, n)
+    offset = rng.randrange(n)
+    return lambda i: (multiplier * i + offset) % n
+
+def pick(rng: random.Random, cum_weights: Sequence[float]) -> int:
+    return bisect.bisect_left(cum_weights, rng.random() * cum_weights[-1])
+
+def doctor_id(prefix: str, i: int) -> str:
+    return f"{prefix}|doctor{i:07d}"
+
+def patient_id(prefix: str, i: int) -> str:
+    return f"{prefix}|patient{i:09d}"
+
+def _timestamp(rng: random.Random, now: datetime, days: int) -> datetime:
+    return (now - timedelta(seconds=rng.randrange(days * 86400))).replace(microsecond=0)
+
+def _person(rng: random.Random, prefix: str, i: int, role: str) -> Tuple[str, str, str]:
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    email = f"{first}.{last}.{role[0]}{i}@{prefix}.example.org".lower()
+    return first, last, email
+
+def generate_doctors(rng: random.Random, prefix: str, count: int, now: datetime, days: int) -> Iterator[tuple]:
+    for i in range(count):
+        first, last, email = _person(rng, prefix, i, "doctor")
+        created = _timestamp(rng, now, days)
+        phone = f"555-{rng.randrange(10000):04d}"
+        yield (doctor_id(prefix, i), email, first, last, "doctor", None, phone, None, created, created)
+
+def generate_patients(rng: random.Random, prefix: str, count: int, doctors: int, unassigned: float, skew: float,
+                      assignments: array, now: datetime, days: int) -> Iterator[tuple]:
+    """Patient rows; fills `assignments` with each patient's doctor index (-1 when unassigned)."""
+    pick_doctor = ZipfSampler(doctors, skew) if doctors else None
+    for i in range(count):
+        doctor = -1
+        if pick_doctor and rng.random() >= unassigned:
+            doctor = pick_doctor(rng)
+        assignments.append(doctor)
+        first, last, email = _person(rng, prefix, i, "patient")
+        birth = datetime(1930, 1, 1) + timedelta(days=rng.randrange(90 * 365))
+        phone = f"555-{rng.randrange(10000):04d}" if rng.random() < 0.8 else None
+        created = _timestamp(rng, now, days)
+        yield (patient_id(prefix, i), email, first, last, "patient", birth, phone,
+               doctor_id(prefix, doctor) if doctor >= 0 else None, created, created)
+
+def generate_documents(rng: random.Random, prefix: str, count: int, assignments: array, doctors: int, skew: float,
+                       now: datetime, days: int) -> Iterator[tuple]:
+    patients = len(assignments)
+    # heavy users are spread over the id range rather than being the first patients
+    ranked = shuffled_index(rng, patients)
+    pick_rank = ZipfSampler(patients, skew)
+    type_weights = list(accumulate(weight for _, _, weight in DOCUMENT_TYPES))
+    for _ in range(count):
+        patient = ranked(pick_rank(rng))
+        owner = patient_id(prefix, patient)
+        doctor = assignments[patient]
+        # documents of unassigned patients were uploaded by a former doctor
+        uploader = doctor_id(prefix, doctor if doctor >= 0 else rng.randrange(doctors))
+        extension, content_type, _ = DOCUMENT_TYPES[pick(rng, type_weights)]
+        created = _timestamp(rng, now, days)
+        filename = f"{rng.choice(DOCUMENT_KINDS)}-{created:%Y%m%d}.{extension}"
+        file_path = f"documents/{owner}/{rng.getrandbits(128):032x}.{extension}"
+        yield (filename, file_path, content_type, rng.choice(DESCRIPTIONS), owner, uploader, created, created)
+
+def _batches(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def csv_batch(rows: Iterable[tuple]) -> str:
+    """COPY ... (FORMAT csv) input; None becomes an unquoted empty field, i.e. NULL."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows:
+        writer.writerow(["" if value is None else value.isoformat(sep=" ") if isinstance(value, datetime) else value
+                         for value in row])
+    return buffer.getvalue()
+
+def _copy(raw_connection, table: str, columns: Sequence[str], data: str) -> None:
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = raw_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, io.StringIO(data))
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(data)
+    finally:
+        cursor.close()
+
+def load(engine: Engine, table, columns: Sequence[str], rows: Iterable[tuple], batch_size: int,
+         on_batch=None, out=print) -> int:
+    """Load rows into `table` batch by batch, committing each batch; returns the row count."""
+    total = 0
+    start = time.monotonic()
+    if engine.dialect.name == "postgresql":
+        raw_connection = engine.raw_connection()
+        try:
+            for batch in _batches(rows, batch_size):
+                _copy(raw_connection, table.name, columns, csv_batch(batch))
+                raw_connection.commit()
+                total += len(batch)
+                if on_batch:
+                    on_batch(batch)
+                out(f"{table.name}: {total} rows ({total / max(time.monotonic() - start, 1e-9):.0f}/s)")
+        finally:
+            raw_connection.close()
+        return total
+
+    # other databases (sqlite for development): multi-row INSERTs
+    with engine.connect() as connection:
+        for batch in _batches(rows, batch_size):
+            connection.execute(table.insert(), [dict(zip(columns, row)) for row in batch])
+            connection.commit()
+            total += len(batch)
+            if on_batch:
+                on_batch(batch)
+            out(f"{table.name}: {total} rows ({total / max(time.monotonic() - start, 1e-9):.0f}/s)")
+    return total
+
+def placeholder_object(content_type: str, size: int) -> bytes:
+    header = b"%PDF-1.4\n" if content_type == "application/pdf" else b""
+    return header + b"\0" * max(size - len(header), 0)
+
+class ObjectWriter:
+    """Writes one placeholder object per document row, to a directory or the configured bucket."""
+
+    def __init__(self, storage_dir: Optional[str] = None, upload: bool = False, size: int = 1024,
+                 workers: int = 16) -> None:
+        self.storage_dir = storage_dir
+        self.upload = upload
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=workers) if upload else None
+
+    def _put(self, key: str, content_type: str) -> None:
+        data = placeholder_object(content_type, self.size)
+        if self.storage_dir:
+            path = os.path.join(self.storage_dir, *key.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        if self.upload:
+            from app.services.s3 import upload_file, S3_BUCKET_NAME
+            upload_file(io.BytesIO(data), S3_BUCKET_NAME, key)
+
+    def __call__(self, batch: List[tuple]) -> None:
+        keys = [(row[1], row[2]) for row in batch]
+        if self.executor:
+            list(self.executor.map(lambda item: self._put(*item), keys))
+        else:
+            for key, content_type in keys:
+                self._put(key, content_type)
+
+    def close(self) -> None:
+        if self.executor:
+            self.executor.shutdown()
+
+def generate(engine: Engine, doctors: int, patients: int, documents: int, unassigned: float = 0.1,
+             doctor_skew: float = 0.8, document_skew: float = 0.6, prefix: str = "synthetic",
+             batch_size: int = 50000, seed: Optional[int] = None, days: int = 3 * 365,
+             objects: Optional[ObjectWriter] = None, out=print) -> dict:
+    if documents and not doctors:
+        raise ValueError("documents need at least one doctor as uploader")
+    if documents and not patients:
+        raise ValueError("documents need at least one patient")
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    assignments = array("i")
+    users = User.__table__
+    stats = {
+        "doctors": load(engine, users, USER_COLUMNS, generate_doctors(rng, prefix, doctors, now, days),
+                        batch_size, out=out),
+        "patients": load(engine, users, USER_COLUMNS,
+                         generate_patients(rng, prefix, patients, doctors, unassigned, doctor_skew, assignments,
+                                           now, days),
+                         batch_size, out=out),
+        "documents": load(engine, Document.__table__, DOCUMENT_COLUMNS,
+                          generate_documents(rng, prefix, documents, assignments, doctors, document_skew, now, days),
+                          batch_size, on_batch=objects, out=out),
+    }
+    if engine.dialect.name == "postgresql":
+        # fresh statistics, or the planner works from an empty table's estimates
+        with engine.connect() as connection:
+            connection.execute(text(f"ANALYZE {users.name}, {Document.__table__.name}"))
+            connection.commit()
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--documents", type=int, default=200000)
+    parser.add_argument("--unassigned", type=float, default=0.1, help="share of patients without a doctor")
+    # with the defaults, at 10k doctors / 1M patients / 20M documents the busiest doctor has ~3% of the
+    # patients and the median one a few dozen; the median patient has about a dozen documents
+    parser.add_argument("--doctor-skew", type=float, default=0.8, help="Zipf exponent of patients per doctor")
+    parser.add_argument("--document-skew", type=float, default=0.6, help="Zipf exponent of documents per patient")
+    parser.add_argument("--prefix", default="synthetic", help="prefix of generated user ids and email domains")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, help="make the data set reproducible")
+    parser.add_argument("--days", type=int, default=3 * 365, help="spread creation times over this many days")
+    parser.add_argument("--storage-dir", help="write a placeholder object per document under this directory")
+    parser.add_argument("--upload", action="store_true",
+                        help="upload a placeholder object per document to S3_BUCKET_NAME")
+    parser.add_argument("--object-size", type=int, default=1024)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    objects = None
+    if args.storage_dir or args.upload:
+        objects = ObjectWriter(args.storage_dir, args.upload, args.object_size)
+    try:
+        stats = generate(init_engine(args.database_url), args.doctors, args.patients, args.documents,
+                         args.unassigned, args.doctor_skew, args.document_skew, args.prefix, args.batch_size,
+                         args.seed, args.days, objects)
+    finally:
+        if objects:
+            objects.close()
+    print(f"doctors={stats['doctors']} patients={stats['patients']} documents={stats['documents']}")
+
+if __name__ == "__main__":
+    main()
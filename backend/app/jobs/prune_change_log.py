@@ -0,0 +1,48 @@
+"""Delete change_log rows older than the retention period.
+
+Clients holding a cursor from before the oldest remaining row get 410 from
+the change feeds and sync again from scratch, so keep the retention longer
+than clients usually stay offline. The newest row is always kept: the feeds
+tell expired cursors apart by the oldest remaining seq.
+
+    python -m app.jobs.prune_change_log [--days 90]
+"""
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Engine
+from app.db import init_engine
+from app.models.models import Change
+
+def prune(engine: Engine, older_than: datetime, batch_size: int = 10000, out=print) -> int:
+    with engine.connect() as connection:
+        newest = connection.execute(select(func.max(Change.seq))).scalar()
+        cutoff = connection.execute(
+            select(func.max(Change.seq)).where(Change.occurred_at < older_than)
+        ).scalar()
+        oldest = connection.execute(select(func.min(Change.seq))).scalar()
+    if cutoff is None:
+        return 0
+    cutoff = min(cutoff, newest - 1)
+    deleted = 0
+    # seq follows time, so deleting by seq ranges keeps every batch on the primary key
+    start = oldest
+    while start <= cutoff:
+        end = min(start + batch_size - 1, cutoff)
+        with engine.begin() as connection:
+            deleted += connection.execute(delete(Change).where(Change.seq >= start, Change.seq <= end)).rowcount
+        start = end + 1
+        out(f"deleted up to seq {end}")
+    return deleted
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--days", type=int, default=90, help="keep this many days of changes")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    deleted = prune(init_engine(), datetime.utcnow() - timedelta(days=args.days), args.batch_size)
+    print(f"deleted={deleted}")
+
+if __name__ == "__main__":
+    main()
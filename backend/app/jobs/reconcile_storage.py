@@ -0,0 +1,107 @@
+"""Find (and optionally delete) stored objects that no Document row points to.
+
+Orphans come from failed deletes in delete_patient_document, files replaced by
+update_patient_document and uploads whose DB insert failed afterwards.
+
+Both sides are read in sorted order - objects in pages via list_objects_v2,
+paths from one query on documents.file_path in byte order, fetched batch by
+batch off a server-side cursor - and merge-joined, so memory stays bounded by
+the batch sizes however large the bucket grows. file_path has no index (and
+documents is hash partitioned), so the query is a single scan and sort: paging
+it with keyset queries would rescan and resort the table for every page.
+
+    python -m app.jobs.reconcile_storage [--delete] [--prefix documents/]
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db import SessionLocal, init_engine
+from app.models.models import Document
+from app.services.s3 import list_files, delete_files, S3_BUCKET_NAME
+
+DELETE_BATCH_SIZE = 1000  # delete_objects limit
+
+def iter_document_paths(db: Session, prefix: str, batch_size: int = 1000) -> Iterator[str]:
+    # "C" collation makes Postgres order and compare by bytes, matching S3's key order
+    column = Document.file_path.collate("C") if db.get_bind().dialect.name == "postgresql" else Document.file_path
+    # yield_per implies stream_results: one batch in memory at a time
+    result = db.execute(
+        select(Document.file_path).where(column >= prefix).order_by(column),
+        execution_options={"yield_per": batch_size},
+    )
+    try:
+        for path in result.scalars():
+            if not path.startswith(prefix):
+                return
+            yield path
+    finally:
+        result.close()
+
+def find_orphans(
+    stored: Iterable[Tuple[str, datetime]],
+    referenced: Iterable[str],
+    older_than: datetime,
+) -> Iterator[str]:
+    """Merge-join two key-sorted streams, yielding stored keys with no reference.
+
+    Objects modified after `older_than` are skipped: their upload may still be
+    waiting on the Document insert.
+    """
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for key, last_modified in stored:
+        while current is not None and current < key:
+            current = next(referenced, None)
+        if current == key:
+            continue
+        if last_modified is not None and last_modified > older_than:
+            continue
+        yield key
+
+def reconcile(db: Session, prefix: str = "documents/", delete: bool = False,
+              min_age: timedelta = timedelta(hours=1), batch_size: int = 1000, out=print) -> dict:
+    older_than = datetime.now(timezone.utc) - min_age
+    stats = {"orphans": 0, "deleted": 0, "failed": 0}
+    pending = []
+
+    def flush():
+        failed = delete_files(S3_BUCKET_NAME, pending)
+        stats["failed"] += len(failed)
+        stats["deleted"] += len(pending) - len(failed)
+        for key in failed:
+            out(f"failed to delete {key}")
+        pending.clear()
+
+    stored = list_files(S3_BUCKET_NAME, prefix, page_size=batch_size)
+    for key in find_orphans(stored, iter_document_paths(db, prefix, batch_size), older_than):
+        stats["orphans"] += 1
+        out(key)
+        if delete:
+            pending.append(key)
+            if len(pending) >= DELETE_BATCH_SIZE:
+                flush()
+    if delete and pending:
+        flush()
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--prefix", default="documents/")
+    parser.add_argument("--delete", action="store_true", help="delete orphans instead of only listing them")
+    parser.add_argument("--min-age-minutes", type=int, default=60,
+                        help="ignore objects newer than this, their DB insert may be in flight")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    init_engine()
+    db = SessionLocal()
+    try:
+        stats = reconcile(db, args.prefix, args.delete, timedelta(minutes=args.min_age_minutes), args.batch_size)
+    finally:
+        db.close()
+    print(f"orphans={stats['orphans']} deleted={stats['deleted']} failed={stats['failed']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 # Database models 
-from .models import User, Document
+from .models import User, Document, AuditEvent, Change
 
-__all__ = ["User", "Document"]
\ No newline at end of file
+__all__ = ["User", "Document", "AuditEvent", "Change"]
\ No newline at end of file
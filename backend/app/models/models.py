@@ -1,5 +1,6 @@
+import uuid
 from typing import List, Optional
-from sqlalchemy import ForeignKey, Enum, String, Text, DateTime, func, CheckConstraint
+from sqlalchemy import ForeignKey, Enum, String, Text, DateTime, BigInteger, Integer, Uuid, Index, func, CheckConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from app.db import Base
@@ -105,6 +106,14 @@ class Document(Base):
     content_type: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
+    # Taken from the bytes while they are uploaded (app.services.file_info);
+    # NULL until app.jobs.backfill_file_info has read documents stored before.
+    # detected_content_type is sniffed, content_type is what the client sent.
+    size_bytes: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    detected_content_type: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    page_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    
     # The patient who "owns" this document
     patient_id: Mapped[str] = mapped_column(
         ForeignKey("users.auth0_user_id"), 
@@ -120,6 +129,24 @@ class Document(Base):
     )
     
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, 
+        server_default=func.now(), 
+        onupdate=func.now()
+    )
+    
+    # On Postgres the migrated table is hash-partitioned by patient_id (see
+    # DOCUMENT_PARTITIONS in the migration), with primary key (id, patient_id).
+    # Mapping the same identity here makes the ORM's UPDATE and DELETE carry
+    # patient_id, so they touch one partition like every route query does.
+    # ids still come from one sequence and are unique on their own.
+    __mapper_args__ = {"primary_key": [id, patient_id]}
+    
+    # newest-first reads of a patient's documents, including the doctors'
+    # recent uploads feed, walk this index instead of sorting
+    __table_args__ = (
+        Index("ix_documents_patient_id_created_at_id", "patient_id", "created_at", "id"),
+    )
     
     # --- Relationships ---
     patient: Mapped["User"] = relationship(
@@ -142,4 +169,56 @@ class Document(Base):
         return self.uploaded_by_id == user.auth0_user_id
     
     def __repr__(self):
-        return f"<Document(id={self.id}, filename={self.filename!r}, patient_id={self.patient_id}, uploaded_by_id={self.uploaded_by_id})>"
\ No newline at end of file
+        return f"<Document(id={self.id}, filename={self.filename!r}, patient_id={self.patient_id}, uploaded_by_id={self.uploaded_by_id})>"
+
+
+# Append-only record of PHI access, written in batches by app.services.audit.
+# On Postgres the table is range-partitioned by month on occurred_at (see the
+# migration and app.jobs.audit_partitions), which is why occurred_at is part of
+# the primary key. Actor and patient ids are deliberately not foreign keys:
+# audit rows must outlive the users they mention.
+class AuditEvent(Base):
+    __tablename__ = "audit_events"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    occurred_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    actor_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    actor_role: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    action: Mapped[str] = mapped_column(String(50), nullable=False)
+    patient_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    document_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    ip_address: Mapped[Optional[str]] = mapped_column(String(45), nullable=True)
+
+    __table_args__ = (
+        Index("ix_audit_events_patient_id_occurred_at", "patient_id", "occurred_at"),
+        Index("ix_audit_events_actor_id_occurred_at", "actor_id", "occurred_at"),
+        {"postgresql_partition_by": "RANGE (occurred_at)"},
+    )
+
+    def __repr__(self):
+        return f"<AuditEvent(action={self.action}, actor_id={self.actor_id}, document_id={self.document_id})>"
+
+
+# One row per change a client may need to replay: a document created, updated
+# or deleted (entity "document", keyed by patient_id) or a patient joining,
+# leaving or changing in a doctor's panel (entity "patient", keyed by
+# doctor_id). seq is the sync cursor; rows are written by
+# app.services.changes in the same transaction as the change itself.
+class Change(Base):
+    __tablename__ = "change_log"
+
+    seq: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    occurred_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    entity: Mapped[str] = mapped_column(String(20), nullable=False)
+    op: Mapped[str] = mapped_column(String(10), nullable=False)
+    patient_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    doctor_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    document_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_change_log_patient_id_seq", "patient_id", "seq"),
+        Index("ix_change_log_doctor_id_seq", "doctor_id", "seq"),
+    )
+
+    def __repr__(self):
+        return f"<Change(seq={self.seq}, entity={self.entity}, op={self.op}, patient_id={self.patient_id})>"
@@ -0,0 +1,299 @@
+"""Production server: gunicorn supervising uvicorn workers, sized for this host.
+
+    python -m app.server                                  # reads .env when present
+    python -m app.server --env-file /etc/patientlink.env --bind 0.0.0.0:8080
+    python -m app.server --check                          # print the plan and exit
+
+Workers default to the CPUs this process may use (affinity and cgroup quota),
+at least 2 and at most WEB_MAX_WORKERS; WEB_CONCURRENCY sets them outright.
+The app is imported once in the master and then forked (preload), so workers
+boot fast and share its memory; engines, threads and the event loop are still
+opened per worker, by the lifespan. uvloop and httptools are used when they
+are installed.
+
+Postgres connections are budgeted: DB_MAX_CONNECTIONS (this deployment's
+share of the server's max_connections) is split between the workers, each
+keeping one for the event listener. The rest becomes DB_POOL_SIZE plus
+DB_MAX_OVERFLOW, unless those are set, in which case a plan that would
+exceed the budget is refused. Every thread of the db and storage bulkheads can
+hold a session, so the two are lowered to fit in pool_size + max_overflow;
+when BULKHEAD_DB_THREADS or BULKHEAD_STORAGE_THREADS is set and does not fit,
+the plan is refused instead of leaving requests to time out in the pool.
+
+SIGTERM drains a worker: it stops accepting, ends open event streams (the
+clients reconnect elsewhere) and gives in-flight requests GRACEFUL_TIMEOUT
+seconds. SIGHUP to the master replaces the workers with the same preloaded
+code; ship new code by restarting the master.
+
+Without gunicorn (e.g. on Windows) this falls back to uvicorn's own workers,
+which neither preload nor end event streams early.
+"""
+import argparse
+import importlib.util
+import math
+import os
+import sys
+import warnings
+from dataclasses import dataclass
+from typing import Mapping, Optional, Tuple
+
+# Settings are read when main() runs, after the env file is loaded, not at
+# import: everything here has to be decided before the app is imported.
+
+APP = "app.app:app"
+DEFAULT_POOL_SIZE = 5  # app.db's default
+# app.core.bulkheads' defaults, for the pools whose threads hold sessions
+DEFAULT_BULKHEAD_THREADS = {"db": 24, "storage": 8}
+EVENT_LISTENER_CONNECTIONS = 1  # per worker, held by app.services.events on Postgres
+SHUTDOWN_MARGIN = 10.0  # of GRACEFUL_TIMEOUT, left for the lifespan shutdown (audit flush)
+
+@dataclass
+class Plan:
+    workers: int
+    pool_size: int
+    max_overflow: int
+    db_threads: int = DEFAULT_BULKHEAD_THREADS["db"]
+    storage_threads: int = DEFAULT_BULKHEAD_THREADS["storage"]
+    pooled: bool = True  # sqlite has no pool to budget
+
+    @property
+    def connections(self) -> int:
+        if not self.pooled:
+            return 0
+        return self.workers * (self.pool_size + self.max_overflow + EVENT_LISTENER_CONNECTIONS)
+
+    @property
+    def threads_per_connection(self) -> float:
+        return (self.db_threads + self.storage_threads) / (self.pool_size + self.max_overflow)
+
+def load_env_file(path: Optional[str]) -> bool:
+    """Load KEY=value lines into os.environ; variables already set win."""
+    if not path or not os.path.exists(path):
+        return False
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        raise SystemExit(f"python-dotenv is required to read {path}")
+    load_dotenv(path, override=False)
+    return True
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    # a cgroup v2 quota, e.g. "150000 100000" for a container limited to 1.5 CPUs
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+def _fit_threads(result: Plan, env: Mapping[str, str]) -> Plan:
+    """Lower the db and storage bulkheads to the connections each worker has."""
+    connections = result.pool_size + result.max_overflow
+    db, storage = result.db_threads, result.storage_threads
+    if db + storage <= connections:
+        return result
+    if "BULKHEAD_DB_THREADS" in env or "BULKHEAD_STORAGE_THREADS" in env:
+        raise ValueError(
+            f"BULKHEAD_DB_THREADS {db} + BULKHEAD_STORAGE_THREADS {storage} threads can each hold a "
+            f"connection, over the {connections} per worker (pool {result.pool_size}+{result.max_overflow})"
+        )
+    if connections < 2:
+        raise ValueError(f"{connections} connection per worker cannot serve both the db and storage bulkheads")
+    # split in proportion, keeping at least one thread in each
+    result.db_threads = min(max(connections * db // (db + storage), 1), connections - 1)
+    result.storage_threads = min(storage, connections - result.db_threads)
+    return result
+
+def plan(cpus: int, env: Mapping[str, str]) -> Plan:
+    """Worker count, per-worker pool size and bulkhead threads within the connection budget."""
+    explicit = bool(env.get("WEB_CONCURRENCY"))
+    if explicit:
+        workers = int(env["WEB_CONCURRENCY"])
+    else:
+        workers = min(max(cpus, 2), int(env.get("WEB_MAX_WORKERS", 8)))
+    if workers < 1:
+        raise ValueError("WEB_CONCURRENCY must be at least 1")
+
+    pinned = "DB_POOL_SIZE" in env or "DB_MAX_OVERFLOW" in env
+    pool_size = int(env.get("DB_POOL_SIZE", DEFAULT_POOL_SIZE))
+    max_overflow = int(env.get("DB_MAX_OVERFLOW", 10))
+    db_threads = int(env.get("BULKHEAD_DB_THREADS", DEFAULT_BULKHEAD_THREADS["db"]))
+    storage_threads = int(env.get("BULKHEAD_STORAGE_THREADS", DEFAULT_BULKHEAD_THREADS["storage"]))
+    if env.get("DATABASE_URL", "").startswith("sqlite"):
+        return Plan(workers, pool_size, max_overflow, db_threads, storage_threads, pooled=False)
+
+    budget = int(env.get("DB_MAX_CONNECTIONS", 90))
+    if not explicit:
+        # every worker needs a pooled connection for each of the db and storage
+        # bulkheads besides its listener
+        workers = max(1, min(workers, budget // (EVENT_LISTENER_CONNECTIONS + 2)))
+    if pinned:
+        result = Plan(workers, pool_size, max_overflow, db_threads, storage_threads)
+        if result.connections > budget:
+            raise ValueError(
+                f"{workers} workers x (DB_POOL_SIZE {pool_size} + DB_MAX_OVERFLOW {max_overflow} "
+                f"+ {EVENT_LISTENER_CONNECTIONS}) = {result.connections} connections, "
+                f"over DB_MAX_CONNECTIONS {budget}"
+            )
+        return _fit_threads(result, env)
+
+    per_worker = budget // workers - EVENT_LISTENER_CONNECTIONS
+    if per_worker < 1:
+        raise ValueError(f"DB_MAX_CONNECTIONS {budget} is too low for {workers} workers")
+    pool_size = min(DEFAULT_POOL_SIZE, per_worker)
+    return _fit_threads(Plan(workers, pool_size, per_worker - pool_size, db_threads, storage_threads), env)
+
+def _parse_bind(bind: str) -> Tuple[str, int]:
+    host, _, port = bind.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+def _loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+def _http() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+# uvicorn has no public hook for the Server class its gunicorn worker runs, so
+# Worker below replaces UvicornWorker._serve, which uses these private names
+PRIVATE_WORKER_API = ("_serve", "_install_sigquit_handler")
+
+def _uvicorn_worker():
+    try:
+        from uvicorn_worker import UvicornWorker
+    except ImportError:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)  # superseded by uvicorn-worker
+            from uvicorn.workers import UvicornWorker
+    return UvicornWorker
+
+def _worker_class(drain_timeout: float):
+    UvicornWorker = _uvicorn_worker()
+    from gunicorn.arbiter import Arbiter
+    from uvicorn.server import Server
+
+    class Worker(UvicornWorker):
+        CONFIG_KWARGS = {"loop": _loop(), "http": _http(), "timeout_graceful_shutdown": drain_timeout}
+
+    missing = [name for name in PRIVATE_WORKER_API if not callable(getattr(UvicornWorker, name, None))]
+    if missing:
+        # still serves, only restarts wait out the graceful timeout on open event streams
+        print(
+            f"warning: {UvicornWorker.__module__}.UvicornWorker has no {', '.join(missing)}; "
+            "event streams will not be ended early on shutdown",
+            file=sys.stderr,
+        )
+        return Worker
+
+    class DrainingServer(Server):
+        async def shutdown(self, sockets=None) -> None:
+            # event streams never finish on their own: without this every
+            # restart would wait out the whole graceful timeout
+            from app.services import events
+            events.hub.stop()
+            await super().shutdown(sockets=sockets)
+
+    class DrainingWorker(Worker):
+        async def _serve(self) -> None:
+            # UvicornWorker._serve, with the server above
+            self.config.app = self.wsgi
+            server = DrainingServer(config=self.config)
+            self._install_sigquit_handler()
+            await server.serve(sockets=self.sockets)
+            if not server.started:
+                sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+    return DrainingWorker
+
+def _run_gunicorn(result: Plan, bind: str, env: Mapping[str, str]) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    graceful_timeout = float(env.get("GRACEFUL_TIMEOUT", 30))
+    options = {
+        "bind": bind,
+        "workers": result.workers,
+        "worker_class": _worker_class(max(graceful_timeout - SHUTDOWN_MARGIN, 1.0)),
+        "preload_app": True,
+        "graceful_timeout": graceful_timeout,
+        "timeout": int(env.get("WORKER_TIMEOUT", 60)),
+        "keepalive": int(env.get("KEEPALIVE", 5)),
+        # recycle workers now and then, staggered so they do not restart together
+        "max_requests": int(env.get("MAX_REQUESTS", 0)),
+        "max_requests_jitter": int(env.get("MAX_REQUESTS_JITTER", 0)),
+        "forwarded_allow_ips": env.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        "accesslog": env.get("ACCESS_LOG") or None,
+    }
+
+    class Application(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app.app import app
+            return app
+
+    Application().run()
+
+def _run_uvicorn(result: Plan, bind: str, env: Mapping[str, str]) -> None:
+    import uvicorn
+
+    host, port = _parse_bind(bind)
+    uvicorn.run(
+        APP,
+        host=host,
+        port=port,
+        workers=result.workers,
+        loop=_loop(),
+        http=_http(),
+        timeout_graceful_shutdown=max(float(env.get("GRACEFUL_TIMEOUT", 30)) - SHUTDOWN_MARGIN, 1.0),
+        forwarded_allow_ips=env.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--env-file", default=".env", help="KEY=value file to load first, if it exists")
+    parser.add_argument("--bind", default=None, help="host:port (default: BIND, or 0.0.0.0:$PORT)")
+    parser.add_argument("--workers", type=int, default=None, help="overrides WEB_CONCURRENCY")
+    parser.add_argument("--check", action="store_true", help="print the plan and exit")
+    args = parser.parse_args(argv)
+
+    load_env_file(args.env_file)
+    if args.workers is not None:
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    try:
+        result = plan(available_cpus(), os.environ)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    # read by app.db when the app is imported, below
+    os.environ["DB_POOL_SIZE"] = str(result.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(result.max_overflow)
+    # read by app.core.bulkheads, likewise
+    os.environ["BULKHEAD_DB_THREADS"] = str(result.db_threads)
+    os.environ["BULKHEAD_STORAGE_THREADS"] = str(result.storage_threads)
+
+    bind = args.bind or os.environ.get("BIND") or f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+    has_gunicorn = importlib.util.find_spec("gunicorn") is not None and sys.platform != "win32"
+    print(
+        f"{'gunicorn' if has_gunicorn else 'uvicorn'} on {bind}: {result.workers} workers, "
+        f"pool {result.pool_size}+{result.max_overflow} per worker"
+        + f" for {result.db_threads} db + {result.storage_threads} storage threads"
+        + (f" ({result.threads_per_connection:.2f} threads per connection)"
+           f", at most {result.connections} database connections" if result.pooled else "")
+        + f", loop {_loop()}, http {_http()}",
+        file=sys.stderr,
+    )
+    if args.check:
+        return
+    if has_gunicorn:
+        _run_gunicorn(result, bind, os.environ)
+    else:
+        _run_uvicorn(result, bind, os.environ)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import zipfile
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional
+from urllib.parse import quote
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.core import bulkheads
+from app.models.models import Document
+from app.services.download import DOWNLOAD_CHUNK_SIZE
+from app.services.s3 import stream_file, S3_BUCKET_NAME
+
+# ZIP export of a patient's documents, streamed.
+#
+# zipfile writes to an unseekable sink, so every entry gets a data descriptor
+# (CRC and sizes after the data) and nothing has to be rewound. Each object is
+# read from storage chunk by chunk and each compressed chunk is sent as soon as
+# it is written: memory holds one chunk at a time whatever the file sizes, plus
+# a few hundred bytes of directory and manifest metadata per entry. The
+# manifest is the last entry, so it can carry each file's size and sha256;
+# objects missing from storage are listed there instead of failing the export.
+
+ARCHIVE_COMPRESSLEVEL = int(os.getenv("ARCHIVE_COMPRESSLEVEL", 1))  # documents are mostly compressed already
+MANIFEST_NAME = "manifest.json"
+
+_UNSAFE = re.compile(r'[\x00-\x1f/\\:*?"<>|]+')
+
+class _Sink:
+    """Write-only file object; the stream takes what was written after each chunk."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def archive_entry(document: Document) -> dict:
+    """What the stream needs of a Document, read before the session closes."""
+    return {
+        "document_id": document.id,
+        "filename": document.filename,
+        "file_path": document.file_path,
+        "content_type": document.content_type,
+        "description": document.description,
+        "created_at": document.created_at.isoformat() if document.created_at else None,
+    }
+
+def select_documents(db: Session, patient_id: str, document_ids: Optional[List[int]] = None) -> List[Document]:
+    """The patient's documents, or the selected ones; 404 if any selected id is not theirs."""
+    query = db.query(Document).filter(Document.patient_id == patient_id)
+    if document_ids:
+        query = query.filter(Document.id.in_(set(document_ids)))
+    documents = query.order_by(Document.id).all()
+    if document_ids and len(documents) != len(set(document_ids)):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return documents
+
+def _entry_name(entry: dict) -> str:
+    # prefixed with the id: filenames are not unique and must not name directories
+    filename = _UNSAFE.sub("_", entry["filename"]).lstrip(".") or "document"
+    return f"documents/{entry['document_id']}-{filename}"
+
+def stream_archive(patient_id: str, entries: Iterable[dict]) -> Iterator[bytes]:
+    sink = _Sink()
+    listed = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=ARCHIVE_COMPRESSLEVEL) as archive:
+        for entry in entries:
+            chunks = stream_file(S3_BUCKET_NAME, entry["file_path"], chunk_size=DOWNLOAD_CHUNK_SIZE)
+            try:
+                # the object is fetched on the first chunk; fail it before writing its entry
+                try:
+                    first = next(chunks, b"")
+                except Exception as e:
+                    listed.append({**entry, "status": "missing", "error": str(e)})
+                    continue
+                name = _entry_name(entry)
+                digest = hashlib.sha256()
+                size = 0
+                # sizes are unknown until the end: without ZIP64 up front an
+                # entry past 4 GiB would fail after part of the body was sent
+                with archive.open(name, "w", force_zip64=True) as out:
+                    for chunk in itertools.chain((first,), chunks):
+                        out.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                        data = sink.take()
+                        if data:
+                            yield data
+            finally:
+                chunks.close()
+            data = sink.take()  # the entry's data descriptor
+            if data:
+                yield data
+            listed.append({**entry, "status": "included", "path": name, "size": size, "sha256": digest.hexdigest()})
+
+        manifest = {
+            "patient_id": patient_id,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "documents": [{k: v for k, v in item.items() if k != "file_path"} for item in listed],
+        }
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    yield sink.take()
+
+def build_archive_response(patient_id: str, entries: List[dict]) -> StreamingResponse:
+    filename = f"documents-{_UNSAFE.sub('_', patient_id)}.zip"
+    headers = {
+        "Content-Disposition": f"attachment; filename=\"{filename}\"; filename*=UTF-8''{quote(filename)}",
+        "Cache-Control": "no-store",
+    }
+    body = stream_archive(patient_id, entries)
+    return StreamingResponse(bulkheads.iterate("storage", body), media_type="application/zip", headers=headers)
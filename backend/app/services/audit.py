@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import HTTPException, Request
+from app import db as database
+from app.core.metrics import AUDIT_EVENTS, AUDIT_FLUSH_FAILURES
+from app.models.models import AuditEvent
+
+# PHI access audit trail, kept off the request path.
+#
+# Routes append events to an in-process buffer; a background thread writes
+# them in bulk (one multi-row INSERT per AUDIT_FLUSH_SIZE events) whenever that
+# many are pending or AUDIT_FLUSH_INTERVAL has passed. A failed flush keeps the
+# events and retries. Access is never served unaudited: once AUDIT_MAX_PENDING
+# events are waiting, record() blocks for up to AUDIT_ENQUEUE_TIMEOUT and then
+# fails the request with 503. The app lifespan flushes what is left on shutdown.
+
+logger = logging.getLogger(__name__)
+
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", 500))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0))
+AUDIT_MAX_PENDING = int(os.getenv("AUDIT_MAX_PENDING", 50000))
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", 5.0))
+AUDIT_RETRY_MAX_DELAY = 30.0
+
+# actions
+DOCUMENT_LIST = "document.list"
+DOCUMENT_VIEW = "document.view"
+DOCUMENT_PREVIEW_URL = "document.preview_url"
+DOCUMENT_DOWNLOAD = "document.download"
+DOCUMENT_EXPORT = "document.export"
+PATIENT_EXPORT = "patient.export"
+
+class AuditUnavailable(Exception):
+    pass
+
+class AuditBuffer:
+    def __init__(self, flush_size: int = AUDIT_FLUSH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 max_pending: int = AUDIT_MAX_PENDING, enqueue_timeout: float = AUDIT_ENQUEUE_TIMEOUT,
+                 writer=None) -> None:
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self.writer = writer or write_events
+        self.pending = deque()
+        self._condition = threading.Condition()
+        self._flushing = 0  # events taken by the flusher but not yet written
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+                self._thread.start()
+
+    def record(self, event: dict) -> None:
+        if self._thread is None:
+            self.start()
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._condition:
+            # backpressure: wait for the flusher rather than grow without bound
+            while len(self.pending) + self._flushing >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    AUDIT_EVENTS.inc("rejected")
+                    raise AuditUnavailable("audit buffer full")
+                self._condition.wait(remaining)
+            self.pending.append(event)
+            if len(self.pending) >= self.flush_size:
+                self._condition.notify_all()
+        AUDIT_EVENTS.inc("queued")
+
+    def _take(self) -> List[dict]:
+        batch = []
+        while self.pending and len(batch) < self.flush_size:
+            batch.append(self.pending.popleft())
+        self._flushing = len(batch)
+        return batch
+
+    def _write(self, batch: List[dict]) -> bool:
+        try:
+            self.writer(batch)
+        except Exception:
+            logger.exception("writing %d audit events failed, will retry", len(batch))
+            AUDIT_FLUSH_FAILURES.inc()
+            with self._condition:
+                # back to the front, in order
+                self.pending.extendleft(reversed(batch))
+                self._flushing = 0
+            return False
+        AUDIT_EVENTS.inc("written", amount=len(batch))
+        with self._condition:
+            self._flushing = 0
+            self._condition.notify_all()
+        return True
+
+    def _run(self) -> None:
+        delay = self.flush_interval
+        failed = False
+        while True:
+            with self._condition:
+                if not self._stopping and (failed or len(self.pending) < self.flush_size):
+                    self._condition.wait(delay)
+                if self._stopping:
+                    # stop() writes the rest on its own thread
+                    return
+                batch = self._take()
+            if not batch:
+                continue
+            failed = not self._write(batch)
+            delay = min(delay * 2, AUDIT_RETRY_MAX_DELAY) if failed else self.flush_interval
+
+    def flush(self) -> None:
+        """Write everything pending now, on the calling thread."""
+        while True:
+            with self._condition:
+                batch = self._take()
+            if not batch or not self._write(batch):
+                return
+
+    def stop(self, timeout: float = 10.0) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+        if self.pending:
+            logger.error("%d audit events could not be written before shutdown", len(self.pending))
+
+def write_events(batch: List[dict]) -> None:
+    # executemany of one INSERT: a multi-row VALUES insert on Postgres
+    with database.get_engine().begin() as connection:
+        connection.execute(AuditEvent.__table__.insert(), batch)
+
+buffer = AuditBuffer()
+
+def record_access(user: dict, role: Optional[str], action: str, patient_id: Optional[str],
+                  document_id: Optional[int] = None, request: Optional[Request] = None) -> None:
+    """Audit one access by the authenticated `user`; 503 if the audit log cannot take it."""
+    event = {
+        "id": uuid.uuid4(),
+        "occurred_at": datetime.now(timezone.utc).replace(tzinfo=None),
+        "actor_id": user.get("user_id"),
+        "actor_role": role,
+        "action": action,
+        "patient_id": patient_id,
+        "document_id": document_id,
+        "ip_address": request.client.host if request is not None and request.client else None,
+    }
+    try:
+        buffer.record(event)
+    except AuditUnavailable:
+        raise HTTPException(status_code=503, detail="Audit log unavailable, try again shortly",
+                            headers={"Retry-After": "1"})
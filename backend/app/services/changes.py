@@ -0,0 +1,162 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.orm import Session
+from app.models.models import Change, Document, User
+
+# Change feed for clients that keep a local copy of a patient's documents or
+# a doctor's patient panel.
+#
+# Every flush that inserts, updates or deletes a Document, or moves a patient
+# into, out of or within a doctor's panel, appends change_log rows in the same
+# transaction. Clients sync with `since=<cursor>`: no cursor returns the whole
+# collection and the current cursor; a cursor returns only what changed after
+# it, collapsed to the latest operation per row, deletes as tombstones.
+#
+# On Postgres the rows are appended under a transaction-level advisory lock,
+# so seq order is commit order and a reader never sees seq N+1 before N.
+
+DOCUMENT = "document"
+PATIENT = "patient"
+UPSERT = "upsert"
+DELETE = "delete"
+
+CHANGE_LOG_LOCK = 0x6368616e  # arbitrary, unique to change_log writers
+
+# called as listener(session, connection, rows) after each batch of rows is
+# written, inside the same transaction (app.services.events publishes them)
+listeners: List[Callable] = []
+
+def _document_change(document: Document, op: str) -> dict:
+    return {"entity": DOCUMENT, "op": op, "patient_id": document.patient_id, "doctor_id": None,
+            "document_id": document.id}
+
+def _patient_change(patient: User, doctor_id: str, op: str) -> dict:
+    return {"entity": PATIENT, "op": op, "patient_id": patient.auth0_user_id, "doctor_id": doctor_id,
+            "document_id": None}
+
+def _patient_changes(patient: User) -> List[dict]:
+    history = inspect(patient).attrs.doctor_id.history
+    if not history.has_changes():
+        return [_patient_change(patient, patient.doctor_id, UPSERT)] if patient.doctor_id else []
+    rows = [_patient_change(patient, old, DELETE) for old in history.deleted if old]
+    if patient.doctor_id:
+        rows.append(_patient_change(patient, patient.doctor_id, UPSERT))
+    return rows
+
+@event.listens_for(Session, "after_flush")
+def _record_changes(session: Session, flush_context) -> None:
+    # after the flush so new documents have their ids; attribute history is
+    # still available until the flush completes
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, Document):
+            rows.append(_document_change(obj, UPSERT))
+        elif isinstance(obj, User) and obj.doctor_id:
+            rows.append(_patient_change(obj, obj.doctor_id, UPSERT))
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Document):
+            rows.append(_document_change(obj, UPSERT))
+        elif isinstance(obj, User) and obj.is_patient():
+            rows.extend(_patient_changes(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Document):
+            rows.append(_document_change(obj, DELETE))
+        elif isinstance(obj, User) and obj.doctor_id:
+            rows.append(_patient_change(obj, obj.doctor_id, DELETE))
+    if not rows:
+        return
+    connection = session.connection()
+    _append(connection, rows)
+    for listener in listeners:
+        listener(session, connection, rows)
+
+def _append(connection, rows: List[dict]) -> None:
+    if connection.dialect.name == "postgresql":
+        # held until commit: later seqs wait for earlier ones to become visible
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOG_LOCK})
+    connection.execute(Change.__table__.insert(), rows)
+
+def record_document_upserts(db: Session, documents) -> None:
+    """change_log rows for documents (anything with id and patient_id) updated outside the ORM.
+
+    Bulk writers such as app.jobs.backfill_file_info use this; no events are
+    published for them, clients pick the rows up from the feed or a new ETag.
+    """
+    rows = [_document_change(document, UPSERT) for document in documents]
+    if rows:
+        _append(db.connection(), rows)
+
+def current_cursor(db: Session) -> int:
+    return db.query(func.max(Change.seq)).scalar() or 0
+
+def _check_cursor(db: Session, since: int) -> None:
+    # app.jobs.prune_change_log deletes the oldest rows; a cursor from before
+    # them may have missed changes and must resync
+    oldest = db.query(func.min(Change.seq)).scalar()
+    if oldest is not None and since < oldest - 1:
+        raise HTTPException(status_code=410, detail="Cursor expired, sync again without since")
+
+def _latest_changes(db: Session, condition, key, since: int, limit: int) -> Tuple[Dict, int, bool]:
+    """Latest op per key after `since`, in the order of their last change."""
+    rows = db.query(Change.seq, Change.op, key).filter(condition, Change.seq > since).order_by(
+        Change.seq
+    ).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for seq, op, value in rows:
+        latest.pop(value, None)
+        latest[value] = op
+    return latest, (rows[-1].seq if rows else since), has_more
+
+def document_changes(db: Session, patient_id: str, since: Optional[int], limit: int) -> dict:
+    if since is None:
+        cursor = current_cursor(db)
+        documents = db.query(Document).filter(Document.patient_id == patient_id).order_by(Document.id).all()
+        changes = [{"op": UPSERT, "document_id": d.id, "document": d} for d in documents]
+        return {"changes": changes, "cursor": cursor, "has_more": False, "reset": True}
+
+    _check_cursor(db, since)
+    latest, cursor, has_more = _latest_changes(
+        db, (Change.patient_id == patient_id) & (Change.entity == DOCUMENT), Change.document_id, since, limit
+    )
+    upserted = [document_id for document_id, op in latest.items() if op == UPSERT]
+    documents = {}
+    if upserted:
+        documents = {d.id: d for d in db.query(Document).filter(
+            Document.patient_id == patient_id, Document.id.in_(upserted)
+        )}
+    # an upsert whose row is gone now was deleted after this page
+    changes = [
+        {"op": UPSERT, "document_id": document_id, "document": documents[document_id]}
+        if document_id in documents else {"op": DELETE, "document_id": document_id}
+        for document_id in latest
+    ]
+    return {"changes": changes, "cursor": cursor, "has_more": has_more, "reset": False}
+
+def patient_changes(db: Session, doctor_id: str, since: Optional[int], limit: int) -> dict:
+    if since is None:
+        cursor = current_cursor(db)
+        patients = db.query(User).filter(User.doctor_id == doctor_id).order_by(User.auth0_user_id).all()
+        changes = [{"op": UPSERT, "patient_id": p.auth0_user_id, "patient": p} for p in patients]
+        return {"changes": changes, "cursor": cursor, "has_more": False, "reset": True}
+
+    _check_cursor(db, since)
+    latest, cursor, has_more = _latest_changes(
+        db, (Change.doctor_id == doctor_id) & (Change.entity == PATIENT), Change.patient_id, since, limit
+    )
+    upserted = [patient_id for patient_id, op in latest.items() if op == UPSERT]
+    patients = {}
+    if upserted:
+        patients = {p.auth0_user_id: p for p in db.query(User).filter(
+            User.doctor_id == doctor_id, User.auth0_user_id.in_(upserted)
+        )}
+    changes = [
+        {"op": UPSERT, "patient_id": patient_id, "patient": patients[patient_id]}
+        if patient_id in patients else {"op": DELETE, "patient_id": patient_id}
+        for patient_id in latest
+    ]
+    return {"changes": changes, "cursor": cursor, "has_more": has_more, "reset": False}
@@ -2,7 +2,9 @@ from sqlalchemy.orm import Session
 from app.models.models import User
 from datetime import datetime, timezone
 from fastapi import HTTPException
+from app.core.metrics import timed
 
+@timed("check_user")
 def check_user(user: dict, db: Session):
     auth0_user_id = user.get("user_id")
     email = user.get("email")
@@ -0,0 +1,113 @@
+import hashlib
+import os
+from typing import Optional, Tuple
+from urllib.parse import quote
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.core import bulkheads
+from app.core.http_cache import etag_matches, http_date, not_modified_since, not_modified_response
+from app.services.s3 import get_file_metadata, stream_file, S3_BUCKET_NAME
+
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 256 * 1024))
+DOWNLOAD_CACHE_CONTROL = os.getenv("DOWNLOAD_CACHE_CONTROL", "private, no-cache")
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+# Stored objects are immutable: replacing a document's file writes a new uuid key,
+# so the key alone is a strong validator and 304s need no storage round trip.
+def document_etag(document) -> str:
+    digest = hashlib.sha1(f"{document.id}:{document.file_path}".encode()).hexdigest()
+    return f'"{digest}"'
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=` range into an inclusive (start, end) pair.
+
+    Returns None when the whole representation should be sent (no header, a
+    syntactically invalid one, or a multi-range request, which we don't serve).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not first:
+            # suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+
+    if end is None:
+        end = max(start, size - 1)
+
+    if start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+def _content_disposition(filename: str, attachment: bool) -> str:
+    kind = "attachment" if attachment else "inline"
+    fallback = filename.encode("ascii", "ignore").decode().replace('"', "") or "document"
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+def build_download_response(request: Request, document, attachment: bool = False):
+    etag = document_etag(document)
+    cache_headers = {"Cache-Control": DOWNLOAD_CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag, cache_headers)
+
+    try:
+        metadata = get_file_metadata(S3_BUCKET_NAME, document.file_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading file: {e}")
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="File not found in storage")
+
+    size = metadata["size"]
+    last_modified = metadata["last_modified"]
+    headers = {
+        **cache_headers,
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": _content_disposition(document.filename, attachment),
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    # If-Modified-Since is only consulted when If-None-Match is absent
+    if not if_none_match and not_modified_since(request.headers.get("if-modified-since"), last_modified):
+        return not_modified_response(etag, {k: v for k, v in headers.items() if k in ("Cache-Control", "Last-Modified")})
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == etag or if_range == headers.get("Last-Modified"):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                                headers={"Content-Range": f"bytes */{size}"})
+
+    media_type = document.content_type or metadata["content_type"] or "application/octet-stream"
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        body = stream_file(S3_BUCKET_NAME, document.file_path, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                           metadata=metadata) if size else iter(())
+        return StreamingResponse(bulkheads.iterate("storage", body), status_code=200, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    body = stream_file(S3_BUCKET_NAME, document.file_path, start, end, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                       metadata=metadata)
+    return StreamingResponse(bulkheads.iterate("storage", body), status_code=206, media_type=media_type, headers=headers)
@@ -0,0 +1,244 @@
+import base64
+import binascii
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.keywrap import InvalidUnwrap, aes_key_unwrap, aes_key_wrap
+
+# Envelope encryption of stored documents.
+#
+# Every object gets its own random AES-256 data key, wrapped (RFC 3394) with a
+# master key from DOCUMENT_MASTER_KEYS and kept in the object's user metadata
+# next to the master key's id, so a download needs no extra round trip. The
+# body is a sequence of frames, each ENCRYPTION_CHUNK_SIZE bytes of plaintext
+# (the last one shorter) sealed with AES-GCM: nonce = frame index, associated
+# data = index and a last-frame flag, so frames cannot be reordered, dropped or
+# the object truncated without failing authentication. A counter nonce is safe
+# because no data key encrypts more than one object.
+#
+# Frames are independent: a byte range is served by fetching and opening only
+# the frames it touches, and batches of frames are sealed or opened on
+# ENCRYPTION_THREADS threads (OpenSSL does the work outside the GIL).
+#
+# DOCUMENT_MASTER_KEYS is "id:base64key[,id:base64key...]"; the first key wraps
+# new data keys, the others still unwrap old ones, so keys can be rotated. With
+# no keys configured new uploads are stored as they are. Objects without an
+# envelope (uploaded before encryption was enabled) are always read as-is.
+
+ENCRYPTION_CHUNK_SIZE = int(os.getenv("ENCRYPTION_CHUNK_SIZE", 64 * 1024))
+ENCRYPTION_THREADS = int(os.getenv("ENCRYPTION_THREADS", min(4, os.cpu_count() or 1)))
+ENCRYPTION_BATCH = 16  # frames sealed or opened together
+TAG_SIZE = 16
+ALGORITHM = "AES256-GCM-FRAMED"
+
+# user metadata keys (S3 lowercases them)
+META_ALGORITHM = "ple-alg"
+META_KEY_ID = "ple-key-id"
+META_WRAPPED_KEY = "ple-key"
+META_CHUNK_SIZE = "ple-chunk"
+
+class DecryptionError(Exception):
+    pass
+
+def parse_master_keys(spec: str) -> Dict[str, bytes]:
+    keys = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        key_id, _, encoded = item.strip().partition(":")
+        try:
+            key = base64.b64decode(encoded, validate=True)
+        except binascii.Error:
+            key = b""
+        if not key_id or len(key) != 32:
+            raise ValueError("DOCUMENT_MASTER_KEYS entries must be id:base64 of a 32-byte key")
+        keys[key_id] = key
+    return keys
+
+MASTER_KEYS = parse_master_keys(os.getenv("DOCUMENT_MASTER_KEYS", ""))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _map(func, items: List) -> List:
+    global _executor
+    if ENCRYPTION_THREADS <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ENCRYPTION_THREADS, thread_name_prefix="encryption")
+    return list(_executor.map(func, items))
+
+def _associated_data(index: int, last: bool) -> bytes:
+    return struct.pack(">QB", index, last)
+
+def _nonce(index: int) -> bytes:
+    return index.to_bytes(12, "big")
+
+def enabled() -> bool:
+    return bool(MASTER_KEYS)
+
+class Envelope:
+    def __init__(self, data_key: bytes, key_id: str, wrapped_key: bytes, chunk_size: int) -> None:
+        self.cipher = AESGCM(data_key)
+        self.key_id = key_id
+        self.wrapped_key = wrapped_key
+        self.chunk_size = chunk_size
+
+    def metadata(self) -> Dict[str, str]:
+        return {
+            META_ALGORITHM: ALGORITHM,
+            META_KEY_ID: self.key_id,
+            META_WRAPPED_KEY: base64.b64encode(self.wrapped_key).decode(),
+            META_CHUNK_SIZE: str(self.chunk_size),
+        }
+
+    # --- sizes and ranges ---
+
+    def frames(self, size: int) -> int:
+        """Frames holding `size` bytes of plaintext; an empty object still has one."""
+        return max(1, -(-size // self.chunk_size))
+
+    def plaintext_size(self, stored_size: int) -> int:
+        frames = -(-stored_size // (self.chunk_size + TAG_SIZE))
+        return stored_size - frames * TAG_SIZE
+
+    def stored_range(self, start: int, end: int) -> Tuple[int, int]:
+        """The inclusive stored byte range holding plaintext bytes start..end."""
+        frame = self.chunk_size + TAG_SIZE
+        return (start // self.chunk_size) * frame, (end // self.chunk_size) * frame + frame - 1
+
+    # --- sealing ---
+
+    def _seal(self, item: Tuple[int, bytes, bool]) -> bytes:
+        index, plaintext, last = item
+        return self.cipher.encrypt(_nonce(index), plaintext, _associated_data(index, last))
+
+    def encrypt(self, source) -> "EncryptingReader":
+        return EncryptingReader(source, self)
+
+    # --- opening ---
+
+    def _open(self, item: Tuple[int, bytes, bool]) -> bytes:
+        index, frame, last = item
+        try:
+            return self.cipher.decrypt(_nonce(index), frame, _associated_data(index, last))
+        except Exception:
+            raise DecryptionError(f"frame {index} failed authentication")
+
+    def decrypt(self, chunks: Iterable[bytes], size: int, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Plaintext bytes start..end (inclusive) of an object holding `size` bytes.
+
+        `chunks` is the stored body from stored_range(start, end), or the whole
+        body when reading from the start to the end.
+        """
+        end = size - 1 if end is None else end
+        last_index = self.frames(size) - 1
+        index = start // self.chunk_size
+        skip = start - index * self.chunk_size  # plaintext to drop from the first frame
+        remaining = end - start + 1 if size else 0
+        buffer = bytearray()
+        batch = []
+
+        def flush() -> Iterator[bytes]:
+            nonlocal skip, remaining
+            for plaintext in _map(self._open, batch):
+                if skip:
+                    plaintext = plaintext[skip:]
+                    skip = 0
+                plaintext = plaintext[:remaining]
+                remaining -= len(plaintext)
+                if plaintext:
+                    yield plaintext
+            batch.clear()
+
+        for chunk in chunks:
+            buffer += chunk
+            while index <= last_index:
+                length = self._frame_length(index, size)
+                if len(buffer) < length:
+                    break
+                batch.append((index, bytes(buffer[:length]), index == last_index))
+                del buffer[:length]
+                index += 1
+                if len(batch) >= ENCRYPTION_BATCH:
+                    yield from flush()
+                if remaining <= 0 and not batch:
+                    return
+        if buffer:
+            raise DecryptionError(f"frame {index} is truncated" if index <= last_index else "data after the last frame")
+        yield from flush()
+        if remaining > 0:
+            raise DecryptionError("object is truncated")
+
+    def _frame_length(self, index: int, size: int) -> int:
+        if index < self.frames(size) - 1:
+            return self.chunk_size + TAG_SIZE
+        return size - index * self.chunk_size + TAG_SIZE
+
+class EncryptingReader:
+    """Read-only file object over `source` that returns the sealed frames."""
+
+    def __init__(self, source, envelope: Envelope) -> None:
+        self.source = source
+        self.envelope = envelope
+        self._plaintext = bytearray()
+        self._out = bytearray()
+        self._index = 0
+        self._done = False
+
+    def _fill(self, want: int) -> None:
+        chunk_size = self.envelope.chunk_size
+        while (want < 0 or len(self._out) < want) and not self._done:
+            data = self.source.read(chunk_size * ENCRYPTION_BATCH)
+            self._plaintext += data
+            eof = not data
+            frames = []
+            # a frame is only known to be the last one once the source is exhausted
+            while len(self._plaintext) > chunk_size:
+                frames.append((self._index, bytes(self._plaintext[:chunk_size]), False))
+                del self._plaintext[:chunk_size]
+                self._index += 1
+            if eof:
+                frames.append((self._index, bytes(self._plaintext), True))
+                self._plaintext.clear()
+                self._done = True
+            for sealed in _map(self.envelope._seal, frames):
+                self._out += sealed
+
+    def read(self, size: int = -1) -> bytes:
+        self._fill(size if size is not None else -1)
+        if size is None or size < 0 or size >= len(self._out):
+            data = bytes(self._out)
+            self._out.clear()
+            return data
+        data = bytes(self._out[:size])
+        del self._out[:size]
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+def new_envelope(chunk_size: Optional[int] = None) -> Envelope:
+    if not MASTER_KEYS:
+        raise ValueError("no DOCUMENT_MASTER_KEYS configured")
+    key_id, master_key = next(iter(MASTER_KEYS.items()))
+    data_key = AESGCM.generate_key(bit_length=256)
+    return Envelope(data_key, key_id, aes_key_wrap(master_key, data_key), chunk_size or ENCRYPTION_CHUNK_SIZE)
+
+def open_envelope(metadata: Optional[Mapping[str, str]]) -> Optional[Envelope]:
+    """The envelope of a stored object from its user metadata; None if it is stored as-is."""
+    if not metadata or META_WRAPPED_KEY not in metadata:
+        return None
+    if metadata.get(META_ALGORITHM) != ALGORITHM:
+        raise DecryptionError(f"unknown encryption {metadata.get(META_ALGORITHM)!r}")
+    key_id = metadata.get(META_KEY_ID)
+    master_key = MASTER_KEYS.get(key_id)
+    if master_key is None:
+        raise DecryptionError(f"master key {key_id!r} is not configured")
+    wrapped_key = base64.b64decode(metadata[META_WRAPPED_KEY])
+    try:
+        data_key = aes_key_unwrap(master_key, wrapped_key)
+    except InvalidUnwrap:
+        raise DecryptionError(f"data key does not unwrap with master key {key_id!r}")
+    return Envelope(data_key, key_id, wrapped_key, int(metadata[META_CHUNK_SIZE]))
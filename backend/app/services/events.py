@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.core.metrics import EVENT_STREAMS, EVENTS_DELIVERED
+from app.services import changes
+
+# Push notifications over server-sent events.
+#
+# Every batch of change_log rows (app.services.changes) is also published as
+# events: on Postgres with pg_notify in the writing transaction, so they go out
+# on commit to every worker LISTENing on EVENTS_CHANNEL; elsewhere (sqlite,
+# single process) straight to this process's hub after commit.
+#
+# The hub routes an event to the streams of the users it concerns: document
+# events to the patient and the doctors whose panel holds that patient,
+# patient events to the patient and the doctor gaining or losing them. Events
+# carry ids only; clients fetch what changed through the change feeds. Each
+# stream has a bounded buffer: a client too slow to drain it gets a "reset"
+# event and the stream ends, as does every stream if the LISTEN connection
+# was lost, since events may have been missed. Idle streams get a comment
+# line every EVENTS_HEARTBEAT seconds and are closed after
+# EVENTS_MAX_STREAM_SECONDS, so proxies and worker restarts see them end.
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "patientlink_events")
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 15.0))
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", 100))
+EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", 1000))
+EVENTS_MAX_STREAMS_PER_USER = int(os.getenv("EVENTS_MAX_STREAMS_PER_USER", 5))
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", 300.0))
+EVENTS_RETRY_MS = 5000  # client reconnect delay, sent to EventSource clients
+
+READY = "ready"
+RESET = "reset"
+_CLOSE = None
+_PENDING = "pending_events"
+_LISTEN_MAX_DELAY = 30.0
+
+class Subscription:
+    def __init__(self, user_id: str, role: str, patient_ids: Iterable[str], buffer_size: int) -> None:
+        self.user_id = user_id
+        self.role = role
+        self.patient_ids: Set[str] = set(patient_ids)  # doctors: the panel they watch
+        self.queue: asyncio.Queue = asyncio.Queue(buffer_size)
+        self.done = False
+
+    def _replace_with(self, item) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(item)
+        self.done = True
+
+    def offer(self, name: str, data: dict) -> None:
+        if self.done:
+            return
+        try:
+            self.queue.put_nowait((name, data))
+            EVENTS_DELIVERED.inc()
+        except asyncio.QueueFull:
+            # the client is not keeping up; what it has not read is stale anyway
+            EVENT_STREAMS.inc("overflowed")
+            self.reset()
+
+    def reset(self) -> None:
+        if not self.done:
+            self._replace_with((RESET, {}))
+
+    def close(self) -> None:
+        if not self.done:
+            self._replace_with(_CLOSE)
+
+class EventHub:
+    def __init__(self, max_streams: int = EVENTS_MAX_STREAMS, max_streams_per_user: int = EVENTS_MAX_STREAMS_PER_USER,
+                 buffer_size: int = EVENTS_BUFFER_SIZE) -> None:
+        self.max_streams = max_streams
+        self.max_streams_per_user = max_streams_per_user
+        self.buffer_size = buffer_size
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._by_user: Dict[str, Set[Subscription]] = {}
+        self._watchers: Dict[str, Set[Subscription]] = {}  # patient id -> doctors' subscriptions
+        self._count = 0
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    # --- lifecycle ---
+
+    def start(self, engine: Optional[Engine] = None) -> None:
+        """Called on the event loop; LISTENs for other workers' events on Postgres."""
+        self.loop = asyncio.get_running_loop()
+        self._stopping.clear()
+        if engine is not None and engine.dialect.name == "postgresql" and self._listener is None:
+            self._listener = threading.Thread(target=self._listen, args=(engine,), name="events-listener", daemon=True)
+            self._listener.start()
+
+    def stop(self) -> None:
+        """Called on the event loop: ends every open stream and the listener."""
+        self._stopping.set()
+        for subscriptions in list(self._by_user.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+
+    def join(self, timeout: float = 5.0) -> None:
+        if self._listener is not None:
+            self._listener.join(timeout)
+            self._listener = None
+
+    # --- subscriptions (event loop only) ---
+
+    def can_accept(self, user_id: str) -> bool:
+        # also read from route threads, before the stream starts: a cheap early 503
+        return self._count < self.max_streams and len(self._by_user.get(user_id, ())) < self.max_streams_per_user
+
+    def subscribe(self, user_id: str, role: str, patient_ids: Iterable[str] = ()) -> Optional[Subscription]:
+        self.loop = asyncio.get_running_loop()
+        if not self.can_accept(user_id):
+            EVENT_STREAMS.inc("rejected")
+            return None
+        subscription = Subscription(user_id, role, patient_ids, self.buffer_size)
+        self._by_user.setdefault(user_id, set()).add(subscription)
+        for patient_id in subscription.patient_ids:
+            self._watchers.setdefault(patient_id, set()).add(subscription)
+        self._count += 1
+        EVENT_STREAMS.inc("opened")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._by_user.get(subscription.user_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._by_user[subscription.user_id]
+        for patient_id in list(subscription.patient_ids):
+            self._unwatch(subscription, patient_id)
+        self._count -= 1
+        EVENT_STREAMS.inc("closed")
+
+    def _unwatch(self, subscription: Subscription, patient_id: str) -> None:
+        subscription.patient_ids.discard(patient_id)
+        watchers = self._watchers.get(patient_id)
+        if watchers is not None:
+            watchers.discard(subscription)
+            if not watchers:
+                del self._watchers[patient_id]
+
+    def _watch(self, subscription: Subscription, patient_id: str) -> None:
+        subscription.patient_ids.add(patient_id)
+        self._watchers.setdefault(patient_id, set()).add(subscription)
+
+    def dispatch(self, change: dict) -> None:
+        patient_id = change["patient_id"]
+        own = self._by_user.get(patient_id, set())
+        if change["entity"] == changes.DOCUMENT:
+            data = {"op": change["op"], "patient_id": patient_id, "document_id": change["document_id"]}
+            for subscription in own | self._watchers.get(patient_id, set()):
+                subscription.offer(changes.DOCUMENT, data)
+        elif change["entity"] == changes.PATIENT:
+            data = {"op": change["op"], "patient_id": patient_id, "doctor_id": change["doctor_id"]}
+            for subscription in list(self._by_user.get(change["doctor_id"], ())):
+                if subscription.role != "doctor":
+                    continue
+                if change["op"] == changes.UPSERT:
+                    self._watch(subscription, patient_id)
+                else:
+                    self._unwatch(subscription, patient_id)
+                subscription.offer(changes.PATIENT, data)
+            for subscription in own:
+                subscription.offer(changes.PATIENT, data)
+
+    def reset_all(self) -> None:
+        for subscriptions in list(self._by_user.values()):
+            for subscription in list(subscriptions):
+                subscription.reset()
+
+    # --- publishing (any thread) ---
+
+    def publish(self, change: dict) -> None:
+        self._call(self.dispatch, change)
+
+    def _call(self, func, *args) -> None:
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(func, *args)
+        except RuntimeError:
+            # loop closed: nobody is listening any more
+            pass
+
+    # --- cross-worker fan-out ---
+
+    def _listen(self, engine: Engine) -> None:
+        delay = 1.0
+        connected_before = False
+        while not self._stopping.is_set():
+            try:
+                raw = engine.raw_connection()
+                raw.detach()  # long-lived and in autocommit mode: keep it out of the pool
+                connection = raw.driver_connection
+                try:
+                    connection.autocommit = True
+                    cursor = connection.cursor()
+                    cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+                    if connected_before:
+                        # anything published while we were away is lost
+                        self._call(self.reset_all)
+                    connected_before = True
+                    delay = 1.0
+                    self._receive(connection)
+                finally:
+                    connection.close()
+            except Exception:
+                logger.exception("event listener connection failed, reconnecting in %.0fs", delay)
+                self._call(self.reset_all)
+                self._stopping.wait(delay)
+                delay = min(delay * 2, _LISTEN_MAX_DELAY)
+
+    def _receive(self, connection) -> None:
+        if callable(getattr(connection, "notifies", None)):  # psycopg 3
+            while not self._stopping.is_set():
+                for notify in connection.notifies(timeout=1.0):
+                    self._received(notify.payload)
+        else:  # psycopg2
+            while not self._stopping.is_set():
+                if select.select([connection], [], [], 1.0) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    self._received(connection.notifies.pop(0).payload)
+
+    def _received(self, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logger.warning("ignoring malformed event payload")
+            return
+        self.publish(change)
+
+hub = EventHub()
+
+def publish_changes(session: Session, connection, rows: List[dict]) -> None:
+    if connection.dialect.name == "postgresql":
+        # delivered to every listening worker, this one included, on commit only
+        connection.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": EVENTS_CHANNEL, "payloads": [json.dumps(row) for row in rows]},
+        )
+    else:
+        session.info.setdefault(_PENDING, []).extend(rows)
+
+changes.listeners.append(publish_changes)
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    for change in session.info.pop(_PENDING, ()):
+        hub.publish(change)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+def _format(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+async def event_stream(user_id: str, role: str, patient_ids: Iterable[str] = (),
+                       heartbeat: Optional[float] = None, max_seconds: Optional[float] = None):
+    """Server-sent events for one user, until the client leaves or the stream is reset or expires."""
+    heartbeat = EVENTS_HEARTBEAT if heartbeat is None else heartbeat
+    max_seconds = EVENTS_MAX_STREAM_SECONDS if max_seconds is None else max_seconds
+    subscription = hub.subscribe(user_id, role, patient_ids)
+    if subscription is None:
+        yield _format("error", {"detail": "Too many event streams"})
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        # subscribed from here on: resync through the change feeds after "ready"
+        yield f"retry: {EVENTS_RETRY_MS}\n" + _format(READY, {})
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if loop.time() < deadline:
+                    yield ": heartbeat\n\n"
+                continue
+            if item is _CLOSE:
+                return
+            name, data = item
+            yield _format(name, data)
+            if name == RESET:
+                return
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,134 @@
+import codecs
+import hashlib
+import re
+from typing import Optional
+
+# Size, SHA-256, sniffed type and PDF page count of an uploaded file, taken in
+# the same pass that sends it to storage: FileInspector is a read-only file
+# object over the upload that looks at every byte on its way through.
+#
+# The type comes from the leading magic bytes, not from the name or the
+# client's Content-Type. Page counts are read from the raw PDF: the largest
+# /Count of a /Type /Pages node (the page tree root), else the number of
+# /Type /Page objects. Both can sit inside compressed object streams, in
+# which case the count is left unknown (None) rather than guessed.
+
+SNIFF_BYTES = 512
+FILE_INFO_COLUMNS = ("size_bytes", "sha256", "detected_content_type", "page_count")
+_OVERLAP = 512  # longer than any match below
+
+# (offset, magic, type), first match wins
+_SIGNATURES = [
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"BM", "image/bmp"),
+    (128, b"DICM", "application/dicom"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),  # legacy .doc/.xls
+    (0, b"{\\rtf", "application/rtf"),
+]
+
+_PAGE = re.compile(rb"/Type\s{0,16}/Page(?![A-Za-z])")
+_PAGES_COUNT = re.compile(
+    rb"/Type\s{0,16}/Pages(?![A-Za-z])[^>]{0,200}?/Count\s{1,16}(\d{1,10})"
+    rb"|/Count\s{1,16}(\d{1,10})[^>]{0,200}?/Type\s{0,16}/Pages(?![A-Za-z])"
+)
+
+def sniff_type(head: bytes) -> str:
+    for offset, magic, content_type in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+    if head[8:12] in (b"heic", b"heix", b"mif1") and head[4:8] == b"ftyp":
+        return "image/heic"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head and b"\x00" not in head:
+        try:
+            # not final: the sample may end inside a multi-byte character
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+            return "text/plain"
+        except UnicodeDecodeError:
+            pass
+    return "application/octet-stream"
+
+class FileInspector:
+    """Read-only, unseekable file object over `source` that inspects what is read."""
+
+    def __init__(self, source) -> None:
+        self.source = source
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._head = b""
+        self._tail = b""
+        self._pages = 0
+        self._page_tree_count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        if data:
+            self.update(data)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        # a retry that re-reads the data would be hashed twice
+        return False
+
+    def update(self, data: bytes) -> None:
+        self.size += len(data)
+        self._sha256.update(data)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+        if self._head.startswith(b"%PDF-"):
+            self._scan_pdf(data)
+
+    def _scan_pdf(self, data: bytes) -> None:
+        window = self._tail + data
+        # a match is only settled once _OVERLAP bytes follow its start: closer
+        # to the end, the next chunk may still extend it ("/Page" + "s ...").
+        # Unsettled matches are left in the tail for the next chunk or the end
+        settled = len(window) - _OVERLAP
+        if settled <= 0:
+            self._tail = window
+            return
+        pages, page_tree_count = self._count(window, settled)
+        self._pages += pages
+        self._page_tree_count = max(self._page_tree_count, page_tree_count)
+        self._tail = window[settled:]
+
+    @staticmethod
+    def _count(window: bytes, before: int):
+        """Pages and largest page tree /Count among matches starting before `before`."""
+        pages = sum(1 for match in _PAGE.finditer(window) if match.start() < before)
+        counts = [int(match.group(1) or match.group(2)) for match in _PAGES_COUNT.finditer(window)
+                  if match.start() < before]
+        return pages, max(counts, default=0)
+
+    def page_count(self) -> Optional[int]:
+        if not self._head.startswith(b"%PDF-"):
+            return None
+        # whatever is still in the tail is final now
+        pages, page_tree_count = self._count(self._tail, len(self._tail))
+        return max(self._page_tree_count, page_tree_count) or self._pages + pages or None
+
+    def result(self) -> dict:
+        """Column values for the Document."""
+        return {
+            "size_bytes": self.size,
+            "sha256": self._sha256.hexdigest(),
+            "detected_content_type": sniff_type(self._head),
+            "page_count": self.page_count(),
+        }
+
+def inspect_chunks(chunks) -> dict:
+    inspector = FileInspector(None)
+    for chunk in chunks:
+        inspector.update(chunk)
+    return inspector.result()
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, timezone
+from typing import Iterator, List, Sequence
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from app.core import bulkheads
+from app.db import SessionLocal
+from app.models.models import User, Document
+
+# CSV / NDJSON export of a doctor's whole patient panel, streamed.
+#
+# Rows come off a server-side cursor (yield_per implies stream_results) in
+# batches of PANEL_EXPORT_BATCH_SIZE and each batch is written out as soon as
+# it is fetched, so memory holds one batch whatever the panel size and the
+# header goes out before the query has run. Document counts are a correlated
+# subquery on the documents.patient_id index rather than a GROUP BY, which
+# would have to aggregate every document before the first row.
+#
+# Names, emails and phones come from user-edited profiles. A CSV cell starting
+# with =, +, -, @, tab or CR is run as a formula by Excel and Sheets, so those
+# are written with a leading ' (shown as text, not part of the value); NDJSON
+# is left as is.
+#
+# The stream runs after the route has returned and its session is closed, so
+# it opens a session of its own and closes it when the stream ends.
+
+PANEL_EXPORT_BATCH_SIZE = int(os.getenv("PANEL_EXPORT_BATCH_SIZE", 1000))
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+COLUMNS = [
+    "patient_id", "email", "first_name", "last_name", "date_of_birth", "phone",
+    "created_at", "updated_at", "documents_count",
+]
+
+def panel_query(doctor_id: str):
+    documents_count = (
+        select(func.count(Document.id))
+        .where(Document.patient_id == User.auth0_user_id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            User.auth0_user_id, User.email, User.first_name, User.last_name, User.date_of_birth,
+            User.phone, User.created_at, User.updated_at, documents_count,
+        )
+        .where(User.doctor_id == doctor_id, User.role == "patient")
+        .order_by(User.auth0_user_id)
+    )
+
+def iter_panel(doctor_id: str, batch_size: int = PANEL_EXPORT_BATCH_SIZE) -> Iterator[Sequence[tuple]]:
+    """The panel's rows (in COLUMNS order), one fetched batch at a time."""
+    db = SessionLocal()
+    try:
+        result = db.execute(panel_query(doctor_id), execution_options={"yield_per": batch_size})
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+def _value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _csv_value(value):
+    value = _value(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _csv_lines(batches: Iterator[Sequence[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue().encode()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode()
+
+def _ndjson_lines(batches: Iterator[Sequence[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        lines: List[str] = [json.dumps(dict(zip(COLUMNS, map(_value, row)))) for row in batch]
+        yield ("\n".join(lines) + "\n").encode()
+
+def build_panel_export_response(doctor_id: str, format: str) -> StreamingResponse:
+    batches = iter_panel(doctor_id)
+    body = _csv_lines(batches) if format == "csv" else _ndjson_lines(batches)
+    filename = f"patients-{datetime.now(timezone.utc):%Y%m%d}.{format}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store",
+    }
+    return StreamingResponse(bulkheads.iterate("db", body), media_type=FORMATS[format], headers=headers)
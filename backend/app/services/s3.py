@@ -1,19 +1,41 @@
 import os
+import threading
 from boto3 import client as boto3_client
 from botocore.exceptions import ClientError
+from app.core.metrics import instrument_boto_client
+from app.services import encryption
 
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 AWS_REGION = os.getenv("AWS_REGION")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+# Set for S3-compatible on-prem stores (MinIO, Ceph RGW, ...)
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
 
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+# boto3 clients are thread-safe and expensive to build, so one is shared per process
 def get_s3_client():
-  return boto3_client(
-      "s3",
-      aws_access_key_id=AWS_ACCESS_KEY_ID,
-      aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-      region_name=AWS_REGION,
-  )
+  global _s3_client
+  if _s3_client is None:
+    with _s3_client_lock:
+      if _s3_client is None:
+        _s3_client = instrument_boto_client(boto3_client(
+            "s3",
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            region_name=AWS_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
+        ))
+  return _s3_client
+
+# cheap reachability/permission check for readiness probes
+def ping_bucket(bucket: str):
+  try:
+    get_s3_client().head_bucket(Bucket=bucket)
+  except ClientError as e:
+    raise Exception(f"Error reaching S3 bucket: {e}")
 
 # file_obj is a file object 
 # bucket is the name of the S3 bucket
@@ -23,8 +45,14 @@ def upload_file(file_obj, bucket, object_name):
     raise ValueError("object_name is required")
   
   s3_client = get_s3_client()
+  extra_args = {"ACL": "private"}
+  if encryption.enabled():
+    # encrypted frame by frame as boto3 reads it; the wrapped data key goes in the metadata
+    envelope = encryption.new_envelope()
+    file_obj = envelope.encrypt(file_obj)
+    extra_args["Metadata"] = envelope.metadata()
   try:
-    s3_client.upload_fileobj(file_obj, bucket, object_name, ExtraArgs={"ACL": "private"})
+    s3_client.upload_fileobj(file_obj, bucket, object_name, ExtraArgs=extra_args)
     return generate_presigned_url(object_name)
   except ClientError as e:
     raise Exception(f"Error uploading file to S3: {e}")
@@ -72,4 +100,91 @@ def check_file_exists(bucket_name, object_name):
     else:
       raise Exception(f"Error checking file existence: {e}")
 
+# get size, ETag, Last-Modified and content type of an object without downloading it
+# returns None if the object does not exist. For encrypted objects `size` is
+# that of the plaintext and `envelope` opens it (pass the result to stream_file)
+def get_file_metadata(bucket_name, object_name):
+  s3_client = get_s3_client()
+  try:
+    response = s3_client.head_object(Bucket=bucket_name, Key=object_name)
+  except ClientError as e:
+    if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+      return None
+    raise Exception(f"Error reading file metadata: {e}")
+  try:
+    envelope = encryption.open_envelope(response.get("Metadata"))
+  except encryption.DecryptionError as e:
+    raise Exception(f"Error reading file metadata: {e}")
+  size = response["ContentLength"]
+  return {
+    "size": envelope.plaintext_size(size) if envelope else size,
+    "etag": response.get("ETag"),
+    "last_modified": response.get("LastModified"),
+    "content_type": response.get("ContentType"),
+    "envelope": envelope,
+  }
+
+# stream an object (or the inclusive byte range start..end of it) in chunks
+# without reading the whole body into memory. Encrypted objects are decrypted;
+# a range of one is read as the whole frames it touches, which needs the
+# object's metadata first: pass `metadata` from get_file_metadata to save a HEAD
+def stream_file(bucket_name, object_name, start=None, end=None, chunk_size=256 * 1024, metadata=None):
+  s3_client = get_s3_client()
+  if start is not None and metadata is None:
+    metadata = get_file_metadata(bucket_name, object_name)
+    if metadata is None:
+      raise Exception(f"Error reading file from S3: {object_name} not found")
+  envelope = metadata["envelope"] if metadata else None
+  params = {"Bucket": bucket_name, "Key": object_name}
+  if start is not None:
+    if envelope is not None:
+      last = metadata["size"] - 1 if end is None else end
+      params["Range"] = "bytes=%d-%d" % envelope.stored_range(start, last)
+    else:
+      params["Range"] = f"bytes={start}-{'' if end is None else end}"
+  try:
+    response = s3_client.get_object(**params)
+    if metadata is None:
+      envelope = encryption.open_envelope(response.get("Metadata"))
+  except (ClientError, encryption.DecryptionError) as e:
+    raise Exception(f"Error reading file from S3: {e}")
+
+  body = response["Body"]
+  chunks = body.iter_chunks(chunk_size=chunk_size)
+  if envelope is not None:
+    size = metadata["size"] if metadata else envelope.plaintext_size(response["ContentLength"])
+    chunks = envelope.decrypt(chunks, size, start or 0, end)
+  try:
+    for chunk in chunks:
+      yield chunk
+  except encryption.DecryptionError as e:
+    raise Exception(f"Error decrypting file from S3: {e}")
+  finally:
+    body.close()
 
+# list objects under a prefix page by page (keys come back in UTF-8 binary order)
+# yields (key, last_modified) tuples
+def list_files(bucket_name, prefix="", page_size=1000):
+  s3_client = get_s3_client()
+  paginator = s3_client.get_paginator("list_objects_v2")
+  try:
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig={"PageSize": page_size}):
+      for obj in page.get("Contents", []):
+        yield obj["Key"], obj["LastModified"]
+  except ClientError as e:
+    raise Exception(f"Error listing files in S3: {e}")
+
+# delete up to 1000 objects in a single request
+# returns the keys that could not be deleted
+def delete_files(bucket_name, object_names):
+  if not object_names:
+    return []
+  s3_client = get_s3_client()
+  try:
+    response = s3_client.delete_objects(
+      Bucket=bucket_name,
+      Delete={"Objects": [{"Key": key} for key in object_names], "Quiet": True},
+    )
+  except ClientError as e:
+    raise Exception(f"Error deleting files from S3: {e}")
+  return [error["Key"] for error in response.get("Errors", [])]
@@ -0,0 +1,18 @@
+from typing import Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.models import User, Document
+
+# Cheap aggregate "versions" of collections, used to build ETags before any
+# rows are loaded. Any insert, update or delete changes the count or moves
+# max(updated_at) forward (onupdate keeps updated_at current).
+
+def documents_version(db: Session, patient_id: str) -> Tuple[int, object]:
+    return tuple(db.query(func.count(Document.id), func.max(Document.updated_at)).filter(
+        Document.patient_id == patient_id
+    ).one())
+
+def patients_version(db: Session, doctor_id: str) -> Tuple[int, object]:
+    return tuple(db.query(func.count(User.auth0_user_id), func.max(User.updated_at)).filter(
+        User.doctor_id == doctor_id
+    ).one())
@@ -0,0 +1,192 @@
+"""Offline stand-ins for the app's external services: Auth0 and S3.
+
+LocalIssuer signs RS256 tokens with a freshly generated key and publishes the
+matching JWKS, so tokens go through the real verify_jwt path. StubStorage is
+an in-memory replacement for the boto3 S3 client that implements the calls
+app.services.s3 makes, with an optional fixed latency per call.
+"""
+import base64
+import io
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from botocore.exceptions import ClientError
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+from sqlalchemy.orm import Session
+from app.models.models import User, Document
+
+def _b64url_uint(value: int) -> str:
+    data = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+class LocalIssuer:
+    def __init__(self, domain: str, audience: str, namespace: str = "") -> None:
+        self.domain = domain
+        self.audience = audience
+        self.namespace = namespace
+        self.kid = uuid.uuid4().hex
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode()
+        numbers = key.public_key().public_numbers()
+        self.jwks = {"keys": [{
+            "kty": "RSA",
+            "use": "sig",
+            "alg": "RS256",
+            "kid": self.kid,
+            "n": _b64url_uint(numbers.n),
+            "e": _b64url_uint(numbers.e),
+        }]}
+
+    def token(self, sub: str, role: str, email: Optional[str] = None, ttl: int = 3600) -> str:
+        now = int(time.time())
+        claims = {
+            "sub": sub,
+            "email": email,
+            "aud": self.audience,
+            "iss": f"https://{self.domain}/",
+            "iat": now,
+            "exp": now + ttl,
+            f"{self.namespace}roles": [role],
+            f"{self.namespace}permissions": [],
+        }
+        return jwt.encode(claims, self.private_pem, algorithm="RS256", headers={"kid": self.kid})
+
+class _Body:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        for i in range(0, len(self._data), chunk_size):
+            yield self._data[i:i + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+def _not_found(operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, operation)
+
+class StubStorage:
+    """The subset of the boto3 S3 client used by app.services.s3, kept in memory."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.objects: Dict[str, bytes] = {}
+        self.modified: Dict[str, datetime] = {}
+        self.metadata: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _wait(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put(self, key: str, data: bytes, metadata: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self.objects[key] = data
+            self.modified[key] = datetime.now(timezone.utc)
+            self.metadata[key] = dict(metadata or {})
+
+    def head_bucket(self, Bucket=None):
+        self._wait()
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        self._wait()
+        self.put(Key, Fileobj.read(), (ExtraArgs or {}).get("Metadata"))
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600):
+        # signing is local in boto3 as well, no latency
+        return f"https://storage.invalid/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    def head_object(self, Bucket, Key):
+        self._wait()
+        data = self.objects.get(Key)
+        if data is None:
+            raise _not_found("HeadObject")
+        return {"ContentLength": len(data), "ETag": f'"{len(data):x}"', "LastModified": self.modified[Key],
+                "Metadata": dict(self.metadata.get(Key, {}))}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._wait()
+        data = self.objects.get(Key)
+        if data is None:
+            raise _not_found("GetObject")
+        if Range:
+            start, _, end = Range[len("bytes="):].partition("-")
+            data = data[int(start):int(end) + 1 if end else None]
+        return {"Body": _Body(data), "ContentLength": len(data), "Metadata": dict(self.metadata.get(Key, {}))}
+
+    def delete_object(self, Bucket, Key):
+        self._wait()
+        with self._lock:
+            self.objects.pop(Key, None)
+            self.modified.pop(Key, None)
+            self.metadata.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.delete_object(Bucket, item["Key"])
+        return {}
+
+def seed(db: Session, storage: StubStorage, run_id: str, doctors: int, patients_per_doctor: int,
+         documents_per_patient: int, file_size: int) -> List[dict]:
+    """Create one group of users and documents per doctor; returns their ids.
+
+    Ids and emails carry `run_id`, so seeding never collides with existing rows.
+    Every group needs two patients: the add/unassign scenarios move the second
+    one back and forth while the others read the first.
+    """
+    if patients_per_doctor < 2:
+        raise ValueError("patients_per_doctor must be at least 2")
+    if documents_per_patient < 1:
+        raise ValueError("documents_per_patient must be at least 1")
+    payload = bytes(range(256)) * (file_size // 256) + bytes(file_size % 256)
+    groups = []
+    for d in range(doctors):
+        doctor = User(auth0_user_id=f"bench|{run_id}|d{d}", email=f"d{d}.{run_id}@bench.invalid",
+                      first_name="Doctor", last_name=f"D{d}", role="doctor")
+        db.add(doctor)
+        patients = []
+        for p in range(patients_per_doctor):
+            patient = User(auth0_user_id=f"bench|{run_id}|d{d}p{p}", email=f"d{d}p{p}.{run_id}@bench.invalid",
+                           first_name="Patient", last_name=f"P{p}", role="patient",
+                           date_of_birth=datetime(1980, 1, 1), phone="555-0100",
+                           doctor_id=doctor.auth0_user_id)
+            db.add(patient)
+            patients.append(patient)
+        db.flush()
+        documents = []
+        for patient in patients:
+            for k in range(documents_per_patient):
+                key = f"documents/{patient.auth0_user_id}/{uuid.uuid4()}.pdf"
+                storage.put(key, payload)
+                document = Document(filename=f"report-{k}.pdf", file_path=key, content_type="application/pdf",
+                                    description="benchmark document", patient_id=patient.auth0_user_id,
+                                    uploaded_by_id=doctor.auth0_user_id)
+                db.add(document)
+                documents.append(document)
+        db.flush()
+        patient = patients[0]
+        groups.append({
+            "doctor_id": doctor.auth0_user_id,
+            "doctor_email": doctor.email,
+            "patient_id": patient.auth0_user_id,
+            "patient_email": patient.email,
+            "patient_first_name": patient.first_name,
+            "patient_last_name": patient.last_name,
+            "spare_patient_id": patients[-1].auth0_user_id,
+            "document_id": next(doc.id for doc in documents if doc.patient_id == patient.auth0_user_id),
+        })
+    db.commit()
+    return groups
+
+def sample_file(size: int = 16 * 1024) -> io.BytesIO:
+    return io.BytesIO(b"%PDF-1.4\n" + b"0" * max(size - 9, 0))
@@ -0,0 +1,347 @@
+"""Offline end-to-end benchmarks for every route in doctors.py and patients.py.
+
+The real app runs in-process - full middleware stack and lifespan, driven
+through httpx's ASGI transport - against a local database, tokens signed by a
+locally generated RSA key, and in-memory storage. Nothing leaves the machine.
+
+    python -m benchmarks.run                                      # sqlite in a temp dir
+    python -m benchmarks.run --concurrency 16 --requests 400 --only doctor_
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json  # exit 1 on regression
+
+Each concurrent worker acts as its own doctor and patient, so write scenarios
+never contend for the same rows. Latency covers only the measured request;
+the setup/cleanup requests of write scenarios (re-adding an unassigned
+patient, deleting an uploaded document) are excluded from it but do count
+towards wall time, and therefore throughput. Baselines are only comparable
+on the same machine and settings; keep one per CI runner.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BENCH_AUTH0_DOMAIN = "bench.invalid"
+BENCH_AUDIENCE = "https://api.bench.invalid"
+BENCH_NAMESPACE = "https://bench.invalid/"
+
+class BenchmarkError(Exception):
+    pass
+
+@dataclass
+class Scenario:
+    name: str
+    role: str
+    method: str
+    path: str
+    # ctx -> extra httpx request arguments (data, json, files)
+    body: Optional[Callable[[dict], dict]] = None
+    expected_status: int = 200
+    # untimed steps around the measured request
+    before: Optional[Callable[..., Awaitable[None]]] = None
+    after: Optional[Callable[..., Awaitable[None]]] = None
+
+async def _call(client, ctx: dict, role: str, method: str, path: str, expected_status: int = 200, **kwargs):
+    response = await client.request(method, path.format(**ctx), headers=ctx["headers"][role], **kwargs)
+    if response.status_code != expected_status:
+        raise BenchmarkError(f"{method} {path}: {response.status_code} {response.text[:200]}")
+    return response
+
+def _upload_body(ctx: dict) -> dict:
+    from benchmarks.fixtures import sample_file
+    return {"files": {"file": ("bench.pdf", sample_file(ctx["upload_size"]), "application/pdf")},
+            "data": {"description": "uploaded by benchmark"}}
+
+async def _reassign_spare(client, ctx: dict, response=None) -> None:
+    await _call(client, ctx, "doctor", "POST", "/api/doctors/add-patient",
+                data={"patient_auth0_id": ctx["spare_patient_id"]})
+
+async def _unassign_spare(client, ctx: dict) -> None:
+    await _call(client, ctx, "doctor", "DELETE", "/api/doctors/patients/{spare_patient_id}")
+
+async def _delete_uploaded(client, ctx: dict, response) -> None:
+    if response.status_code == 200:
+        await _call(client, ctx, "doctor", "DELETE",
+                    f"/api/doctors/patients/{{patient_id}}/documents/{response.json()['document_id']}")
+
+def _batch_upload_body(ctx: dict) -> dict:
+    from benchmarks.fixtures import sample_file
+    files = [("files", (f"bench-{n}.pdf", sample_file(ctx["upload_size"]), "application/pdf")) for n in range(4)]
+    return {"files": files, "data": {"description": "uploaded by benchmark"}}
+
+async def _delete_batch_uploaded(client, ctx: dict, response) -> None:
+    if response.status_code == 200:
+        for result in response.json()["results"]:
+            await _call(client, ctx, "doctor", "DELETE",
+                        f"/api/doctors/patients/{{patient_id}}/documents/{result['document']['document_id']}")
+
+async def _upload_scratch(client, ctx: dict) -> None:
+    response = await _call(client, ctx, "doctor", "POST", "/api/doctors/patients/{patient_id}/documents/upload",
+                           **_upload_body(ctx))
+    ctx["scratch_document_id"] = response.json()["document_id"]
+
+DOCTOR_DOCUMENT = "/api/doctors/patients/{patient_id}/documents/{document_id}"
+
+SCENARIOS: List[Scenario] = [
+    # doctors.py
+    Scenario("doctor_profile", "doctor", "GET", "/api/doctors/profile"),
+    Scenario("doctor_update_profile", "doctor", "PUT", "/api/doctors/profile",
+             body=lambda ctx: {"data": {"phone": "555-0199"}}),
+    Scenario("doctor_patients", "doctor", "GET", "/api/doctors/patients"),
+    Scenario("doctor_patient_changes", "doctor", "GET", "/api/doctors/patients/changes"),
+    Scenario("doctor_export_patients", "doctor", "GET", "/api/doctors/patients/export"),
+    Scenario("doctor_patient", "doctor", "GET", "/api/doctors/patients/{patient_id}"),
+    Scenario("doctor_update_patient", "doctor", "PUT", "/api/doctors/patients/{patient_id}",
+             body=lambda ctx: {"data": {"phone": "555-0142"}}),
+    Scenario("doctor_unassign_patient", "doctor", "DELETE", "/api/doctors/patients/{spare_patient_id}",
+             after=_reassign_spare),
+    Scenario("doctor_add_patient", "doctor", "POST", "/api/doctors/add-patient",
+             body=lambda ctx: {"data": {"patient_auth0_id": ctx["spare_patient_id"]}},
+             before=_unassign_spare),
+    Scenario("doctor_recent_documents", "doctor", "GET", "/api/doctors/documents/recent"),
+    Scenario("doctor_patient_documents", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents"),
+    Scenario("doctor_patient_document_changes", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents/changes"),
+    Scenario("doctor_export_documents", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents/export"),
+    Scenario("doctor_upload_document", "doctor", "POST", "/api/doctors/patients/{patient_id}/documents/upload",
+             body=_upload_body, after=_delete_uploaded),
+    Scenario("doctor_batch_upload_documents", "doctor", "POST",
+             "/api/doctors/patients/{patient_id}/documents/batch-upload",
+             body=_batch_upload_body, after=_delete_batch_uploaded),
+    Scenario("doctor_patient_document", "doctor", "GET", DOCTOR_DOCUMENT),
+    Scenario("doctor_update_document", "doctor", "PUT", DOCTOR_DOCUMENT,
+             body=lambda ctx: {"data": {"description": "updated by benchmark"}}),
+    Scenario("doctor_delete_document", "doctor", "DELETE",
+             "/api/doctors/patients/{patient_id}/documents/{scratch_document_id}", before=_upload_scratch),
+    Scenario("doctor_document_preview", "doctor", "GET", DOCTOR_DOCUMENT + "/preview"),
+    Scenario("doctor_document_download", "doctor", "GET", DOCTOR_DOCUMENT + "/download"),
+    # patients.py
+    Scenario("patient_verify_details", "doctor", "POST", "/api/patients/verify-details",
+             body=lambda ctx: {"json": {"email": ctx["patient_email"], "first_name": ctx["patient_first_name"],
+                                        "last_name": ctx["patient_last_name"]}}),
+    Scenario("patient_profile", "patient", "GET", "/api/patients/profile"),
+    Scenario("patient_update_profile", "patient", "PUT", "/api/patients/profile",
+             body=lambda ctx: {"data": {"phone": "555-0123"}}),
+    Scenario("patient_doctor", "patient", "GET", "/api/patients/doctor"),
+    Scenario("patient_documents", "patient", "GET", "/api/patients/documents"),
+    Scenario("patient_document_changes", "patient", "GET", "/api/patients/documents/changes"),
+    Scenario("patient_export_documents", "patient", "GET", "/api/patients/documents/export"),
+    Scenario("patient_document", "patient", "GET", "/api/patients/documents/{document_id}"),
+    Scenario("patient_document_preview", "patient", "GET", "/api/patients/documents/{document_id}/preview"),
+    Scenario("patient_document_download", "patient", "GET", "/api/patients/documents/{document_id}/download"),
+    Scenario("patient_record", "doctor", "GET", "/api/patients/{patient_id}"),
+]
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    # nearest-rank
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], errors: int, wall: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / wall, 1) if wall else 0.0,
+        "mean_ms": round(1000 * sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 2),
+        "p95_ms": round(1000 * percentile(values, 95), 2),
+        "p99_ms": round(1000 * percentile(values, 99), 2),
+    }
+
+async def run_scenario(client, scenario: Scenario, contexts: List[dict], requests: int, warmup: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+
+    async def once(ctx: dict, record: bool) -> None:
+        nonlocal errors
+        if scenario.before:
+            await scenario.before(client, ctx)
+        kwargs = scenario.body(ctx) if scenario.body else {}
+        start = time.perf_counter()
+        response = await client.request(scenario.method, scenario.path.format(**ctx),
+                                        headers=ctx["headers"][scenario.role], **kwargs)
+        elapsed = time.perf_counter() - start
+        if record:
+            latencies.append(elapsed)
+            if response.status_code != scenario.expected_status:
+                errors += 1
+        if scenario.after:
+            await scenario.after(client, ctx, response)
+
+    for i in range(warmup):
+        await once(contexts[i % len(contexts)], record=False)
+
+    remaining = requests
+
+    async def worker(ctx: dict) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await once(ctx, record=True)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(ctx) for ctx in contexts))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float, min_delta_ms: float) -> List[str]:
+    """Scenarios whose p95 or throughput got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        p95_delta = current["p95_ms"] - base["p95_ms"]
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and p95_delta > min_delta_ms:
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']} -> {current['rps']} req/s")
+    return regressions
+
+def print_report(results: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None, out=sys.stdout) -> None:
+    header = f"{'scenario':<28}{'req':>6}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header, file=out)
+    for name, r in results.items():
+        line = f"{name:<28}{r['requests']:>6}{r['errors']:>5}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+        base = (baseline or {}).get(name)
+        if base and base["p95_ms"]:
+            line += f"{100 * (r['p95_ms'] / base['p95_ms'] - 1):>+12.0f}%"
+        print(line, file=out)
+
+def configure_environment(database_url: str) -> None:
+    # must run before the app is imported: several settings are read at import time
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["AUTH0_DOMAIN"] = BENCH_AUTH0_DOMAIN
+    os.environ["API_AUDIENCE"] = BENCH_AUDIENCE
+    os.environ["AUTH0_NAMESPACE"] = BENCH_NAMESPACE
+    os.environ.setdefault("S3_BUCKET_NAME", "bench")
+    # every worker is one principal sending back-to-back requests; the
+    # per-principal rate limit would turn the run into a 429 benchmark
+    os.environ.setdefault("ADMISSION_RATE", "0")
+
+async def run_benchmarks(database_url: str, scenarios: List[Scenario], concurrency: int = 8, requests: int = 200,
+                         warmup: int = 10, patients_per_doctor: int = 5, documents_per_patient: int = 10,
+                         file_size: int = 64 * 1024, upload_size: int = 16 * 1024,
+                         storage_latency: float = 0.0) -> Dict[str, dict]:
+    import httpx
+    from app import db
+    from app.app import app
+    from app.core import security
+    from app.core.lifespan import lifespan
+    from app.services import s3
+    from benchmarks.fixtures import LocalIssuer, StubStorage, seed
+
+    issuer = LocalIssuer(BENCH_AUTH0_DOMAIN, BENCH_AUDIENCE, BENCH_NAMESPACE)
+    storage = StubStorage(latency=storage_latency)
+    security.load_jwks(issuer.jwks)
+    # installed as the process-wide client, so app.services.s3 is exercised as is
+    s3._s3_client = storage
+
+    db.dispose_engine()
+    engine = db.init_engine(database_url)
+    db.Base.metadata.create_all(engine)
+    session = db.SessionLocal()
+    try:
+        groups = seed(session, storage, uuid.uuid4().hex[:8], concurrency, patients_per_doctor,
+                      documents_per_patient, file_size)
+    finally:
+        session.close()
+
+    contexts = []
+    for group in groups:
+        ctx = dict(group, upload_size=upload_size)
+        ctx["headers"] = {
+            "doctor": {"Authorization": f"Bearer {issuer.token(group['doctor_id'], 'doctor', group['doctor_email'])}"},
+            "patient": {"Authorization": f"Bearer {issuer.token(group['patient_id'], 'patient', group['patient_email'])}"},
+        }
+        contexts.append(ctx)
+
+    results = {}
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenario(client, scenario, contexts, requests, warmup)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database-url", help="defaults to a throwaway sqlite file; rows are added, never deleted")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per scenario")
+    parser.add_argument("--only", action="append", default=[], help="run scenarios whose name starts with this")
+    parser.add_argument("--patients-per-doctor", type=int, default=5)
+    parser.add_argument("--documents-per-patient", type=int, default=10)
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="bytes per stored document")
+    parser.add_argument("--storage-latency-ms", type=float, default=0.0, help="added to every storage call")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved run; exit 1 on regression")
+    parser.add_argument("--save-baseline", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore p95 changes smaller than this")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in SCENARIOS if not args.only or any(s.name.startswith(p) for p in args.only)]
+    if not scenarios:
+        parser.error("no scenario matches --only")
+
+    tmpdir = None
+    database_url = args.database_url
+    if not database_url:
+        tmpdir = tempfile.mkdtemp(prefix="patientlink-bench-")
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    configure_environment(database_url)
+    try:
+        results = asyncio.run(run_benchmarks(
+            database_url, scenarios, concurrency=args.concurrency, requests=args.requests, warmup=args.warmup,
+            patients_per_doctor=args.patients_per_doctor, documents_per_patient=args.documents_per_patient,
+            file_size=args.file_size, storage_latency=args.storage_latency_ms / 1000,
+        ))
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    run = {
+        "meta": {
+            "python": platform.python_version(),
+            "database": database_url.split(":", 1)[0],
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "storage_latency_ms": args.storage_latency_ms,
+        },
+        "results": results,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(run, f, indent=2)
+
+    failed = [name for name, r in results.items() if r["errors"]]
+    if failed:
+        print(f"\nscenarios with errors: {', '.join(failed)}")
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms) if baseline else []
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if failed or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+from contextlib import contextmanager
+
+# the whole suite is one client without credentials, i.e. one principal: the
+# per-principal rate limit would otherwise fail whichever test runs past it.
+# Read when the app is imported, so set before any test imports it.
+os.environ.setdefault("ADMISSION_RATE", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import db as database
+from app.db import Base, SessionLocal, get_db
+from app.core.querycount import capture_queries
+from app.core.security import get_current_user
+from app.models.models import User, Document
+from app.services import audit, events, s3
+from benchmarks.fixtures import StubStorage
+
+DOCTOR_ID = "auth0|doctor"
+PATIENT_ID = "auth0|patient0"
+
+
+class Api:
+  """The full app on a throwaway sqlite database, in-memory storage and a settable principal."""
+
+  def __init__(self, client, session_factory, storage):
+    self.client = client
+    self.session_factory = session_factory
+    self.storage = storage
+    self.principal = None
+
+  def as_doctor(self, user_id=DOCTOR_ID, permissions=()):
+    self.principal = {"user_id": user_id, "email": None, "roles": ["doctor"], "permissions": list(permissions)}
+    return self
+
+  def as_patient(self, user_id=PATIENT_ID):
+    self.principal = {"user_id": user_id, "email": None, "roles": ["patient"], "permissions": []}
+    return self
+
+  def add_patients(self, count, documents_per_patient=3, doctor_id=DOCTOR_ID, start=0):
+    db = self.session_factory()
+    try:
+      for p in range(start, start + count):
+        patient_id = f"auth0|patient{p}"
+        db.add(User(auth0_user_id=patient_id, email=f"patient{p}@example.com", first_name="Pat", last_name=f"P{p}",
+                    role="patient", phone="555-0100", doctor_id=doctor_id))
+        db.flush()
+        for k in range(documents_per_patient):
+          key = f"documents/{patient_id}/{k}.pdf"
+          self.storage.put(key, b"%PDF-1.4 test")
+          db.add(Document(filename=f"{k}.pdf", file_path=key, content_type="application/pdf",
+                          patient_id=patient_id, uploaded_by_id=doctor_id))
+      db.commit()
+    finally:
+      db.close()
+
+  def first_document_id(self, patient_id=PATIENT_ID):
+    db = self.session_factory()
+    try:
+      return db.query(Document.id).filter(Document.patient_id == patient_id).order_by(Document.id).first()[0]
+    finally:
+      db.close()
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+  from app.app import app
+
+  engine = create_engine(f"sqlite:///{tmp_path / 'api.db'}", connect_args={"check_same_thread": False})
+  Base.metadata.create_all(engine)
+  session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+  storage = StubStorage()
+  monkeypatch.setattr(s3, "_s3_client", storage)
+  # audit events are written straight to the test engine, and only when a test flushes
+  monkeypatch.setattr(database, "engine", engine)
+  previous_bind = SessionLocal.kw.get("bind")
+  SessionLocal.configure(bind=engine)
+  audit_buffer = audit.AuditBuffer(flush_size=10**6, flush_interval=3600)
+  monkeypatch.setattr(audit, "buffer", audit_buffer)
+  monkeypatch.setattr(events, "hub", events.EventHub())
+
+  db = session_factory()
+  db.add(User(auth0_user_id=DOCTOR_ID, email="doctor@example.com", first_name="Doc", last_name="Tor", role="doctor"))
+  db.commit()
+  db.close()
+
+  api = Api(TestClient(app), session_factory, storage)
+  api.add_patients(3)
+
+  def override_get_db():
+    session = session_factory()
+    try:
+      yield session
+    finally:
+      session.close()
+
+  app.dependency_overrides[get_db] = override_get_db
+  app.dependency_overrides[get_current_user] = lambda: api.principal
+  yield api
+  app.dependency_overrides.clear()
+  audit_buffer.stop()
+  SessionLocal.configure(bind=previous_bind)
+  engine.dispose()
+
+
+@pytest.fixture
+def assert_max_queries():
+  """`with assert_max_queries(n):` fails if the block runs more than n SQL statements."""
+  @contextmanager
+  def check(limit):
+    with capture_queries() as log:
+      yield log
+    assert log.count <= limit, f"{log.count} queries, budget is {limit}:\n{log.report()}"
+  return check
@@ -0,0 +1,51 @@
+import asyncio
+
+from app.core.admission import ConcurrencyLimiter, TokenBuckets, classify, parse_limits
+
+
+class TestClassify:
+  def test_route_classes(self):
+    assert classify("GET", "/api/patients/profile") == "read"
+    assert classify("GET", "/api/doctors/patients/p1/documents/3/download") == "transfer"
+    assert classify("POST", "/api/doctors/patients/p1/documents/upload") == "upload"
+    assert classify("PUT", "/api/doctors/patients/p1/documents/3") == "upload"
+    assert classify("DELETE", "/api/doctors/patients/p1") == "write"
+    assert classify("GET", "/docs") is None
+
+  def test_parse_limits(self):
+    assert parse_limits("read=4:8, upload=2") == {"read": (4, 8), "upload": (2, 0)}
+
+
+class TestConcurrencyLimiter:
+  def test_queue_and_timeout(self):
+    async def scenario():
+      limiter = ConcurrencyLimiter(limit=1, max_queue=1)
+      assert await limiter.acquire(0.1)
+      # queue full -> immediate rejection
+      waiting = asyncio.ensure_future(limiter.acquire(1.0))
+      await asyncio.sleep(0)
+      assert not await limiter.acquire(1.0)
+      # releasing hands the slot to the queued waiter
+      limiter.release()
+      assert await waiting
+      assert limiter.in_flight == 1
+      # nobody releases -> queued request times out
+      assert not await limiter.acquire(0.05)
+      limiter.release()
+      assert limiter.in_flight == 0
+    asyncio.run(scenario())
+
+
+class TestTokenBuckets:
+  def test_burst_then_throttle(self):
+    buckets = TokenBuckets(rate=1, burst=2, max_principals=10)
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == 0
+    assert buckets.take("a") > 0
+    assert buckets.take("b") == 0
+
+  def test_bounded_principals(self):
+    buckets = TokenBuckets(rate=1, burst=1, max_principals=2)
+    for principal in ("a", "b", "c"):
+      buckets.take(principal)
+    assert list(buckets.buckets) == ["b", "c"]
@@ -0,0 +1,171 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.models.models import AuditEvent
+from app.services import audit
+from app.services.audit import AuditBuffer, AuditUnavailable
+from conftest import DOCTOR_ID, PATIENT_ID
+
+
+def _event(n=0):
+  return {"actor_id": "auth0|someone", "action": audit.DOCUMENT_VIEW, "document_id": n}
+
+
+def _events(api):
+  db = api.session_factory()
+  try:
+    return db.execute(select(AuditEvent).order_by(AuditEvent.occurred_at)).scalars().all()
+  finally:
+    db.close()
+
+
+class TestAuditBuffer:
+  def test_flushes_when_batch_is_full(self):
+    batches = []
+    buffer = AuditBuffer(flush_size=3, flush_interval=3600, writer=batches.append)
+    buffer.start()
+    try:
+      for n in range(7):
+        buffer.record(_event(n))
+      deadline = time.monotonic() + 2
+      while sum(map(len, batches)) < 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+      assert [len(b) for b in batches] == [3, 3]
+      assert [e["document_id"] for b in batches for e in b] == list(range(6))
+    finally:
+      buffer.stop()
+    assert [e["document_id"] for e in batches[-1]] == [6]
+
+  def test_flushes_on_interval(self):
+    written = threading.Event()
+    buffer = AuditBuffer(flush_size=100, flush_interval=0.05, writer=lambda batch: written.set())
+    buffer.start()
+    try:
+      buffer.record(_event())
+      assert written.wait(2)
+    finally:
+      buffer.stop()
+
+  def test_failed_write_is_retried_in_order(self):
+    attempts = []
+
+    def flaky(batch):
+      attempts.append([e["document_id"] for e in batch])
+      if len(attempts) == 1:
+        raise RuntimeError("database down")
+
+    buffer = AuditBuffer(flush_size=100, flush_interval=3600, writer=flaky)
+    buffer.record(_event(1))
+    buffer.record(_event(2))
+    buffer.flush()
+    assert list(buffer.pending) != []
+    buffer.flush()
+    buffer.stop()
+    assert attempts == [[1, 2], [1, 2]]
+    assert not buffer.pending
+
+  def test_backpressure_rejects_when_full(self):
+    buffer = AuditBuffer(flush_size=100, flush_interval=3600, max_pending=2, enqueue_timeout=0.05,
+                         writer=lambda batch: None)
+    buffer.record(_event(1))
+    buffer.record(_event(2))
+    with pytest.raises(AuditUnavailable):
+      buffer.record(_event(3))
+    buffer.flush()
+    buffer.record(_event(3))
+    buffer.stop()
+
+  def test_stop_writes_pending_events(self):
+    batches = []
+    buffer = AuditBuffer(flush_size=100, flush_interval=3600, writer=batches.append)
+    buffer.start()
+    buffer.record(_event(1))
+    buffer.stop()
+    assert [e["document_id"] for b in batches for e in b] == [1]
+
+
+class TestAuditedRoutes:
+  def test_document_reads_are_audited(self, api):
+    document_id = api.first_document_id()
+    api.as_doctor()
+    assert api.client.get(f"/api/doctors/patients/{PATIENT_ID}/documents").status_code == 200
+    assert api.client.get(f"/api/doctors/patients/{PATIENT_ID}/documents/{document_id}").status_code == 200
+    assert api.client.get(f"/api/doctors/patients/{PATIENT_ID}/documents/{document_id}/preview").status_code == 200
+    api.as_patient()
+    assert api.client.get(f"/api/patients/documents/{document_id}/download").status_code == 200
+    # nothing is written on the request path
+    assert _events(api) == []
+
+    audit.buffer.flush()
+    events = _events(api)
+    assert [(e.actor_id, e.actor_role, e.action) for e in events] == [
+      (DOCTOR_ID, "doctor", audit.DOCUMENT_LIST),
+      (DOCTOR_ID, "doctor", audit.DOCUMENT_VIEW),
+      (DOCTOR_ID, "doctor", audit.DOCUMENT_PREVIEW_URL),
+      (PATIENT_ID, "patient", audit.DOCUMENT_DOWNLOAD),
+    ]
+    assert all(e.patient_id == PATIENT_ID for e in events)
+    assert [e.document_id for e in events[1:]] == [document_id] * 3
+
+  def test_denied_access_is_not_audited(self, api):
+    document_id = api.first_document_id()
+    api.as_patient("auth0|patient1")
+    assert api.client.get(f"/api/patients/documents/{document_id}").status_code == 404
+    audit.buffer.flush()
+    assert _events(api) == []
+
+  def test_full_buffer_fails_the_request(self, api, monkeypatch):
+    monkeypatch.setattr(audit.buffer, "max_pending", 0)
+    monkeypatch.setattr(audit.buffer, "enqueue_timeout", 0)
+    api.as_patient()
+    response = api.client.get(f"/api/patients/documents/{api.first_document_id()}")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+class TestAuditEvents:
+  def _record(self, api, count):
+    api.as_patient()
+    document_id = api.first_document_id()
+    for _ in range(count):
+      assert api.client.get(f"/api/patients/documents/{document_id}").status_code == 200
+    audit.buffer.flush()
+
+  def test_requires_permission(self, api):
+    api.as_doctor()
+    assert api.client.get("/api/audit/events").status_code == 403
+
+  def test_pages_newest_first(self, api):
+    self._record(api, 5)
+    api.as_doctor(permissions=["read:audit"])
+    seen = []
+    cursor = None
+    while True:
+      params = {"limit": 2, "patient_id": PATIENT_ID}
+      if cursor:
+        params["cursor"] = cursor
+      page = api.client.get("/api/audit/events", params=params).json()
+      seen.extend(page["events"])
+      cursor = page["next_cursor"]
+      if cursor is None:
+        break
+    assert len(seen) == 5
+    assert len({e["id"] for e in seen}) == 5
+    keys = [(e["occurred_at"], e["id"]) for e in seen]
+    assert keys == sorted(keys, reverse=True)
+
+  def test_filters(self, api):
+    self._record(api, 2)
+    api.as_doctor(permissions=["read:audit"])
+    assert len(api.client.get("/api/audit/events", params={"actor_id": PATIENT_ID}).json()["events"]) == 2
+    assert api.client.get("/api/audit/events", params={"action": audit.DOCUMENT_DOWNLOAD}).json()["events"] == []
+    future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    assert api.client.get("/api/audit/events", params={"since": future}).json()["events"] == []
+
+  def test_invalid_cursor(self, api):
+    api.as_doctor(permissions=["read:audit"])
+    assert api.client.get("/api/audit/events", params={"cursor": "nope"}).status_code == 400
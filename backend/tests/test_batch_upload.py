@@ -0,0 +1,123 @@
+import io
+
+from botocore.exceptions import ClientError
+
+from app.api.routes import doctors
+from app.core.querycount import capture_queries
+from app.models.models import Document
+from conftest import PATIENT_ID
+
+BATCH_UPLOAD = f"/api/doctors/patients/{PATIENT_ID}/documents/batch-upload"
+
+
+def _files(*names, content=b"%PDF-1.4"):
+  return [("files", (name, content, "application/pdf")) for name in names]
+
+
+def _documents(api, **filters):
+  db = api.session_factory()
+  try:
+    return db.query(Document).filter_by(patient_id=PATIENT_ID, **filters).all()
+  finally:
+    db.close()
+
+
+class TestBatchUpload:
+  def test_uploads_every_file(self, api):
+    api.as_doctor()
+    names = [f"page-{n}.pdf" for n in range(6)]
+    response = api.client.post(BATCH_UPLOAD, files=_files(*names), data={"description": " scanned chart "})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["uploaded"] == 6 and body["failed"] == 0
+    assert [r["filename"] for r in body["results"]] == names
+    assert all(r["status"] == "uploaded" and r["error"] is None for r in body["results"])
+
+    stored = {d.id: d for d in _documents(api, description="scanned chart")}
+    for result in body["results"]:
+      document = stored[result["document"]["document_id"]]
+      assert document.filename == result["filename"]
+      assert api.storage.objects[document.file_path] == b"%PDF-1.4"
+
+  def test_failed_files_reported_per_file(self, api, monkeypatch):
+    api.as_doctor()
+    upload_fileobj = api.storage.upload_fileobj
+
+    def flaky_upload(Fileobj, Bucket, Key, ExtraArgs=None):
+      data = Fileobj.read()
+      if data.startswith(b"FAIL"):
+        raise ClientError({"Error": {"Code": "SlowDown", "Message": "slow down"}}, "PutObject")
+      upload_fileobj(io.BytesIO(data), Bucket, Key, ExtraArgs)
+
+    monkeypatch.setattr(api.storage, "upload_fileobj", flaky_upload)
+    files = _files("a.pdf") + _files("b.pdf", content=b"FAIL") + _files("c.pdf")
+    response = api.client.post(BATCH_UPLOAD, files=files)
+    assert response.status_code == 207, response.text
+    body = response.json()
+    assert body["uploaded"] == 2 and body["failed"] == 1
+    assert [(r["filename"], r["status"]) for r in body["results"]] == [
+      ("a.pdf", "uploaded"), ("b.pdf", "failed"), ("c.pdf", "uploaded"),
+    ]
+    assert body["results"][1]["document"] is None
+    assert "SlowDown" in body["results"][1]["error"]
+    assert {d.filename for d in _documents(api) if d.filename in ("a.pdf", "b.pdf", "c.pdf")} == {"a.pdf", "c.pdf"}
+
+  # sqlite cannot match RETURNING rows to a multi-row INSERT, so the ORM sends
+  # one INSERT per document there; Postgres gets a single one
+  def test_statements_independent_of_file_count(self, api):
+    api.as_doctor()
+    with capture_queries() as one:
+      assert api.client.post(BATCH_UPLOAD, files=_files("a.pdf")).status_code == 200
+    with capture_queries() as many:
+      assert api.client.post(BATCH_UPLOAD, files=_files(*[f"{n}.pdf" for n in range(10)])).status_code == 200
+    others = lambda log: [s for s in log.statements if not s.startswith("INSERT INTO documents")]
+    assert len(others(many)) == len(others(one)), many.report()
+
+  def test_failed_insert_removes_uploaded_objects(self, api, monkeypatch):
+    api.as_doctor()
+    before = set(api.storage.objects)
+
+    def broken_commit(self):
+      raise RuntimeError("database went away")
+
+    monkeypatch.setattr("sqlalchemy.orm.Session.commit", broken_commit)
+    client = api.client.__class__(api.client.app, raise_server_exceptions=False)
+    response = client.post(BATCH_UPLOAD, files=_files("a.pdf", "b.pdf"))
+    assert response.status_code == 500
+    assert set(api.storage.objects) == before
+
+  def test_undeleted_objects_logged(self, api, monkeypatch, caplog):
+    api.as_doctor()
+
+    def broken_commit(self):
+      raise RuntimeError("database went away")
+
+    # delete_objects reports per-key errors instead of raising
+    monkeypatch.setattr("sqlalchemy.orm.Session.commit", broken_commit)
+    requested = []
+
+    def partly_failing_delete(bucket, keys):
+      requested.extend(keys)
+      return keys[:1]
+
+    monkeypatch.setattr(doctors, "delete_files", partly_failing_delete)
+    client = api.client.__class__(api.client.app, raise_server_exceptions=False)
+    with caplog.at_level("ERROR", logger=doctors.logger.name):
+      response = client.post(BATCH_UPLOAD, files=_files("a.pdf", "b.pdf"))
+    assert response.status_code == 500
+    [record] = [r for r in caplog.records if "could not delete" in r.getMessage()]
+    assert len(requested) == 2
+    assert "1 uploaded objects" in record.getMessage()
+    assert requested[0] in record.getMessage() and requested[1] not in record.getMessage()
+
+  def test_too_many_files(self, api, monkeypatch):
+    api.as_doctor()
+    monkeypatch.setattr(doctors, "BATCH_UPLOAD_MAX_FILES", 2)
+    response = api.client.post(BATCH_UPLOAD, files=_files("a.pdf", "b.pdf", "c.pdf"))
+    assert response.status_code == 413
+
+  def test_other_doctors_patient(self, api):
+    api.as_doctor(user_id="auth0|other-doctor")
+    response = api.client.post(BATCH_UPLOAD, files=_files("a.pdf"))
+    assert response.status_code == 403
+    assert not any(d.filename == "a.pdf" for d in _documents(api))
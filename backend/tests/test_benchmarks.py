@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run import SCENARIOS, compare, percentile, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStatistics:
+  def test_percentile_nearest_rank(self):
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+  def test_summarize(self):
+    summary = summarize([0.001, 0.002, 0.003, 0.004], errors=1, wall=0.5)
+    assert summary["requests"] == 4
+    assert summary["errors"] == 1
+    assert summary["rps"] == 8.0
+    assert summary["p50_ms"] == 2.0
+
+
+class TestCompare:
+  base = {"a": {"p95_ms": 10.0, "rps": 100.0}}
+
+  def test_within_tolerance(self):
+    assert compare({"a": {"p95_ms": 11.0, "rps": 90.0}}, self.base, 0.2, 1.0) == []
+
+  def test_slower_p95(self):
+    assert compare({"a": {"p95_ms": 13.0, "rps": 100.0}}, self.base, 0.2, 1.0) == ["a: p95 10.0 -> 13.0 ms"]
+
+  def test_lower_throughput(self):
+    assert compare({"a": {"p95_ms": 10.0, "rps": 70.0}}, self.base, 0.2, 1.0) == ["a: throughput 100.0 -> 70.0 req/s"]
+
+  def test_tiny_p95_changes_ignored(self):
+    assert compare({"a": {"p95_ms": 0.9, "rps": 100.0}}, {"a": {"p95_ms": 0.5, "rps": 100.0}}, 0.2, 1.0) == []
+
+  def test_new_scenarios_ignored(self):
+    assert compare({"b": {"p95_ms": 10.0, "rps": 1.0}}, self.base, 0.2, 1.0) == []
+
+
+class TestScenarios:
+  def test_every_route_covered(self):
+    from app.api.routes import doctors, patients
+    routes = {(method, route.path) for module in (doctors, patients) for route in module.router.routes
+              for method in route.methods}
+    covered = set()
+    for scenario in SCENARIOS:
+      for method, path in routes:
+        template = "/api" + path
+        if scenario.method == method and _same_shape(scenario.path, template):
+          covered.add((method, path))
+    assert covered == routes
+
+  def test_end_to_end(self, tmp_path):
+    output = tmp_path / "results.json"
+    result = subprocess.run(
+      [sys.executable, "-m", "benchmarks.run", "--concurrency", "2", "--requests", "4", "--warmup", "1",
+       "--patients-per-doctor", "2", "--documents-per-patient", "1", "--output", str(output)],
+      cwd=BACKEND_DIR, capture_output=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout.decode() + result.stderr.decode()
+    results = json.loads(output.read_text())["results"]
+    assert set(results) == {scenario.name for scenario in SCENARIOS}
+    assert all(r["requests"] == 4 and r["errors"] == 0 for r in results.values())
+
+
+def _same_shape(concrete: str, template: str) -> bool:
+  a, b = concrete.strip("/").split("/"), template.strip("/").split("/")
+  return len(a) == len(b) and all(x == y or (x.startswith("{") and y.startswith("{")) for x, y in zip(a, b))
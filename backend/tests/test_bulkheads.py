@@ -0,0 +1,40 @@
+import threading
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import bulkheads
+from app.core.bulkheads import bulkhead
+
+app = FastAPI()
+
+def get_value():
+  return 41
+
+@app.get("/items/{item_id}")
+@bulkhead("db")
+def read_item(item_id: int, value: int = Depends(get_value)):
+  return {"item_id": item_id, "value": value + 1, "thread": threading.current_thread().name}
+
+@app.get("/pools")
+async def pools():
+  return bulkheads.snapshot()
+
+client = TestClient(app)
+
+
+class TestBulkheads:
+  def test_wrapped_route_keeps_parameters(self):
+    r = client.get("/items/7")
+    assert r.status_code == 200
+    assert r.json()["item_id"] == 7
+    assert r.json()["value"] == 42
+    assert r.json()["thread"] != threading.main_thread().name
+
+  def test_invalid_parameter_still_validated(self):
+    assert client.get("/items/abc").status_code == 422
+
+  def test_snapshot(self):
+    stats = client.get("/pools").json()
+    assert set(stats) == {"storage", "db", "cpu", "default"}
+    assert stats["storage"]["size"] == bulkheads.BULKHEAD_SIZES["storage"]
+    assert stats["db"]["busy"] == 0
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+from app.jobs.prune_change_log import prune
+from conftest import PATIENT_ID
+
+DOCUMENTS = f"/api/doctors/patients/{PATIENT_ID}/documents"
+
+
+def _upload(api, name="new.pdf"):
+  response = api.client.post(f"{DOCUMENTS}/upload", files={"file": (name, b"%PDF-1.4", "application/pdf")})
+  assert response.status_code == 200, response.text
+  return response.json()["document_id"]
+
+
+def _changes(api, url, since=None, **params):
+  if since is not None:
+    params["since"] = since
+  response = api.client.get(url, params=params)
+  assert response.status_code == 200, response.text
+  return response.json()
+
+
+class TestDocumentChanges:
+  def test_snapshot_then_deltas(self, api):
+    api.as_doctor()
+    snapshot = _changes(api, f"{DOCUMENTS}/changes")
+    assert snapshot["reset"] is True
+    assert len(snapshot["changes"]) == 3
+    assert all(c["op"] == "upsert" and c["document"]["document_id"] == c["document_id"] for c in snapshot["changes"])
+
+    idle = _changes(api, f"{DOCUMENTS}/changes", snapshot["cursor"])
+    assert idle == {"changes": [], "cursor": snapshot["cursor"], "has_more": False, "reset": False}
+
+    new_id = _upload(api)
+    existing_id = snapshot["changes"][0]["document_id"]
+    assert api.client.put(f"{DOCUMENTS}/{existing_id}", data={"description": "edited"}).status_code == 200
+    deleted_id = snapshot["changes"][1]["document_id"]
+    assert api.client.delete(f"{DOCUMENTS}/{deleted_id}").status_code == 200
+
+    delta = _changes(api, f"{DOCUMENTS}/changes", snapshot["cursor"])
+    assert [(c["op"], c["document_id"]) for c in delta["changes"]] == [
+      ("upsert", new_id), ("upsert", existing_id), ("delete", deleted_id),
+    ]
+    assert delta["changes"][1]["document"]["description"] == "edited"
+    assert delta["changes"][2]["document"] is None
+    assert delta["cursor"] > snapshot["cursor"]
+
+  def test_changes_collapse_to_latest(self, api):
+    api.as_doctor()
+    cursor = _changes(api, f"{DOCUMENTS}/changes")["cursor"]
+    document_id = _upload(api)
+    api.client.put(f"{DOCUMENTS}/{document_id}", data={"description": "one"})
+    api.client.delete(f"{DOCUMENTS}/{document_id}")
+    delta = _changes(api, f"{DOCUMENTS}/changes", cursor)
+    assert [(c["op"], c["document_id"]) for c in delta["changes"]] == [("delete", document_id)]
+
+  def test_paged(self, api):
+    api.as_doctor()
+    cursor = _changes(api, f"{DOCUMENTS}/changes")["cursor"]
+    uploaded = [_upload(api, f"{n}.pdf") for n in range(5)]
+    seen = []
+    while True:
+      page = _changes(api, f"{DOCUMENTS}/changes", cursor, limit=2)
+      seen.extend(c["document_id"] for c in page["changes"])
+      cursor = page["cursor"]
+      if not page["has_more"]:
+        break
+    assert seen == uploaded
+
+  def test_patient_sees_only_own_documents(self, api):
+    api.as_patient()
+    cursor = _changes(api, "/api/patients/documents/changes")["cursor"]
+    api.as_doctor()
+    document_id = _upload(api)
+    api.client.post("/api/doctors/patients/auth0|patient1/documents/upload",
+                    files={"file": ("other.pdf", b"%PDF-1.4", "application/pdf")})
+    api.as_patient()
+    delta = _changes(api, "/api/patients/documents/changes", cursor)
+    assert [c["document_id"] for c in delta["changes"]] == [document_id]
+
+  def test_other_doctors_patient_forbidden(self, api):
+    api.as_doctor("auth0|other-doctor")
+    assert api.client.get(f"{DOCUMENTS}/changes").status_code == 403
+
+  def test_expired_cursor(self, api):
+    api.as_doctor()
+    cursor = _changes(api, f"{DOCUMENTS}/changes")["cursor"]
+    _upload(api)
+    _upload(api)
+    assert prune(api.session_factory.kw["bind"], datetime.utcnow() + timedelta(days=1), out=lambda line: None) > 0
+    assert api.client.get(f"{DOCUMENTS}/changes", params={"since": cursor}).status_code == 410
+    assert api.client.get(f"{DOCUMENTS}/changes").status_code == 200
+
+
+class TestPatientChanges:
+  def test_panel_changes(self, api):
+    api.as_doctor()
+    snapshot = _changes(api, "/api/doctors/patients/changes")
+    assert snapshot["reset"] is True
+    assert sorted(c["patient_id"] for c in snapshot["changes"]) == ["auth0|patient0", "auth0|patient1", "auth0|patient2"]
+
+    assert api.client.put(f"/api/doctors/patients/{PATIENT_ID}", data={"phone": "555-0111"}).status_code == 200
+    assert api.client.delete("/api/doctors/patients/auth0|patient2").status_code == 200
+    delta = _changes(api, "/api/doctors/patients/changes", snapshot["cursor"])
+    assert [(c["op"], c["patient_id"]) for c in delta["changes"]] == [
+      ("upsert", PATIENT_ID), ("delete", "auth0|patient2"),
+    ]
+    assert delta["changes"][0]["patient"]["phone"] == "555-0111"
+
+    assert api.client.post("/api/doctors/add-patient", data={"patient_auth0_id": "auth0|patient2"}).status_code == 200
+    delta = _changes(api, "/api/doctors/patients/changes", delta["cursor"])
+    assert [(c["op"], c["patient_id"]) for c in delta["changes"]] == [("upsert", "auth0|patient2")]
+
+  def test_document_changes_not_in_panel(self, api):
+    api.as_doctor()
+    cursor = _changes(api, "/api/doctors/patients/changes")["cursor"]
+    _upload(api)
+    assert _changes(api, "/api/doctors/patients/changes", cursor)["changes"] == []
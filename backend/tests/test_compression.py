@@ -0,0 +1,58 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse, Response
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware
+
+BIG = [{"id": i, "name": "patient"} for i in range(200)]
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+@app.get("/big")
+def big():
+  return Response(content=str(BIG).encode(), media_type="application/json", headers={"ETag": '"v1"'})
+
+@app.get("/small")
+def small():
+  return {"ok": True}
+
+@app.get("/binary")
+def binary():
+  return Response(content=b"x" * 5000, media_type="application/pdf")
+
+@app.get("/stream")
+def stream():
+  return StreamingResponse(iter([b"a" * 1000, b"b" * 1000]), media_type="application/json")
+
+client = TestClient(app)
+
+
+class TestCompressionMiddleware:
+  def test_large_json_gzipped(self):
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"] == 'W/"v1"'
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert r.content == str(BIG).encode()
+
+  def test_not_accepted(self):
+    r = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+
+  def test_gzip_q0(self):
+    r = client.get("/big", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in r.headers
+
+  def test_below_threshold(self):
+    r = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+
+  def test_content_type_not_allowed(self):
+    r = client.get("/binary", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+
+  def test_streamed_response_untouched(self):
+    r = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    assert r.content == b"a" * 1000 + b"b" * 1000
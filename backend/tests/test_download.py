@@ -0,0 +1,53 @@
+import pytest
+from datetime import datetime, timezone
+
+from app.core.http_cache import etag_matches, http_date, not_modified_since
+from app.services.download import parse_range, RangeNotSatisfiable
+
+
+class TestParseRange:
+  def test_no_header(self):
+    assert parse_range(None, 100) is None
+
+  def test_closed_range(self):
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+
+  def test_open_range(self):
+    assert parse_range("bytes=90-", 100) == (90, 99)
+
+  def test_suffix_range(self):
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+
+  def test_end_clamped_to_size(self):
+    assert parse_range("bytes=50-1000", 100) == (50, 99)
+
+  def test_multi_range_served_whole(self):
+    assert parse_range("bytes=0-1,5-6", 100) is None
+
+  def test_invalid_syntax_ignored(self):
+    assert parse_range("bytes=abc", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=9-1", 100) is None
+
+  def test_unsatisfiable(self):
+    with pytest.raises(RangeNotSatisfiable):
+      parse_range("bytes=100-", 100)
+    with pytest.raises(RangeNotSatisfiable):
+      parse_range("bytes=-0", 100)
+
+
+class TestConditionals:
+  def test_etag_matches(self):
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', 'W/"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"x"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+  def test_not_modified_since(self):
+    modified = datetime(2025, 6, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+    assert not_modified_since(http_date(modified), modified)
+    assert not not_modified_since(http_date(datetime(2025, 5, 1, tzinfo=timezone.utc)), modified)
+    assert not not_modified_since("garbage", modified)
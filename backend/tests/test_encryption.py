@@ -0,0 +1,179 @@
+import base64
+import io
+import os
+import zipfile
+
+import pytest
+
+from app.services import encryption
+from app.services.encryption import DecryptionError, new_envelope, open_envelope, parse_master_keys
+from conftest import PATIENT_ID
+
+KEY_1 = os.urandom(32)
+KEY_2 = os.urandom(32)
+CHUNK = 16
+DOCUMENTS = f"/api/doctors/patients/{PATIENT_ID}/documents"
+
+
+@pytest.fixture
+def master_keys(monkeypatch):
+  keys = {"k1": KEY_1}
+  monkeypatch.setattr(encryption, "MASTER_KEYS", keys)
+  return keys
+
+
+def _seal(data, chunk_size=CHUNK, read_size=7):
+  envelope = new_envelope(chunk_size)
+  reader = envelope.encrypt(io.BytesIO(data))
+  pieces = []
+  while True:
+    piece = reader.read(read_size)
+    if not piece:
+      break
+    pieces.append(piece)
+  return envelope, b"".join(pieces)
+
+
+def _chunks(data, size=5):
+  return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _open(envelope, stored, size, start=0, end=None):
+  if start or end is not None:
+    first, last = envelope.stored_range(start, size - 1 if end is None else end)
+    stored = stored[first:last + 1]
+  return b"".join(envelope.decrypt(_chunks(stored), size, start, end))
+
+
+class TestFraming:
+  @pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 5 * CHUNK + 3])
+  def test_round_trip(self, master_keys, size):
+    data = os.urandom(size)
+    envelope, stored = _seal(data)
+    assert len(stored) == size + envelope.frames(size) * encryption.TAG_SIZE
+    assert envelope.plaintext_size(len(stored)) == size
+    assert _open(envelope, stored, size) == data
+
+  @pytest.mark.parametrize("threads", [1, 4])
+  def test_batches_larger_than_one_read(self, master_keys, monkeypatch, threads):
+    monkeypatch.setattr(encryption, "ENCRYPTION_THREADS", threads)
+    data = os.urandom(40 * CHUNK + 5)
+    envelope, stored = _seal(data, read_size=-1)
+    assert _open(envelope, stored, len(data)) == data
+
+  def test_every_range_reads_only_its_frames(self, master_keys):
+    data = os.urandom(3 * CHUNK + 5)
+    envelope, stored = _seal(data)
+    for start in range(len(data)):
+      for end in range(start, len(data)):
+        assert _open(envelope, stored, len(data), start, end) == data[start:end + 1]
+
+  def test_tampered_frame(self, master_keys):
+    data = os.urandom(3 * CHUNK)
+    envelope, stored = _seal(data)
+    tampered = bytearray(stored)
+    tampered[CHUNK + encryption.TAG_SIZE + 3] ^= 1
+    with pytest.raises(DecryptionError):
+      _open(envelope, bytes(tampered), len(data))
+
+  def test_truncated_at_a_frame_boundary(self, master_keys):
+    data = os.urandom(3 * CHUNK)
+    envelope, stored = _seal(data)
+    frame = CHUNK + encryption.TAG_SIZE
+    # two whole frames pass for a 2-frame object only if the last-frame flag is ignored
+    with pytest.raises(DecryptionError):
+      _open(envelope, stored[:2 * frame], 2 * CHUNK)
+
+  def test_reordered_frames(self, master_keys):
+    data = os.urandom(2 * CHUNK)
+    envelope, stored = _seal(data)
+    frame = CHUNK + encryption.TAG_SIZE
+    with pytest.raises(DecryptionError):
+      _open(envelope, stored[frame:] + stored[:frame], len(data))
+
+
+class TestEnvelope:
+  def test_metadata_round_trip(self, master_keys):
+    data = os.urandom(100)
+    envelope, stored = _seal(data)
+    opened = open_envelope(envelope.metadata())
+    assert opened.chunk_size == CHUNK
+    assert _open(opened, stored, len(data)) == data
+
+  def test_plain_objects_have_no_envelope(self):
+    assert open_envelope({}) is None
+    assert open_envelope(None) is None
+
+  def test_rotation_keeps_old_keys_readable(self, master_keys):
+    data = os.urandom(50)
+    envelope, stored = _seal(data)
+    master_keys.clear()
+    master_keys.update({"k2": KEY_2, "k1": KEY_1})
+    assert _open(open_envelope(envelope.metadata()), stored, len(data)) == data
+    assert new_envelope().key_id == "k2"
+
+  def test_unknown_or_wrong_master_key(self, master_keys):
+    metadata = new_envelope().metadata()
+    master_keys.clear()
+    with pytest.raises(DecryptionError):
+      open_envelope(metadata)
+    master_keys["k1"] = KEY_2
+    with pytest.raises(DecryptionError):
+      open_envelope(metadata)
+
+  def test_parse_master_keys(self):
+    encoded = base64.b64encode(KEY_1).decode()
+    assert parse_master_keys(f"a:{encoded}, b:{encoded}") == {"a": KEY_1, "b": KEY_1}
+    assert parse_master_keys("") == {}
+    with pytest.raises(ValueError):
+      parse_master_keys("a:c2hvcnQ=")
+    with pytest.raises(ValueError):
+      parse_master_keys(encoded)
+
+
+class TestEncryptedStorage:
+  @pytest.fixture
+  def uploaded(self, api, master_keys, monkeypatch):
+    monkeypatch.setattr(encryption, "ENCRYPTION_CHUNK_SIZE", 1024)
+    api.as_doctor()
+    data = os.urandom(5000)
+    response = api.client.post(f"{DOCUMENTS}/upload", files={"file": ("scan.pdf", data, "application/pdf")})
+    assert response.status_code == 200, response.text
+    return response.json(), data
+
+  def test_stored_encrypted(self, api, uploaded):
+    document, data = uploaded
+    stored = api.storage.objects[document["file_path"]]
+    assert data not in stored and len(stored) == len(data) + 5 * encryption.TAG_SIZE
+    assert api.storage.metadata[document["file_path"]][encryption.META_KEY_ID] == "k1"
+
+  def test_download_decrypts(self, api, uploaded):
+    document, data = uploaded
+    url = f"{DOCUMENTS}/{document['document_id']}/download"
+    response = api.client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(data))
+    assert response.content == data
+
+    ranged = api.client.get(url, headers={"Range": "bytes=1000-3100"})
+    assert ranged.status_code == 206
+    assert ranged.headers["content-range"] == f"bytes 1000-3100/{len(data)}"
+    assert ranged.content == data[1000:3101]
+
+  def test_preview_goes_through_the_api(self, api, uploaded):
+    document, _ = uploaded
+    response = api.client.get(f"{DOCUMENTS}/{document['document_id']}/preview")
+    assert response.json() == {"url": f"{DOCUMENTS}/{document['document_id']}/download", "direct": False}
+
+  def test_export_decrypts(self, api, uploaded):
+    document, data = uploaded
+    response = api.client.get(f"{DOCUMENTS}/export", params={"document_id": [document["document_id"]]})
+    zf = zipfile.ZipFile(io.BytesIO(response.content))
+    assert zf.read(f"documents/{document['document_id']}-scan.pdf") == data
+
+  def test_plain_objects_still_readable(self, api, master_keys):
+    api.as_doctor()
+    document_id = api.first_document_id()
+    response = api.client.get(f"{DOCUMENTS}/{document_id}/download")
+    assert response.status_code == 200
+    assert response.content == b"%PDF-1.4 test"
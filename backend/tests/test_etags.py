@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.querycount import capture_queries
+from app.models.models import Document, User
+from conftest import PATIENT_ID
+
+PATIENTS = "/api/doctors/patients"
+DOCUMENTS = f"/api/doctors/patients/{PATIENT_ID}/documents"
+
+
+@pytest.fixture
+def backdated(api):
+  # well in the past, so a write landing in the same second as the first read still moves max(updated_at)
+  db = api.session_factory()
+  try:
+    db.execute(User.__table__.update().values(updated_at=datetime(2020, 1, 1)))
+    db.execute(Document.__table__.update().values(updated_at=datetime(2020, 1, 1)))
+    db.commit()
+  finally:
+    db.close()
+  return api
+
+
+def _etag(api, url):
+  response = api.client.get(url)
+  assert response.status_code == 200, response.text
+  return response.headers["etag"]
+
+
+class TestNotModified:
+  @pytest.mark.parametrize("url", [PATIENTS, DOCUMENTS, "/api/doctors/profile", f"{PATIENTS}/{PATIENT_ID}"])
+  def test_matching_if_none_match(self, api, url):
+    api.as_doctor()
+    response = api.client.get(url)
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    again = api.client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+  def test_stale_if_none_match(self, api):
+    api.as_doctor()
+    response = api.client.get(DOCUMENTS, headers={"If-None-Match": 'W/"stale"'})
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+  def test_list_query_skipped(self, api):
+    api.as_doctor()
+    etag = _etag(api, DOCUMENTS)
+    with capture_queries() as log:
+      response = api.client.get(DOCUMENTS, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    # only the count/max(updated_at) version query touches documents
+    documents = [s for s in log.statements if "FROM documents" in s]
+    assert len(documents) == 1 and "count(" in documents[0], log.report()
+
+
+class TestDocumentsETag:
+  def test_insert(self, backdated):
+    api = backdated
+    api.as_doctor()
+    before = _etag(api, DOCUMENTS)
+    response = api.client.post(f"{DOCUMENTS}/upload", files={"file": ("new.pdf", b"%PDF-1.4 new", "application/pdf")})
+    assert response.status_code == 200, response.text
+    after = _etag(api, DOCUMENTS)
+    assert after != before
+    assert api.client.get(DOCUMENTS, headers={"If-None-Match": before}).status_code == 200
+
+  def test_update(self, backdated):
+    api = backdated
+    api.as_doctor()
+    before = _etag(api, DOCUMENTS)
+    document_id = api.first_document_id()
+    response = api.client.put(f"{DOCUMENTS}/{document_id}", data={"description": "follow-up"})
+    assert response.status_code == 200, response.text
+    assert _etag(api, DOCUMENTS) != before
+
+  def test_delete(self, backdated):
+    api = backdated
+    api.as_doctor()
+    before = _etag(api, DOCUMENTS)
+    response = api.client.delete(f"{DOCUMENTS}/{api.first_document_id()}")
+    assert response.status_code == 200, response.text
+    assert _etag(api, DOCUMENTS) != before
+
+  def test_other_patients_documents_do_not_change_it(self, backdated):
+    api = backdated
+    api.as_doctor()
+    before = _etag(api, DOCUMENTS)
+    other = f"{PATIENTS}/auth0|patient1/documents"
+    api.client.delete(f"{other}/{api.first_document_id('auth0|patient1')}")
+    assert _etag(api, DOCUMENTS) == before
+
+
+class TestPatientsETag:
+  def test_unassign_and_reassign(self, backdated):
+    api = backdated
+    api.as_doctor()
+    assigned = _etag(api, PATIENTS)
+    assert api.client.delete(f"{PATIENTS}/auth0|patient1").status_code == 200
+    unassigned = _etag(api, PATIENTS)
+    assert unassigned != assigned
+
+    # same patients as before, but max(updated_at) has moved on
+    response = api.client.post("/api/doctors/add-patient", data={"patient_auth0_id": "auth0|patient1"})
+    assert response.status_code == 200, response.text
+    reassigned = _etag(api, PATIENTS)
+    assert reassigned not in (assigned, unassigned)
+
+  def test_patient_update(self, backdated):
+    api = backdated
+    api.as_doctor()
+    before = _etag(api, PATIENTS)
+    response = api.client.put(f"{PATIENTS}/{PATIENT_ID}", data={"phone": "555-0199"})
+    assert response.status_code == 200, response.text
+    assert _etag(api, PATIENTS) != before
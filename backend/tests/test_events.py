@@ -0,0 +1,162 @@
+import asyncio
+import json
+import threading
+import time
+
+from app.services import events
+from app.services.events import EventHub
+from conftest import DOCTOR_ID, PATIENT_ID
+
+
+def _document(patient_id, op="upsert", document_id=1):
+  return {"entity": "document", "op": op, "patient_id": patient_id, "doctor_id": None, "document_id": document_id}
+
+
+def _assignment(patient_id, doctor_id, op="upsert"):
+  return {"entity": "patient", "op": op, "patient_id": patient_id, "doctor_id": doctor_id, "document_id": None}
+
+
+def _drain(subscription):
+  items = []
+  while not subscription.queue.empty():
+    items.append(subscription.queue.get_nowait())
+  return items
+
+
+def _parse(body):
+  parsed = []
+  for block in body.strip().split("\n\n"):
+    fields = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith((":", "retry")))
+    if fields:
+      parsed.append((fields["event"], json.loads(fields["data"])))
+  return parsed
+
+
+class TestEventHub:
+  def test_routes_document_events(self):
+    async def scenario():
+      hub = EventHub()
+      patient = hub.subscribe(PATIENT_ID, "patient")
+      doctor = hub.subscribe(DOCTOR_ID, "doctor", [PATIENT_ID])
+      other = hub.subscribe("auth0|patient1", "patient")
+      hub.dispatch(_document(PATIENT_ID))
+      return [_drain(s) for s in (patient, doctor, other)]
+
+    patient, doctor, other = asyncio.run(scenario())
+    expected = [("document", {"op": "upsert", "patient_id": PATIENT_ID, "document_id": 1})]
+    assert patient == expected
+    assert doctor == expected
+    assert other == []
+
+  def test_assignment_changes_what_a_doctor_watches(self):
+    async def scenario():
+      hub = EventHub()
+      doctor = hub.subscribe(DOCTOR_ID, "doctor")
+      hub.dispatch(_document("auth0|new"))
+      before = _drain(doctor)
+      hub.dispatch(_assignment("auth0|new", DOCTOR_ID))
+      hub.dispatch(_document("auth0|new"))
+      assigned = _drain(doctor)
+      hub.dispatch(_assignment("auth0|new", DOCTOR_ID, "delete"))
+      hub.dispatch(_document("auth0|new"))
+      unassigned = _drain(doctor)
+      hub.unsubscribe(doctor)
+      return before, assigned, unassigned, hub._watchers
+
+    before, assigned, unassigned, watchers = asyncio.run(scenario())
+    assert before == []
+    assert [name for name, _ in assigned] == ["patient", "document"]
+    assert [name for name, _ in unassigned] == ["patient"]
+    assert watchers == {}
+
+  def test_overflow_resets_stream(self):
+    async def scenario():
+      hub = EventHub(buffer_size=2)
+      subscription = hub.subscribe(PATIENT_ID, "patient")
+      for n in range(3):
+        hub.dispatch(_document(PATIENT_ID, document_id=n))
+      hub.dispatch(_document(PATIENT_ID, document_id=9))
+      return _drain(subscription)
+
+    assert asyncio.run(scenario()) == [("reset", {})]
+
+  def test_stream_limits(self):
+    async def scenario():
+      hub = EventHub(max_streams=3, max_streams_per_user=2)
+      opened = [hub.subscribe(PATIENT_ID, "patient") for _ in range(3)]
+      opened.append(hub.subscribe("auth0|patient1", "patient"))
+      opened.append(hub.subscribe("auth0|patient2", "patient"))
+      return [s is not None for s in opened]
+
+    assert asyncio.run(scenario()) == [True, True, False, True, False]
+
+  def test_stream_heartbeat_and_expiry(self, monkeypatch):
+    monkeypatch.setattr(events, "hub", EventHub())
+
+    async def scenario():
+      chunks = []
+      async for chunk in events.event_stream(PATIENT_ID, "patient", heartbeat=0.05, max_seconds=0.12):
+        chunks.append(chunk)
+      return chunks, events.hub._count
+
+    chunks, open_streams = asyncio.run(scenario())
+    assert chunks[0].startswith("retry: ")
+    assert _parse("".join(chunks)) == [("ready", {})]
+    assert chunks.count(": heartbeat\n\n") == 2
+    assert open_streams == 0
+
+  def test_stop_ends_streams(self, monkeypatch):
+    monkeypatch.setattr(events, "hub", EventHub())
+
+    async def scenario():
+      stream = events.event_stream(PATIENT_ID, "patient", heartbeat=10, max_seconds=10)
+      await stream.__anext__()
+      events.hub.stop()
+      return [chunk async for chunk in stream]
+
+    assert asyncio.run(scenario()) == []
+
+
+class TestEventStream:
+  def test_upload_reaches_patient_stream(self, api, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_MAX_STREAM_SECONDS", 1.0)
+    api.as_patient()
+    result = {}
+    listener = threading.Thread(target=lambda: result.update(response=api.client.get("/api/events/stream")))
+    listener.start()
+    deadline = time.monotonic() + 5
+    while events.hub._count == 0 and time.monotonic() < deadline:
+      time.sleep(0.01)
+    assert events.hub._count == 1
+
+    api.as_doctor()
+    response = api.client.post(f"/api/doctors/patients/{PATIENT_ID}/documents/upload",
+                               files={"file": ("a.pdf", b"%PDF-1.4", "application/pdf")})
+    document_id = response.json()["document_id"]
+    listener.join(5)
+
+    stream = result["response"]
+    assert stream.status_code == 200
+    assert stream.headers["content-type"].startswith("text/event-stream")
+    assert _parse(stream.text) == [
+      ("ready", {}),
+      ("document", {"op": "upsert", "patient_id": PATIENT_ID, "document_id": document_id}),
+    ]
+
+  def test_rolled_back_changes_are_not_published(self, api):
+    from app.models.models import Document
+
+    published = []
+    events.hub.publish = published.append
+    db = api.session_factory()
+    db.add(Document(filename="x.pdf", file_path="documents/x.pdf", patient_id=PATIENT_ID, uploaded_by_id=DOCTOR_ID))
+    db.flush()
+    db.rollback()
+    db.close()
+    assert published == []
+
+  def test_stream_limit_returns_503(self, api, monkeypatch):
+    monkeypatch.setattr(events.hub, "max_streams", 0)
+    api.as_patient()
+    response = api.client.get("/api/events/stream")
+    assert response.status_code == 503
@@ -0,0 +1,105 @@
+import hashlib
+import io
+import json
+import os
+import zipfile
+
+from app.models.models import Document
+from app.services import archive, audit
+from app.services.archive import stream_archive
+from conftest import PATIENT_ID
+
+EXPORT = f"/api/doctors/patients/{PATIENT_ID}/documents/export"
+
+
+def _archive(response):
+  assert response.status_code == 200, response.text
+  assert response.headers["content-type"] == "application/zip"
+  return zipfile.ZipFile(io.BytesIO(response.content))
+
+
+def _manifest(zf):
+  return json.loads(zf.read("manifest.json"))
+
+
+def _document_ids(api, patient_id=PATIENT_ID):
+  api.as_doctor()
+  response = api.client.get(f"/api/doctors/patients/{patient_id}/documents")
+  return sorted(d["document_id"] for d in response.json())
+
+
+class TestDocumentExport:
+  def test_exports_every_document_with_manifest(self, api):
+    ids = _document_ids(api)
+    zf = _archive(api.client.get(EXPORT))
+    assert zf.testzip() is None
+    manifest = _manifest(zf)
+    assert manifest["patient_id"] == PATIENT_ID
+    assert [d["document_id"] for d in manifest["documents"]] == ids
+    for entry in manifest["documents"]:
+      assert entry["status"] == "included"
+      data = zf.read(entry["path"])
+      assert len(data) == entry["size"]
+      assert hashlib.sha256(data).hexdigest() == entry["sha256"]
+      assert "file_path" not in entry
+
+  def test_entries_written_as_zip64(self, api):
+    # an entry can pass 4 GiB before the stream knows it, so ZIP64 is chosen up front
+    api.as_doctor()
+    zf = _archive(api.client.get(EXPORT))
+    documents = [info for info in zf.infolist() if info.filename.startswith("documents/")]
+    assert documents and all(info.extract_version >= zipfile.ZIP64_VERSION for info in documents)
+
+  def test_selected_documents(self, api):
+    ids = _document_ids(api)
+    zf = _archive(api.client.get(EXPORT, params={"document_id": [ids[0], ids[2]]}))
+    assert [d["document_id"] for d in _manifest(zf)["documents"]] == [ids[0], ids[2]]
+    assert len(zf.namelist()) == 3
+
+  def test_selection_must_belong_to_patient(self, api):
+    other = _document_ids(api, "auth0|patient1")
+    assert api.client.get(EXPORT, params={"document_id": [other[0]]}).status_code == 404
+
+  def test_other_doctors_patient_forbidden(self, api):
+    api.as_doctor("auth0|other-doctor")
+    assert api.client.get(EXPORT).status_code == 403
+
+  def test_missing_object_listed_in_manifest(self, api):
+    ids = _document_ids(api)
+    db = api.session_factory()
+    try:
+      path = db.get(Document, (ids[1], PATIENT_ID)).file_path
+    finally:
+      db.close()
+    del api.storage.objects[path]
+    manifest = _manifest(_archive(api.client.get(EXPORT)))
+    assert [d["status"] for d in manifest["documents"]] == ["included", "missing", "included"]
+
+  def test_patient_exports_own_documents(self, api):
+    ids = _document_ids(api)
+    api.as_patient()
+    zf = _archive(api.client.get("/api/patients/documents/export"))
+    assert [d["document_id"] for d in _manifest(zf)["documents"]] == ids
+
+  def test_every_exported_document_audited(self, api):
+    ids = _document_ids(api)
+    api.client.get(EXPORT)
+    exported = [e["document_id"] for e in audit.buffer.pending if e["action"] == audit.DOCUMENT_EXPORT]
+    assert sorted(exported) == ids
+
+
+class TestStreamArchive:
+  def test_written_as_it_is_read(self, api, monkeypatch):
+    monkeypatch.setattr(archive, "DOWNLOAD_CHUNK_SIZE", 16 * 1024)
+    content = os.urandom(1024 * 1024)
+    api.storage.put("documents/big.bin", content)
+    entry = {"document_id": 1, "filename": "../big.bin", "file_path": "documents/big.bin",
+             "content_type": None, "description": None, "created_at": None}
+
+    pieces = list(stream_archive(PATIENT_ID, [entry]))
+    # incompressible data: one piece per storage chunk, none of them the whole file
+    assert len(pieces) >= len(content) // (16 * 1024)
+    assert max(map(len, pieces)) < 64 * 1024
+    zf = zipfile.ZipFile(io.BytesIO(b"".join(pieces)))
+    assert zf.namelist() == ["documents/1-_big.bin", "manifest.json"]
+    assert zf.read("documents/1-_big.bin") == content
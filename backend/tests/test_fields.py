@@ -0,0 +1,66 @@
+from app.core.querycount import capture_queries
+from conftest import PATIENT_ID
+
+DOCUMENTS = f"/api/doctors/patients/{PATIENT_ID}/documents"
+
+
+def _documents_selects(log):
+  return [s for s in log.statements if s.startswith("SELECT") and "FROM documents" in s and "count(" not in s]
+
+
+class TestSparseFieldsets:
+  def test_list_returns_and_selects_only_the_fields(self, api):
+    api.as_doctor()
+    with capture_queries() as log:
+      response = api.client.get(DOCUMENTS, params={"fields": "document_id,filename"})
+    assert response.status_code == 200, response.text
+    assert [set(d) for d in response.json()] == [{"document_id", "filename"}] * 3
+    [select] = _documents_selects(log)
+    assert "documents.filename" in select
+    assert "documents.description" not in select and "documents.file_path" not in select
+
+  def test_without_fields_everything_is_returned(self, api):
+    api.as_doctor()
+    document = api.client.get(DOCUMENTS).json()[0]
+    assert {"document_id", "filename", "description", "content_type", "uploaded_by_id"} <= set(document)
+
+  def test_detail(self, api):
+    api.as_patient()
+    document_id = api.first_document_id()
+    response = api.client.get(f"/api/patients/documents/{document_id}", params={"fields": "filename"})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"filename": "0.pdf"}
+
+  def test_computed_field(self, api):
+    api.as_doctor()
+    url = f"/api/doctors/patients/{PATIENT_ID}"
+    assert api.client.get(url, params={"fields": "documents_count"}).json() == {"documents_count": 3}
+    assert api.client.get(url, params={"fields": "first_name"}).json() == {"first_name": "Pat"}
+
+  def test_patient_lists_and_profiles(self, api):
+    api.as_doctor()
+    patients = api.client.get("/api/doctors/patients", params={"fields": "patient_id, last_name"}).json()
+    assert sorted(p["last_name"] for p in patients) == ["P0", "P1", "P2"]
+    assert set(patients[0]) == {"patient_id", "last_name"}
+    assert api.client.get("/api/doctors/profile", params={"fields": "doctor_id"}).json() == {"doctor_id": api.principal["user_id"]}
+    record = api.client.get(f"/api/patients/{PATIENT_ID}", params={"fields": "email"}).json()
+    assert record == {"email": "patient0@example.com"}
+
+    api.as_patient()
+    assert api.client.get("/api/patients/profile", params={"fields": "phone"}).json() == {"phone": "555-0100"}
+    assert api.client.get("/api/patients/doctor", params={"fields": "first_name"}).json() == {"first_name": "Doc"}
+
+  def test_unknown_fields_rejected(self, api):
+    api.as_doctor()
+    response = api.client.get(DOCUMENTS, params={"fields": "filename,file_path"})
+    assert response.status_code == 400
+    assert "file_path" in response.json()["detail"]
+    assert api.client.get(DOCUMENTS, params={"fields": " , "}).status_code == 400
+
+  def test_fieldsets_have_their_own_etags(self, api):
+    api.as_doctor()
+    full = api.client.get(DOCUMENTS).headers["etag"]
+    sparse = api.client.get(DOCUMENTS, params={"fields": "filename"})
+    assert sparse.headers["etag"] != full
+    again = api.client.get(DOCUMENTS, params={"fields": "filename"}, headers={"If-None-Match": sparse.headers["etag"]})
+    assert again.status_code == 304
@@ -0,0 +1,212 @@
+import hashlib
+from datetime import datetime
+import io
+
+import pytest
+
+from app.jobs.backfill_file_info import backfill
+from app.models.models import Document
+from app.services.file_info import FileInspector, inspect_chunks, sniff_type
+from conftest import PATIENT_ID
+
+DOCUMENTS = f"/api/doctors/patients/{PATIENT_ID}/documents"
+
+
+def _pdf(pages):
+  objects = [b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj"]
+  kids = b" ".join(b"%d 0 R" % (3 + n) for n in range(pages))
+  objects.append(b"2 0 obj << /Type /Pages /Kids [" + kids + b"] /Count %d >> endobj" % pages)
+  for n in range(pages):
+    objects.append(b"%d 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj" % (3 + n))
+    objects.append(b"stream\n" + bytes(range(256)) * 4 + b"\nendstream")
+  return b"%PDF-1.7\n" + b"\n".join(objects) + b"\n%%EOF\n"
+
+
+def _chunks(data, size):
+  return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _documents(api):
+  db = api.session_factory()
+  try:
+    return db.query(Document).filter_by(patient_id=PATIENT_ID).order_by(Document.id).all()
+  finally:
+    db.close()
+
+
+class TestSniffType:
+  @pytest.mark.parametrize("head, expected", [
+    (b"%PDF-1.4\n", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n\x00\x00", "image/png"),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+    (b"\x00" * 128 + b"DICM\x02\x00", "application/dicom"),
+    (b"\x00\x00\x00\x18ftypheic", "image/heic"),
+    (b"PK\x03\x04\x14\x00", "application/zip"),
+    ("Blood pressure 120/80 – normal".encode(), "text/plain"),
+    (b"\x00\x01\x02\x03", "application/octet-stream"),
+    (b"", "application/octet-stream"),
+  ])
+  def test_magic_bytes(self, head, expected):
+    assert sniff_type(head) == expected
+
+  def test_text_cut_inside_a_character(self):
+    head = ("é" * 300).encode()[:511]
+    assert sniff_type(head) == "text/plain"
+
+
+class TestInspectChunks:
+  @pytest.mark.parametrize("chunk_size", [1, 7, 64, 1000, 10 ** 6])
+  def test_one_pass_over_any_chunking(self, chunk_size):
+    data = _pdf(12)
+    info = inspect_chunks(_chunks(data, chunk_size))
+    assert info == {
+      "size_bytes": len(data),
+      "sha256": hashlib.sha256(data).hexdigest(),
+      "detected_content_type": "application/pdf",
+      "page_count": 12,
+    }
+
+  @pytest.mark.parametrize("with_count", [True, False])
+  def test_same_count_at_every_split_offset(self, with_count):
+    data = _pdf(2)
+    if not with_count:
+      data = data.replace(b" /Count 2", b"")
+    assert inspect_chunks([data])["page_count"] == 2
+    for offset in range(1, len(data)):
+      assert inspect_chunks([data[:offset], data[offset:]])["page_count"] == 2, offset
+
+  def test_pages_node_split_after_page(self):
+    # "/Type /Page" + "s": a page tree node, not a leaf page
+    data = b"%PDF-1.4\n" + b" " * 600 + b"<< /Type /Page /Parent 2 0 R >> << /Type /Page"
+    assert inspect_chunks([data, b"s /Kids [] >>"])["page_count"] == 1
+
+  def test_page_objects_counted_without_a_page_tree_count(self):
+    data = _pdf(3).replace(b" /Count 3", b"")
+    assert inspect_chunks(_chunks(data, 50))["page_count"] == 3
+
+  def test_no_page_count_outside_pdfs(self):
+    assert inspect_chunks([b"/Type /Page /Type /Page"])["page_count"] is None
+
+  def test_pdf_without_visible_pages(self):
+    # page objects hidden in compressed object streams
+    assert inspect_chunks([b"%PDF-1.5\nstream\nx\x9c\x03\x00endstream"])["page_count"] is None
+
+  def test_inspector_passes_reads_through(self):
+    data = _pdf(2)
+    inspector = FileInspector(io.BytesIO(data))
+    read = b"".join(iter(lambda: inspector.read(100), b""))
+    assert read == data
+    assert not inspector.seekable()
+    assert inspector.result() == inspect_chunks([data])
+
+
+class TestUploadRecordsFileInfo:
+  def test_upload(self, api):
+    api.as_doctor()
+    data = _pdf(4)
+    response = api.client.post(f"{DOCUMENTS}/upload", files={"file": ("chart.bin", data, "application/octet-stream")})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["size_bytes"] == len(data)
+    assert body["sha256"] == hashlib.sha256(data).hexdigest()
+    assert body["detected_content_type"] == "application/pdf"
+    assert body["content_type"] == "application/octet-stream"
+    assert body["page_count"] == 4
+
+    listed = {d["document_id"]: d for d in api.client.get(DOCUMENTS).json()}
+    assert listed[body["document_id"]]["sha256"] == body["sha256"]
+
+  def test_batch_upload(self, api):
+    api.as_doctor()
+    files = [("files", ("a.pdf", _pdf(1), "application/pdf")), ("files", ("b.png", b"\x89PNG\r\n\x1a\nxx", "image/png"))]
+    body = api.client.post(f"{DOCUMENTS}/batch-upload", files=files).json()
+    documents = [r["document"] for r in body["results"]]
+    assert [(d["detected_content_type"], d["page_count"]) for d in documents] == [
+      ("application/pdf", 1), ("image/png", None),
+    ]
+    assert documents[1]["size_bytes"] == 10
+
+  def test_replacing_the_file_updates_it(self, api):
+    api.as_doctor()
+    document_id = api.first_document_id()
+    response = api.client.put(f"{DOCUMENTS}/{document_id}", files={"file": ("scan.pdf", _pdf(2), "application/pdf")})
+    assert response.status_code == 200, response.text
+    assert response.json()["page_count"] == 2
+
+  def test_encrypted_upload_inspects_the_plaintext(self, api, monkeypatch):
+    from app.services import encryption
+    monkeypatch.setattr(encryption, "MASTER_KEYS", {"k1": b"k" * 32})
+    api.as_doctor()
+    data = _pdf(3)
+    body = api.client.post(f"{DOCUMENTS}/upload", files={"file": ("chart.pdf", data, "application/pdf")}).json()
+    assert body["sha256"] == hashlib.sha256(data).hexdigest()
+    assert body["size_bytes"] == len(data)
+
+
+class TestBackfill:
+  def test_fills_documents_in_batches(self, api):
+    missing = _documents(api)[0]
+    del api.storage.objects[missing.file_path]
+    db = api.session_factory()
+    try:
+      lines = []
+      stats = backfill(db, batch_size=2, concurrency=2, out=lines.append)
+    finally:
+      db.close()
+
+    db = api.session_factory()
+    try:
+      total = db.query(Document).count()
+    finally:
+      db.close()
+    assert stats == {"updated": total - 1, "failed": 1}
+    documents = _documents(api)
+    assert any(f"document {missing.id}:" in line for line in lines)
+    for document in documents:
+      if document.id == missing.id:
+        assert document.sha256 is None
+        continue
+      data = api.storage.objects[document.file_path]
+      assert document.sha256 == hashlib.sha256(data).hexdigest()
+      assert document.size_bytes == len(data)
+      assert document.detected_content_type == "application/pdf"
+
+  def test_rerun_skips_filled_documents(self, api):
+    db = api.session_factory()
+    try:
+      first = backfill(db, out=lambda line: None)
+      second = backfill(db, out=lambda line: None)
+    finally:
+      db.close()
+    assert first["updated"] > 0
+    assert second == {"updated": 0, "failed": 0}
+
+  def test_visible_to_change_feeds_and_etags(self, api):
+    api.as_doctor()
+    db = api.session_factory()
+    try:
+      # well in the past, so the bump to now() shows even within the same second
+      db.execute(Document.__table__.update().values(updated_at=datetime(2020, 1, 1)))
+      db.commit()
+    finally:
+      db.close()
+    etag = api.client.get(DOCUMENTS).headers["etag"]
+    cursor = api.client.get(f"{DOCUMENTS}/changes").json()["cursor"]
+
+    db = api.session_factory()
+    try:
+      assert backfill(db, out=lambda line: None)["updated"] > 0
+    finally:
+      db.close()
+
+    response = api.client.get(DOCUMENTS, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    delta = api.client.get(f"{DOCUMENTS}/changes", params={"since": cursor}).json()
+    paths = {document.id: document.file_path for document in _documents(api)}
+    assert sorted(c["document_id"] for c in delta["changes"]) == sorted(paths)
+    for change in delta["changes"]:
+      assert change["op"] == "upsert"
+      data = api.storage.objects[paths[change["document_id"]]]
+      assert change["document"]["sha256"] == hashlib.sha256(data).hexdigest()
+      assert change["document"]["size_bytes"] == len(data)
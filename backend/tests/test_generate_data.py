@@ -0,0 +1,83 @@
+import random
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+
+from app.db import Base
+from app.jobs.generate_data import ObjectWriter, ZipfSampler, csv_batch, generate, shuffled_index
+from app.models.models import User, Document
+
+
+def _engine(tmp_path, name="data.db"):
+  engine = create_engine(f"sqlite:///{tmp_path / name}")
+  Base.metadata.create_all(engine)
+  return engine
+
+
+class TestGenerateData:
+  def test_csv_batch_nulls_and_timestamps(self):
+    data = csv_batch([("a", None, datetime(2025, 1, 2, 3, 4, 5), 'say "hi"')])
+    assert data == 'a,,2025-01-02 03:04:05,"say ""hi"""\n'
+
+  def test_zipf_sampler_skewed(self):
+    rng = random.Random(1)
+    sample = ZipfSampler(100, 1.0)
+    counts = Counter(sample(rng) for _ in range(50000))
+    assert set(counts) <= set(range(100))
+    # P(i) ~ 1 / (i + 1): index 0 about twice as likely as 1, ten times as likely as 9
+    assert 1.8 < counts[0] / counts[1] < 2.2
+    assert 8 < counts[0] / counts[9] < 12
+
+  def test_zipf_sampler_edges(self):
+    rng = random.Random(1)
+    assert {ZipfSampler(1, 0.8)(rng) for _ in range(100)} == {0}
+    # skew 0 is uniform
+    counts = Counter(ZipfSampler(4, 0.0)(rng) for _ in range(20000))
+    assert sorted(counts) == [0, 1, 2, 3]
+    assert max(counts.values()) / min(counts.values()) < 1.1
+
+  def test_shuffled_index_is_a_permutation(self):
+    for n in (1, 2, 10, 97, 1000):
+      index = shuffled_index(random.Random(n), n)
+      assert sorted(index(i) for i in range(n)) == list(range(n))
+
+  def test_generate(self, tmp_path):
+    engine = _engine(tmp_path)
+    objects = ObjectWriter(storage_dir=str(tmp_path / "objects"), size=64)
+    stats = generate(engine, doctors=5, patients=200, documents=1000, unassigned=0.2, batch_size=64, seed=7,
+                     objects=objects, out=lambda line: None)
+    assert stats == {"doctors": 5, "patients": 200, "documents": 1000}
+
+    with engine.connect() as connection:
+      users = {row.auth0_user_id: row for row in connection.execute(select(User.__table__))}
+      documents = connection.execute(select(Document.__table__)).all()
+    doctors = [u for u in users.values() if u.role == "doctor"]
+    patients = [u for u in users.values() if u.role == "patient"]
+    assert all(d.doctor_id is None for d in doctors)
+    unassigned = sum(1 for p in patients if p.doctor_id is None)
+    assert 20 <= unassigned <= 60
+    assert len({u.email for u in users.values()}) == len(users)
+
+    for document in documents:
+      owner = users[document.patient_id]
+      assert owner.role == "patient"
+      assert users[document.uploaded_by_id].role == "doctor"
+      if owner.doctor_id:
+        assert document.uploaded_by_id == owner.doctor_id
+      assert (tmp_path / "objects" / document.file_path).stat().st_size == 64
+
+    # skewed: the busiest patient has far more than the average of 5 documents
+    per_patient = {}
+    for document in documents:
+      per_patient[document.patient_id] = per_patient.get(document.patient_id, 0) + 1
+    assert max(per_patient.values()) > 25
+
+  def test_reproducible_with_seed(self, tmp_path):
+    paths = []
+    for name in ("a.db", "b.db"):
+      engine = _engine(tmp_path, name)
+      generate(engine, doctors=2, patients=20, documents=50, seed=3, out=lambda line: None)
+      with engine.connect() as connection:
+        paths.append(connection.execute(select(Document.file_path).order_by(Document.id)).scalars().all())
+    assert paths[0] == paths[1]
@@ -0,0 +1,121 @@
+import os
+import subprocess
+import sys
+import time
+import anyio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.api.ops import router as ops_router
+from app.core import bulkheads, lifespan, security
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+app = FastAPI()
+app.include_router(ops_router)
+
+client = TestClient(app)
+
+def ok():
+  pass
+
+def broken():
+  raise RuntimeError("connection refused")
+
+def hung():
+  time.sleep(5)
+
+
+class TestImport:
+  def test_import_needs_no_configuration(self):
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "AUTH0_DOMAIN")}
+    code = (
+      "import app.app, app.db, app.core.security as s; "
+      "assert app.db.engine is None and s._jwks is None"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, timeout=60)
+    assert result.returncode == 0, result.stderr.decode()
+
+
+class TestProbes:
+  def test_healthz(self):
+    r = client.get("/healthz")
+    assert r.status_code == 200
+    assert r.json() == {"status": "ok"}
+
+  def test_ready(self, monkeypatch):
+    monkeypatch.setattr(lifespan, "READINESS_CHECKS", {"database": ok, "storage": ok})
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "ready"
+    assert set(body["checks"]) == {"database", "storage"}
+    assert body["checks"]["database"]["ok"] is True
+    assert body["checks"]["database"]["latency_ms"] >= 0
+
+  def test_failing_dependency(self, monkeypatch):
+    monkeypatch.setattr(lifespan, "READINESS_CHECKS", {"database": ok, "storage": broken})
+    r = client.get("/readyz")
+    assert r.status_code == 503
+    checks = r.json()["checks"]
+    assert checks["database"]["ok"] is True
+    assert checks["storage"] == {"ok": False, "error": "RuntimeError", "latency_ms": checks["storage"]["latency_ms"]}
+
+  def test_hung_dependency_times_out(self, monkeypatch):
+    monkeypatch.setattr(lifespan, "READINESS_CHECKS", {"database": hung})
+    monkeypatch.setattr(lifespan, "READINESS_TIMEOUT", 0.1)
+    start = time.perf_counter()
+    r = client.get("/readyz")
+    assert time.perf_counter() - start < 2
+    assert r.status_code == 503
+    assert "timed out" in r.json()["checks"]["database"]["error"]
+
+
+class TestSigningKeys:
+  @pytest.fixture(autouse=True)
+  def keys(self, monkeypatch):
+    self.fetches = 0
+
+    def fetch():
+      self.fetches += 1
+      return {"keys": [{"kid": "a"}, {"kid": "b"}][:self.fetches]}
+
+    monkeypatch.setattr(security, "fetch_jwks", fetch)
+    monkeypatch.setattr(security, "_jwks", None)
+    monkeypatch.setattr(security, "_jwks_fetched_at", 0.0)
+
+  def test_fetched_on_first_use(self):
+    assert security.get_signing_key("a") == {"kid": "a"}
+    assert security.get_signing_key("a") == {"kid": "a"}
+    assert self.fetches == 1
+
+  def test_unknown_kid_refetches_once_per_interval(self, monkeypatch):
+    security.load_jwks()
+    monkeypatch.setattr(security, "_jwks_fetched_at", time.monotonic() - security.JWKS_MIN_REFRESH_SECONDS - 1)
+    # rotated key appears on the next fetch
+    assert security.get_signing_key("b") == {"kid": "b"}
+    assert self.fetches == 2
+    # a key that does not exist is not refetched again right away
+    assert security.get_signing_key("c") is None
+    assert self.fetches == 2
+
+  def test_refetch_stays_off_the_cpu_pool(self, monkeypatch):
+    security.load_jwks()
+    monkeypatch.setattr(security, "_jwks_fetched_at", time.monotonic() - security.JWKS_MIN_REFRESH_SECONDS - 1)
+    pools = []
+    run = bulkheads.run
+
+    async def recording_run(name, func, *args, **kwargs):
+      pools.append((name, func.__name__))
+      return await run(name, func, *args, **kwargs)
+
+    monkeypatch.setattr(bulkheads, "run", recording_run)
+    monkeypatch.setattr(security, "decode_jwt", lambda token, key: {"sub": "auth0|doctor", "kid": key["kid"]})
+    token = jwt.encode({"sub": "auth0|doctor"}, "secret", headers={"kid": "b"})
+    user = anyio.run(security.get_current_user, token, None)
+    assert user["payload"]["kid"] == "b"
+    assert self.fetches == 2
+    # only the signature check takes a cpu slot; the refetch went to the default threadpool
+    assert pools == [("cpu", "<lambda>")]
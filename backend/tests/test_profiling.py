@@ -0,0 +1,38 @@
+import contextvars
+import threading
+import time
+
+from app.core import profiling
+from app.core.profiling import RequestProfile
+
+
+def busy_wait(seconds):
+  deadline = time.monotonic() + seconds
+  while time.monotonic() < deadline:
+    sum(range(100))
+
+
+class TestRequestProfile:
+  def test_samples_attached_threads_only(self):
+    profile = RequestProfile(interval=0.001)
+    token = profiling._current_profile.set(profile)
+    try:
+      profile.start()
+      # worker threads inherit the request context, as anyio's to_thread does
+      context = contextvars.copy_context()
+      worker = threading.Thread(target=context.run, args=(profiling.attached, busy_wait, 0.1))
+      worker.start()
+      worker.join()
+      profile.stop()
+    finally:
+      profiling._current_profile.reset(token)
+
+    assert profile.samples > 0
+    assert all("busy_wait" in stack for stack in profile.stacks)
+    line = profile.collapsed().splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert int(count) > 0
+    assert profile.summary().startswith(f"samples={profile.samples}")
+
+  def test_attached_without_profile_is_plain_call(self):
+    assert profiling.attached(sum, [1, 2, 3]) == 6
@@ -0,0 +1,149 @@
+import re
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.core.querycount import QueryDebugMiddleware, QueryLog, capture_queries, statement_shape
+
+PATIENT_ID = "auth0|patient0"
+SPARE_PATIENT_ID = "auth0|patient2"
+
+# (name, role, method, path, request kwargs, expected status, max statements)
+#
+# Budgets are the current counts. A route that needs more must say why in
+# the change that raises its budget. Writes to documents or to a doctor's
+# panel include one INSERT into change_log.
+ROUTES = [
+  # doctors.py
+  ("doctor_profile", "doctor", "GET", "/api/doctors/profile", {}, 200, 1),
+  ("doctor_update_profile", "doctor", "PUT", "/api/doctors/profile", {"data": {"phone": "555-0199"}}, 200, 3),
+  ("doctor_patients", "doctor", "GET", "/api/doctors/patients", {}, 200, 3),
+  ("doctor_patient_changes", "doctor", "GET", "/api/doctors/patients/changes", {}, 200, 3),
+  ("doctor_patient_changes_since", "doctor", "GET", "/api/doctors/patients/changes?since=0", {}, 200, 4),
+  ("doctor_export_patients", "doctor", "GET", "/api/doctors/patients/export", {}, 200, 2),
+  ("doctor_export_patients_ndjson", "doctor", "GET", "/api/doctors/patients/export?format=ndjson", {}, 200, 2),
+  ("doctor_patient", "doctor", "GET", "/api/doctors/patients/{patient_id}", {}, 200, 4),
+  ("doctor_update_patient", "doctor", "PUT", "/api/doctors/patients/{patient_id}", {"data": {"phone": "555-0142"}}, 200, 5),
+  ("doctor_unassign_patient", "doctor", "DELETE", "/api/doctors/patients/{spare_patient_id}", {}, 200, 4),
+  ("doctor_recent_documents", "doctor", "GET", "/api/doctors/documents/recent", {}, 200, 2),
+  ("doctor_recent_documents_filtered", "doctor", "GET",
+   "/api/doctors/documents/recent?patient_id={patient_id}&content_type=application/pdf", {}, 200, 2),
+  ("doctor_patient_documents", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents", {}, 200, 4),
+  ("doctor_patient_documents_fields", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents?fields=document_id,filename",
+   {}, 200, 4),
+  ("doctor_patient_document_changes", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents/changes", {},
+   200, 4),
+  ("doctor_patient_document_changes_since", "doctor", "GET",
+   "/api/doctors/patients/{patient_id}/documents/changes?since=0", {}, 200, 5),
+  ("doctor_export_documents", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents/export", {}, 200, 3),
+  ("doctor_upload_document", "doctor", "POST", "/api/doctors/patients/{patient_id}/documents/upload",
+   {"files": {"file": ("a.pdf", b"%PDF-1.4", "application/pdf")}}, 200, 6),
+  ("doctor_batch_upload_documents", "doctor", "POST", "/api/doctors/patients/{patient_id}/documents/batch-upload",
+   {"files": [("files", ("a.pdf", b"%PDF-1.4", "application/pdf"))]}, 200, 6),
+  ("doctor_patient_document", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents/{document_id}", {}, 200, 3),
+  ("doctor_update_document", "doctor", "PUT", "/api/doctors/patients/{patient_id}/documents/{document_id}",
+   {"data": {"description": "updated"}}, 200, 6),
+  ("doctor_delete_document", "doctor", "DELETE", "/api/doctors/patients/{patient_id}/documents/{document_id}", {}, 200, 5),
+  ("doctor_document_preview", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents/{document_id}/preview", {}, 200, 3),
+  ("doctor_document_download", "doctor", "GET", "/api/doctors/patients/{patient_id}/documents/{document_id}/download", {}, 200, 3),
+  # patients.py
+  ("patient_verify_details", "doctor", "POST", "/api/patients/verify-details",
+   {"json": {"email": "patient0@example.com", "first_name": "Pat", "last_name": "P0"}}, 200, 1),
+  ("patient_profile", "patient", "GET", "/api/patients/profile", {}, 200, 1),
+  ("patient_update_profile", "patient", "PUT", "/api/patients/profile", {"data": {"phone": "555-0123"}}, 200, 4),
+  ("patient_doctor", "patient", "GET", "/api/patients/doctor", {}, 200, 2),
+  ("patient_documents", "patient", "GET", "/api/patients/documents", {}, 200, 3),
+  ("patient_document_changes", "patient", "GET", "/api/patients/documents/changes", {}, 200, 3),
+  ("patient_document_changes_since", "patient", "GET", "/api/patients/documents/changes?since=0", {}, 200, 4),
+  ("patient_export_documents", "patient", "GET", "/api/patients/documents/export", {}, 200, 2),
+  ("patient_document", "patient", "GET", "/api/patients/documents/{document_id}", {}, 200, 2),
+  ("patient_document_preview", "patient", "GET", "/api/patients/documents/{document_id}/preview", {}, 200, 2),
+  ("patient_document_download", "patient", "GET", "/api/patients/documents/{document_id}/download", {}, 200, 2),
+  ("patient_record", "doctor", "GET", "/api/patients/{patient_id}", {}, 200, 2),
+]
+
+READ_ROUTES = [route for route in ROUTES if route[2] == "GET"]
+
+
+def _url(api, role, path):
+  getattr(api, f"as_{role}")()
+  return path.format(patient_id=PATIENT_ID, spare_patient_id=SPARE_PATIENT_ID, document_id=api.first_document_id())
+
+
+class TestQueryBudgets:
+  @pytest.mark.parametrize("name,role,method,path,kwargs,status,budget", ROUTES, ids=[r[0] for r in ROUTES])
+  def test_route_within_budget(self, api, assert_max_queries, name, role, method, path, kwargs, status, budget):
+    url = _url(api, role, path)
+    with assert_max_queries(budget) as log:
+      response = api.client.request(method, url, **kwargs)
+    assert response.status_code == status, response.text
+    assert log.repeated() == [], f"repeated statements:\n{log.report()}"
+
+  # more patients and documents must not mean more statements
+  @pytest.mark.parametrize("name,role,method,path,kwargs,status,budget", READ_ROUTES, ids=[r[0] for r in READ_ROUTES])
+  def test_count_independent_of_data_size(self, api, name, role, method, path, kwargs, status, budget):
+    url = _url(api, role, path)
+    with capture_queries() as small:
+      api.client.request(method, url, **kwargs)
+    api.add_patients(10, documents_per_patient=10, start=3)
+    with capture_queries() as large:
+      api.client.request(method, url, **kwargs)
+    assert large.count == small.count, f"{small.count} -> {large.count} queries:\n{large.report()}"
+
+
+# documents is hash-partitioned by patient_id on Postgres: a statement that
+# reads, updates or deletes documents without pinning patient_id visits every partition
+_DOCUMENTS_ACCESS = re.compile(r"\b(?:FROM|UPDATE)\s+documents\b", re.IGNORECASE)
+_PATIENT_PINNED = re.compile(r"\bWHERE\b.*(?:\bdocuments\.patient_id\s*(?:=|IN)|=\s*documents\.patient_id\b)",
+                             re.IGNORECASE | re.DOTALL)
+
+
+class TestPartitionPruning:
+  @pytest.mark.parametrize("name,role,method,path,kwargs,status,budget", ROUTES, ids=[r[0] for r in ROUTES])
+  def test_documents_statements_filter_on_patient(self, api, name, role, method, path, kwargs, status, budget):
+    url = _url(api, role, path)
+    with capture_queries() as log:
+      response = api.client.request(method, url, **kwargs)
+    assert response.status_code == status, response.text
+    unpinned = [s for s in log.statements if _DOCUMENTS_ACCESS.search(s) and not _PATIENT_PINNED.search(s)]
+    assert unpinned == [], "statements on documents without a patient_id filter:\n" + "\n".join(unpinned)
+
+
+class TestRepeatDetection:
+  def test_statement_shape(self):
+    assert statement_shape("SELECT * FROM t WHERE id = %(id_1)s AND x IN (%(x_1_1)s, %(x_1_2)s)") == \
+      "SELECT * FROM t WHERE id = ? AND x IN (?)"
+    assert statement_shape("SELECT *\n  FROM t WHERE id = ? AND x IN (?, ?, ?)") == \
+      "SELECT * FROM t WHERE id = ? AND x IN (?)"
+    assert statement_shape("SELECT 'a''b', 42") == "SELECT ?, ?"
+
+  def test_repeated(self):
+    log = QueryLog()
+    for i in range(3):
+      log.record(f"SELECT * FROM documents WHERE patient_id = '{i}'")
+    log.record("SELECT * FROM users")
+    assert log.repeated(3) == [("SELECT * FROM documents WHERE patient_id = ?", 3)]
+    assert log.repeated(4) == []
+
+  def test_middleware_flags_n_plus_one(self):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    app = FastAPI()
+    app.add_middleware(QueryDebugMiddleware, enabled=True, threshold=3)
+
+    @app.get("/loop/{n}")
+    def loop(n: int):
+      with engine.connect() as connection:
+        for i in range(n):
+          connection.execute(text("SELECT :i"), {"i": i})
+      return {}
+
+    client = TestClient(app)
+    r = client.get("/loop/2")
+    assert r.headers["x-query-count"] == "2"
+    assert "x-query-repeats" not in r.headers
+    r = client.get("/loop/5")
+    assert r.headers["x-query-count"] == "5"
+    assert r.headers["x-query-repeats"] == "1"
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects import postgresql
+
+from app.api.routes.doctors import _recent_documents_query
+from app.core.querycount import capture_queries
+from app.models.models import Document
+from app.services import audit
+from conftest import DOCTOR_ID, PATIENT_ID
+
+RECENT = "/api/doctors/documents/recent"
+
+
+def _spread_upload_times(api):
+  # one second apart in id order, plus a tie to exercise the id tie-breaker
+  db = api.session_factory()
+  try:
+    start = datetime(2026, 1, 1)
+    documents = db.query(Document).order_by(Document.id).all()
+    for n, document in enumerate(documents):
+      document.created_at = start + timedelta(seconds=min(n, len(documents) - 2))
+    db.commit()
+    return [d.id for d in reversed(documents)]
+  finally:
+    db.close()
+
+
+def _all_pages(api, **params):
+  seen, cursor = [], None
+  while True:
+    page = api.client.get(RECENT, params={**params, **({"cursor": cursor} if cursor else {})})
+    assert page.status_code == 200, page.text
+    body = page.json()
+    seen.extend(body["documents"])
+    cursor = body["next_cursor"]
+    if cursor is None:
+      return seen
+
+
+class TestRecentDocuments:
+  def test_newest_first_across_patients(self, api):
+    expected = _spread_upload_times(api)
+    api.as_doctor()
+    documents = _all_pages(api, limit=4)
+    assert [d["document_id"] for d in documents] == expected
+    assert len({d["patient_id"] for d in documents}) == 3
+    assert documents[0]["patient_first_name"] == "Pat"
+    assert documents[0]["patient_last_name"] == "P2"
+
+  def test_only_own_patients(self, api):
+    api.add_patients(1, doctor_id="auth0|other-doctor", start=3)
+    api.as_doctor()
+    assert {d["patient_id"] for d in _all_pages(api)} == {f"auth0|patient{n}" for n in range(3)}
+
+  def test_filters(self, api):
+    api.add_patients(1, documents_per_patient=2, start=3)
+    db = api.session_factory()
+    db.query(Document).filter(Document.patient_id == "auth0|patient3").update(
+      {"content_type": "image/png", "uploaded_by_id": "auth0|nurse"}
+    )
+    db.commit()
+    db.close()
+    api.as_doctor()
+    assert {d["patient_id"] for d in _all_pages(api, patient_id=PATIENT_ID)} == {PATIENT_ID}
+    assert len(_all_pages(api, content_type="image/png")) == 2
+    assert {d["uploaded_by_id"] for d in _all_pages(api, uploaded_by_id=DOCTOR_ID)} == {DOCTOR_ID}
+    assert len(_all_pages(api, uploaded_by_id=DOCTOR_ID)) == 9
+
+  def test_audits_each_listed_patient_once(self, api):
+    api.as_doctor()
+    api.client.get(RECENT)
+    events = list(audit.buffer.pending)
+    assert sorted(e["patient_id"] for e in events) == [f"auth0|patient{n}" for n in range(3)]
+    assert {e["action"] for e in events} == {audit.DOCUMENT_LIST}
+
+  def test_invalid_cursor(self, api):
+    api.as_doctor()
+    assert api.client.get(RECENT, params={"cursor": "nope"}).status_code == 400
+
+
+class TestRecentDocumentsQuery:
+  def test_one_statement_per_page_whatever_the_panel_size(self, api):
+    api.add_patients(20, documents_per_patient=4, start=3)
+    expected = _spread_upload_times(api)
+    api.as_doctor()
+    seen, cursor = [], None
+    for _ in range(len(expected)):
+      with capture_queries() as log:
+        response = api.client.get(RECENT, params={"limit": 7, **({"cursor": cursor} if cursor else {})})
+      assert response.status_code == 200, response.text
+      body = response.json()
+      # the doctor, then the page
+      assert log.count <= 2, log.report()
+      assert len([s for s in log.statements if "FROM documents" in s]) == 1, log.report()
+      seen.extend(body["documents"])
+      cursor = body["next_cursor"]
+      if cursor is None:
+        break
+    assert [d["document_id"] for d in seen] == expected
+
+  def test_postgres_reads_each_patient_through_a_bounded_lateral(self):
+    conditions = [
+      Document.content_type == "application/pdf",
+      tuple_(Document.created_at, Document.id) < tuple_(datetime(2026, 1, 1), 10),
+    ]
+    query = _recent_documents_query("postgresql", DOCTOR_ID, conditions, None, 51)
+    sql = " ".join(str(query.compile(dialect=postgresql.dialect())).split())
+    outer, _, rest = sql.partition("JOIN LATERAL (")
+    inner, _, tail = rest.partition(") AS latest ON true")
+    assert outer and inner and tail
+    # per patient: pinned to its partition, in index order, stopping after the page
+    assert "WHERE documents.patient_id = users.auth0_user_id" in inner
+    assert "documents.content_type" in inner and "(documents.created_at, documents.id) <" in inner
+    assert inner.endswith("ORDER BY documents.created_at DESC, documents.id DESC LIMIT %(param_3)s::INTEGER")
+    # then a merge of at most patients x limit rows
+    assert tail.strip().startswith("WHERE users.doctor_id =")
+    assert tail.endswith("ORDER BY latest.created_at DESC, latest.id DESC LIMIT %(param_4)s::INTEGER")
+
+  def test_patient_filter_narrows_the_patients(self):
+    query = _recent_documents_query("postgresql", DOCTOR_ID, [Document.patient_id == PATIENT_ID], PATIENT_ID, 51)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert "users.auth0_user_id = %(auth0_user_id_1)s" in sql
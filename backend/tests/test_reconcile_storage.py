@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+
+from app.core.querycount import capture_queries
+from app.jobs import reconcile_storage
+from app.jobs.reconcile_storage import find_orphans, iter_document_paths, reconcile
+from app.models.models import Document
+from conftest import PATIENT_ID
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+OLD = NOW - timedelta(days=1)
+
+
+class TestFindOrphans:
+  def test_merge_join(self):
+    stored = [("documents/a", OLD), ("documents/b", OLD), ("documents/c", OLD), ("documents/d", OLD)]
+    referenced = ["documents/a", "documents/c", "documents/c", "documents/zz"]
+    assert list(find_orphans(stored, referenced, NOW)) == ["documents/b", "documents/d"]
+
+  def test_no_references(self):
+    stored = [("documents/a", OLD), ("documents/b", OLD)]
+    assert list(find_orphans(stored, [], NOW)) == ["documents/a", "documents/b"]
+
+  def test_recent_objects_skipped(self):
+    stored = [("documents/a", NOW + timedelta(minutes=1)), ("documents/b", OLD)]
+    assert list(find_orphans(stored, [], NOW)) == ["documents/b"]
+
+  def test_consumes_lazily(self):
+    def stored():
+      for i in range(10 ** 9):
+        yield f"documents/{i:010d}", OLD
+    orphans = find_orphans(stored(), iter([]), NOW)
+    assert next(orphans) == "documents/0000000000"
+
+
+def _stored(storage, modified):
+  def list_files(bucket_name, prefix="", page_size=1000):
+    for key in sorted(storage.objects):
+      if key.startswith(prefix):
+        yield key, modified.get(key, OLD)
+  return list_files
+
+
+class TestDocumentPaths:
+  def test_sorted_across_batches_in_one_query(self, api):
+    db = api.session_factory()
+    try:
+      db.add(Document(filename="x.pdf", file_path="archive/x.pdf", content_type="application/pdf",
+                      patient_id=PATIENT_ID, uploaded_by_id=PATIENT_ID))
+      db.add(Document(filename="y.pdf", file_path="documents0/y.pdf", content_type="application/pdf",
+                      patient_id=PATIENT_ID, uploaded_by_id=PATIENT_ID))
+      db.commit()
+      expected = sorted(p for (p,) in db.query(Document.file_path) if p.startswith("documents/"))
+      assert len(expected) == 9
+      for batch_size in (1, 2, 4, 9, 100):
+        with capture_queries() as log:
+          assert list(iter_document_paths(db, "documents/", batch_size)) == expected
+        assert log.count == 1, log.report()
+    finally:
+      db.close()
+
+  def test_narrower_prefix(self, api):
+    db = api.session_factory()
+    try:
+      paths = list(iter_document_paths(db, "documents/auth0|patient1/", batch_size=2))
+    finally:
+      db.close()
+    assert paths == [f"documents/auth0|patient1/{k}.pdf" for k in range(3)]
+
+
+class TestReconcile:
+  def test_delete(self, api, monkeypatch):
+    for key in ("documents/auth0|patient0/orphan.pdf", "documents/zz/orphan.pdf", "documents/new.pdf"):
+      api.storage.put(key, b"left behind")
+    referenced = [key for key in api.storage.objects if not key.endswith("orphan.pdf") and key != "documents/new.pdf"]
+    # too recent: its Document insert may still be in flight
+    recent = {"documents/new.pdf": datetime.now(timezone.utc)}
+    monkeypatch.setattr(reconcile_storage, "list_files", _stored(api.storage, recent))
+
+    db = api.session_factory()
+    try:
+      lines = []
+      stats = reconcile(db, delete=True, batch_size=2, out=lines.append)
+    finally:
+      db.close()
+    assert stats == {"orphans": 2, "deleted": 2, "failed": 0}
+    assert lines == ["documents/auth0|patient0/orphan.pdf", "documents/zz/orphan.pdf"]
+    assert sorted(api.storage.objects) == sorted(referenced + ["documents/new.pdf"])
+
+  def test_dry_run_deletes_nothing(self, api, monkeypatch):
+    api.storage.put("documents/orphan.pdf", b"left behind")
+    before = set(api.storage.objects)
+    monkeypatch.setattr(reconcile_storage, "list_files", _stored(api.storage, {}))
+    db = api.session_factory()
+    try:
+      stats = reconcile(db, out=lambda line: None)
+    finally:
+      db.close()
+    assert stats == {"orphans": 1, "deleted": 0, "failed": 0}
+    assert set(api.storage.objects) == before
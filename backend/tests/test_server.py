@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from app.server import DEFAULT_BULKHEAD_THREADS, EVENT_LISTENER_CONNECTIONS, available_cpus, load_env_file, plan
+
+POSTGRES = {"DATABASE_URL": "postgresql://db/patientlink"}
+
+
+class TestPlan:
+  def test_workers_follow_cpus_within_limits(self):
+    assert plan(1, POSTGRES).workers == 2
+    assert plan(4, POSTGRES).workers == 4
+    assert plan(64, POSTGRES).workers == 8
+    assert plan(64, {**POSTGRES, "WEB_MAX_WORKERS": "16"}).workers == 16
+
+  def test_explicit_concurrency(self):
+    assert plan(64, {**POSTGRES, "WEB_CONCURRENCY": "3"}).workers == 3
+
+  @pytest.mark.parametrize("cpus", [1, 2, 4, 8, 32])
+  def test_connections_within_budget(self, cpus):
+    result = plan(cpus, {**POSTGRES, "DB_MAX_CONNECTIONS": "50"})
+    assert 0 < result.connections <= 50
+    assert result.pool_size >= 1
+
+  def test_small_budget_limits_workers(self):
+    result = plan(8, {**POSTGRES, "DB_MAX_CONNECTIONS": "6"})
+    assert result.workers == 2
+    assert result.pool_size + result.max_overflow + EVENT_LISTENER_CONNECTIONS == 3
+    assert (result.db_threads, result.storage_threads) == (1, 1)
+
+  @pytest.mark.parametrize("cpus, budget", [(1, 90), (8, 90), (9, 90), (4, 20), (64, 1000)])
+  def test_bulkheads_fit_in_the_pool(self, cpus, budget):
+    result = plan(cpus, {**POSTGRES, "WEB_MAX_WORKERS": "16", "DB_MAX_CONNECTIONS": str(budget)})
+    assert result.db_threads >= 1 and result.storage_threads >= 1
+    assert result.db_threads + result.storage_threads <= result.pool_size + result.max_overflow
+    assert result.threads_per_connection <= 1
+
+  def test_bulkheads_lowered_in_proportion(self):
+    result = plan(9, {**POSTGRES, "WEB_CONCURRENCY": "9", "DB_MAX_CONNECTIONS": "90"})
+    assert result.pool_size + result.max_overflow == 9
+    assert (result.db_threads, result.storage_threads) == (6, 3)
+
+  def test_bulkheads_kept_when_they_fit(self):
+    result = plan(2, {**POSTGRES, "DB_MAX_CONNECTIONS": "90"})
+    assert (result.db_threads, result.storage_threads) == (24, 8)
+
+  def test_default_threads_match_the_bulkheads(self):
+    from app.core.bulkheads import BULKHEAD_SIZES
+    assert {name: BULKHEAD_SIZES[name] for name in DEFAULT_BULKHEAD_THREADS} == DEFAULT_BULKHEAD_THREADS
+
+  def test_pinned_bulkheads_over_the_pool_refused(self):
+    env = {**POSTGRES, "WEB_CONCURRENCY": "9", "DB_MAX_CONNECTIONS": "90"}
+    with pytest.raises(ValueError, match="BULKHEAD_DB_THREADS"):
+      plan(9, {**env, "BULKHEAD_DB_THREADS": "24"})
+    result = plan(9, {**env, "BULKHEAD_DB_THREADS": "6", "BULKHEAD_STORAGE_THREADS": "3"})
+    assert (result.db_threads, result.storage_threads) == (6, 3)
+
+  def test_pinned_pool_checked_against_budget(self):
+    env = {**POSTGRES, "WEB_CONCURRENCY": "4", "DB_POOL_SIZE": "10", "DB_MAX_OVERFLOW": "10"}
+    with pytest.raises(ValueError, match="over DB_MAX_CONNECTIONS"):
+      plan(4, {**env, "DB_MAX_CONNECTIONS": "80"})
+    result = plan(4, {**env, "DB_MAX_CONNECTIONS": "84"})
+    assert (result.pool_size, result.max_overflow, result.connections) == (10, 10, 84)
+
+  def test_too_many_explicit_workers(self):
+    with pytest.raises(ValueError):
+      plan(4, {**POSTGRES, "WEB_CONCURRENCY": "20", "DB_MAX_CONNECTIONS": "20"})
+
+  def test_sqlite_not_budgeted(self):
+    result = plan(4, {"DATABASE_URL": "sqlite:///local.db", "DB_MAX_CONNECTIONS": "1"})
+    assert result.workers == 4 and result.connections == 0
+    assert (result.db_threads, result.storage_threads) == (24, 8)
+
+
+class TestEnvironment:
+  def test_env_file_does_not_override(self, tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("SERVER_TEST_SET=from-file\nSERVER_TEST_NEW=from-file\n")
+    monkeypatch.setenv("SERVER_TEST_SET", "from-environment")
+    monkeypatch.delenv("SERVER_TEST_NEW", raising=False)
+    try:
+      assert load_env_file(str(env_file))
+      assert os.environ["SERVER_TEST_SET"] == "from-environment"
+      assert os.environ["SERVER_TEST_NEW"] == "from-file"
+    finally:
+      os.environ.pop("SERVER_TEST_NEW", None)
+
+  def test_missing_env_file(self, tmp_path):
+    assert not load_env_file(str(tmp_path / "absent.env"))
+
+  def test_available_cpus(self):
+    assert available_cpus() >= 1
+
+
+class TestWorker:
+  # the draining worker leans on UvicornWorker internals: fail here, not in production
+  def test_private_worker_api_still_present(self):
+    pytest.importorskip("gunicorn")
+    pytest.importorskip("uvicorn")
+    import inspect
+    from app.server import PRIVATE_WORKER_API, _uvicorn_worker
+    UvicornWorker = _uvicorn_worker()
+    for name in PRIVATE_WORKER_API:
+      assert callable(getattr(UvicornWorker, name, None)), name
+    source = inspect.getsource(UvicornWorker._serve)
+    assert "Server(config=self.config)" in source and "self.wsgi" in source
+
+  def test_draining_worker_used_when_api_present(self):
+    pytest.importorskip("gunicorn")
+    pytest.importorskip("uvicorn")
+    from app.server import _worker_class
+    worker = _worker_class(5.0)
+    assert worker.__name__ == "DrainingWorker"
+    assert worker.CONFIG_KWARGS["timeout_graceful_shutdown"] == 5.0
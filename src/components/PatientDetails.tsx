@@ -4,12 +4,15 @@ import { Button } from "@/components/ui/button";
 import { getFullName } from "../utils/patientHelpers";
 import DocumentCard from "./DocumentCard";
 import {
-  getDoctorPatientDocuments,
+  getDoctorPatientDocumentChanges,
+  applyDocumentChanges,
   getDoctorPatientDocumentPreviewUrl,
+  openDocumentPreview,
   uploadDocuments,
   deleteDocument,
   type Document,
 } from "../services/documentService";
+import { subscribeToEvents } from "../services/eventService";
 
 interface PatientDetailsProps {
   patient: any;
@@ -22,22 +25,49 @@ export default function PatientDetails({ patient }: PatientDetailsProps) {
   const [uploading, setUploading] = useState(false);
   const [loading, setLoading] = useState(true);
   const fileInputRef = useRef<HTMLInputElement>(null);
+  // sync cursor for the loaded documents, null until the first full load
+  const documentsCursor = useRef<number | null>(null);
 
   useEffect(() => {
+    documentsCursor.current = null;
     loadDocuments();
   }, [patient.auth0_user_id]);
 
+  // fetch what changed whenever the server says this patient's documents did
+  useEffect(() => {
+    const controller = new AbortController();
+    subscribeToEvents(
+      getAccessTokenSilently,
+      (event) => {
+        if (
+          event.event === "ready" ||
+          event.event === "reset" ||
+          (event.event === "document" &&
+            event.data.patient_id === patient.auth0_user_id)
+        ) {
+          loadDocuments();
+        }
+      },
+      controller.signal
+    );
+    return () => controller.abort();
+  }, [patient.auth0_user_id, getAccessTokenSilently]);
+
   const loadDocuments = async () => {
     try {
       setLoading(true);
       const accessToken = await getAccessTokenSilently();
-      const fetchedDocuments = await getDoctorPatientDocuments(
+      // only what changed since the last load
+      const changes = await getDoctorPatientDocumentChanges(
         patient.auth0_user_id,
+        documentsCursor.current,
         accessToken
       );
-      setDocuments(fetchedDocuments);
+      setDocuments((current) => applyDocumentChanges(current, changes));
+      documentsCursor.current = changes.cursor;
     } catch (error) {
       console.error("Failed to load documents:", error);
+      documentsCursor.current = null;
       setDocuments([]);
     } finally {
       setLoading(false);
@@ -70,7 +100,13 @@ export default function PatientDetails({ patient }: PatientDetailsProps) {
       }
     } catch (error) {
       console.error("Failed to upload documents:", error);
-      alert("Failed to upload documents. Please try again.");
+      alert(
+        error instanceof Error
+          ? `${error.message}. Please try those files again.`
+          : "Failed to upload documents. Please try again."
+      );
+      // files that did upload in a partly failed batch were saved
+      await loadDocuments();
     } finally {
       setUploading(false);
     }
@@ -87,7 +123,7 @@ export default function PatientDetails({ patient }: PatientDetailsProps) {
       );
 
       // Open the document in a new tab for preview
-      window.open(response.url, "_blank");
+      await openDocumentPreview(response, accessToken);
     } catch (error) {
       console.error("Failed to get document URL:", error);
       alert("Failed to open document. Please try again.");
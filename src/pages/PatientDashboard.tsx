@@ -1,14 +1,17 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { useAuth0 } from "@auth0/auth0-react";
 import PatientSidebar from "../components/PatientSidebar";
 import PatientProfile from "../components/PatientProfile";
 import DocumentCard from "../components/DocumentCard";
 import { SidebarProvider, SidebarInset } from "@/components/ui/sidebar";
 import {
-  getPatientDocuments,
+  getPatientDocumentChanges,
   getPatientDocumentPreviewUrl,
+  openDocumentPreview,
+  applyDocumentChanges,
   type Document,
 } from "../services/documentService";
+import { subscribeToEvents } from "../services/eventService";
 import {
   getPatientProfile,
   type VerifiedPatient,
@@ -21,6 +24,8 @@ export default function PatientDashboard() {
   const [isLoadingDocuments, setIsLoadingDocuments] = useState(false);
   const [patientData, setPatientData] = useState<VerifiedPatient | null>(null);
   const [isLoadingProfile, setIsLoadingProfile] = useState(false);
+  // sync cursor for the loaded documents, null until the first full load
+  const documentsCursor = useRef<number | null>(null);
 
   const currentPatientId = user?.sub;
 
@@ -30,13 +35,16 @@ export default function PatientDashboard() {
     setIsLoadingDocuments(true);
     try {
       const accessToken = await getAccessTokenSilently();
-      const fetchedDocuments = await getPatientDocuments(
-        currentPatientId,
+      // only what changed since the last load
+      const changes = await getPatientDocumentChanges(
+        documentsCursor.current,
         accessToken
       );
-      setDocuments(fetchedDocuments);
+      setDocuments((current) => applyDocumentChanges(current, changes));
+      documentsCursor.current = changes.cursor;
     } catch (error) {
       console.error("Failed to load documents:", error);
+      documentsCursor.current = null;
       setDocuments([]);
     } finally {
       setIsLoadingDocuments(false);
@@ -67,6 +75,23 @@ export default function PatientDashboard() {
     }
   }, [currentPatientId, getAccessTokenSilently]);
 
+  // fetch what changed whenever the server says our documents did
+  useEffect(() => {
+    if (!currentPatientId) return;
+    const controller = new AbortController();
+    subscribeToEvents(
+      getAccessTokenSilently,
+      (event) => {
+        // "ready" also covers anything missed while disconnected
+        if (["ready", "reset", "document"].includes(event.event)) {
+          loadDocuments();
+        }
+      },
+      controller.signal
+    );
+    return () => controller.abort();
+  }, [currentPatientId, getAccessTokenSilently]);
+
   useEffect(() => {
     if (activeView === "overview" && currentPatientId) {
       loadDocuments();
@@ -87,7 +112,7 @@ export default function PatientDashboard() {
       );
 
       // Open the document in a new tab for preview
-      window.open(response.url, "_blank");
+      await openDocumentPreview(response, accessToken);
     } catch (error) {
       console.error("Failed to get document URL:", error);
       alert("Failed to open document. Please try again.");
@@ -9,6 +9,10 @@ export interface Document {
   patient_id?: string;
   uploaded_by_id: string;
   created_at: string;
+  size_bytes?: number | null;
+  sha256?: string | null;
+  detected_content_type?: string | null;
+  page_count?: number | null;
 }
 
 export interface PatientDocument {
@@ -17,6 +21,10 @@ export interface PatientDocument {
   description?: string;
   uploaded_by_id: string;
   created_at: string;
+  size_bytes?: number | null;
+  sha256?: string | null;
+  detected_content_type?: string | null;
+  page_count?: number | null;
 }
 
 // For patients to get their own documents
@@ -86,50 +94,180 @@ export const getDoctorPatientDocuments = async (
   }
 };
 
-export const uploadDocuments = async (
-  patientId: string,
-  files: FileList,
-  description: string,
-  accessToken: string
-): Promise<Document[]> => {
-  try {
-    const uploadedDocuments: Document[] = [];
+export interface DocumentChange {
+  op: "upsert" | "delete";
+  document_id: number;
+  document?: PatientDocument | null;
+}
 
-    // Upload files one by one since backend is going to be a single file upload
-    for (let i = 0; i < files.length; i++) {
-      const formData = new FormData();
-      formData.append("file", files[i]); // Backend expects "file" not "files"
-      formData.append("description", description);
+export interface DocumentChanges {
+  changes: DocumentChange[];
+  cursor: number;
+  has_more: boolean;
+  reset: boolean; // true: changes are the whole list, replace the local copy
+}
 
+// Fetch every change after `cursor` (the whole list when null), page by page
+const fetchDocumentChanges = async (
+  url: string,
+  cursor: number | null,
+  accessToken: string
+): Promise<DocumentChanges> => {
+  const result: DocumentChanges = {
+    changes: [],
+    cursor: cursor ?? 0,
+    has_more: false,
+    reset: cursor === null,
+  };
+  let since = cursor;
+  try {
+    for (;;) {
       const response = await fetch(
-        `${API_BASE_URL}/api/doctors/patients/${patientId}/documents/upload`,
+        since === null ? url : `${url}?since=${since}`,
         {
-          method: "POST",
           headers: {
             Authorization: `Bearer ${accessToken}`,
           },
-          body: formData,
         }
       );
 
+      // cursor too old, the server no longer has every change after it
+      if (response.status === 410 && since !== null) {
+        result.changes = [];
+        result.reset = true;
+        since = null;
+        continue;
+      }
+
       if (!response.ok) {
-        throw new Error(`Failed to upload documents: ${response.statusText}`);
+        throw new Error(
+          `Failed to fetch document changes: ${response.statusText}`
+        );
+      }
+
+      const page: DocumentChanges = await response.json();
+      result.changes.push(...page.changes);
+      result.cursor = page.cursor;
+      if (!page.has_more) {
+        return result;
+      }
+      since = page.cursor;
+    }
+  } catch (error) {
+    console.error("Fetch document changes error:", error);
+    throw error;
+  }
+};
+
+// For patients to sync their own documents
+export const getPatientDocumentChanges = (
+  cursor: number | null,
+  accessToken: string
+): Promise<DocumentChanges> =>
+  fetchDocumentChanges(
+    `${API_BASE_URL}/api/patients/documents/changes`,
+    cursor,
+    accessToken
+  );
+
+// For doctors to sync a patient's documents
+export const getDoctorPatientDocumentChanges = (
+  patientId: string,
+  cursor: number | null,
+  accessToken: string
+): Promise<DocumentChanges> =>
+  fetchDocumentChanges(
+    `${API_BASE_URL}/api/doctors/patients/${patientId}/documents/changes`,
+    cursor,
+    accessToken
+  );
+
+// Apply fetched changes to a local copy of a document list
+export const applyDocumentChanges = (
+  documents: Document[],
+  page: DocumentChanges
+): Document[] => {
+  const byId = new Map<number, Document>(
+    (page.reset ? [] : documents).map((doc): [number, Document] => [doc.id, doc])
+  );
+  for (const change of page.changes) {
+    if (change.op === "delete" || !change.document) {
+      byId.delete(change.document_id);
+    } else {
+      byId.set(change.document_id, {
+        id: change.document.document_id,
+        filename: change.document.filename,
+        description: change.document.description,
+        uploaded_by_id: change.document.uploaded_by_id,
+        created_at: change.document.created_at,
+      });
+    }
+  }
+  return Array.from(byId.values());
+};
+
+export interface BatchUploadResult {
+  filename: string;
+  status: "uploaded" | "failed";
+  document:
+    | (Omit<Document, "id" | "patient_id"> & { document_id: number })
+    | null;
+  error: string | null;
+}
+
+// All files go in one request; the backend stores them concurrently and
+// reports per file. Throws if any file failed, after the others were saved.
+export const uploadDocuments = async (
+  patientId: string,
+  files: FileList,
+  description: string,
+  accessToken: string
+): Promise<Document[]> => {
+  try {
+    const formData = new FormData();
+    for (let i = 0; i < files.length; i++) {
+      formData.append("files", files[i]);
+    }
+    formData.append("description", description);
+
+    const response = await fetch(
+      `${API_BASE_URL}/api/doctors/patients/${patientId}/documents/batch-upload`,
+      {
+        method: "POST",
+        headers: {
+          Authorization: `Bearer ${accessToken}`,
+        },
+        body: formData,
       }
+    );
 
-      const uploadedDoc = await response.json();
+    if (!response.ok) {
+      throw new Error(`Failed to upload documents: ${response.statusText}`);
+    }
+
+    const body: { results: BatchUploadResult[] } = await response.json();
 
+    const uploadedDocuments: Document[] = [];
+    const failed: string[] = [];
+    for (const result of body.results) {
+      if (result.status !== "uploaded" || !result.document) {
+        failed.push(`${result.filename}: ${result.error}`);
+        continue;
+      }
       // Map backend response to Document format
-      const mappedDoc: Document = {
-        id: uploadedDoc.document_id,
-        filename: uploadedDoc.filename,
-        file_path: uploadedDoc.file_path,
-        description: uploadedDoc.description,
-        created_at: uploadedDoc.created_at,
-        uploaded_by_id: uploadedDoc.uploaded_by_id || "",
+      uploadedDocuments.push({
+        id: result.document.document_id,
+        filename: result.document.filename,
+        file_path: result.document.file_path,
+        description: result.document.description,
+        created_at: result.document.created_at,
+        uploaded_by_id: result.document.uploaded_by_id || "",
         patient_id: patientId,
-      };
+      });
+    }
 
-      uploadedDocuments.push(mappedDoc);
+    if (failed.length > 0) {
+      throw new Error(`Failed to upload ${failed.join(", ")}`);
     }
 
     return uploadedDocuments;
@@ -139,12 +277,44 @@ export const uploadDocuments = async (
   }
 };
 
+// `direct` URLs are presigned storage links. Otherwise `url` is the API's
+// download route for an encrypted document, which needs the access token.
+export interface DocumentPreview {
+  url: string;
+  direct?: boolean;
+}
+
+export const openDocumentPreview = async (
+  preview: DocumentPreview,
+  accessToken: string
+): Promise<void> => {
+  if (preview.direct !== false) {
+    window.open(preview.url, "_blank");
+    return;
+  }
+
+  const response = await fetch(`${API_BASE_URL}${preview.url}`, {
+    headers: {
+      Authorization: `Bearer ${accessToken}`,
+    },
+  });
+
+  if (!response.ok) {
+    throw new Error(`Failed to open document: ${response.statusText}`);
+  }
+
+  const blobUrl = URL.createObjectURL(await response.blob());
+  window.open(blobUrl, "_blank");
+  // the new tab has its own reference by then
+  setTimeout(() => URL.revokeObjectURL(blobUrl), 60000);
+};
+
 // For doctors to get patient document preview URL
 export const getDoctorPatientDocumentPreviewUrl = async (
   patientId: string,
   documentId: string,
   accessToken: string
-): Promise<{ url: string }> => {
+): Promise<DocumentPreview> => {
   try {
     const response = await fetch(
       `${API_BASE_URL}/api/doctors/patients/${patientId}/documents/${documentId}/preview`,
@@ -170,7 +340,7 @@ export const getDoctorPatientDocumentPreviewUrl = async (
 export const getPatientDocumentPreviewUrl = async (
   documentId: string,
   accessToken: string
-): Promise<{ url: string }> => {
+): Promise<DocumentPreview> => {
   try {
     const response = await fetch(
       `${API_BASE_URL}/api/patients/documents/${documentId}/preview`,
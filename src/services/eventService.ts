@@ -0,0 +1,73 @@
+// Server-sent events for the signed-in user (document and patient panel changes)
+const API_BASE_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
+
+const RECONNECT_DELAY_MS = 5000;
+
+export interface ServerEvent {
+  event: "ready" | "reset" | "document" | "patient" | "error";
+  data: any;
+}
+
+// Parse complete "event:/data:" blocks out of the buffered text; returns the unparsed rest
+const parseEvents = (
+  buffer: string,
+  onEvent: (event: ServerEvent) => void
+): string => {
+  const blocks = buffer.split("\n\n");
+  const rest = blocks.pop() ?? "";
+  for (const block of blocks) {
+    let name = "";
+    let data = "";
+    for (const line of block.split("\n")) {
+      if (line.startsWith("event: ")) name = line.slice(7);
+      else if (line.startsWith("data: ")) data += line.slice(6);
+    }
+    if (name) {
+      onEvent({
+        event: name as ServerEvent["event"],
+        data: data ? JSON.parse(data) : {},
+      });
+    }
+  }
+  return rest;
+};
+
+// Keep an event stream open until `signal` aborts, reconnecting when it ends.
+// EventSource cannot send the Authorization header, so this reads the stream with fetch.
+export const subscribeToEvents = async (
+  getAccessToken: () => Promise<string>,
+  onEvent: (event: ServerEvent) => void,
+  signal: AbortSignal
+): Promise<void> => {
+  while (!signal.aborted) {
+    try {
+      const accessToken = await getAccessToken();
+      const response = await fetch(`${API_BASE_URL}/api/events/stream`, {
+        headers: {
+          Authorization: `Bearer ${accessToken}`,
+        },
+        signal,
+      });
+
+      if (!response.ok || !response.body) {
+        throw new Error(`Failed to open event stream: ${response.statusText}`);
+      }
+
+      const reader = response.body
+        .pipeThrough(new TextDecoderStream())
+        .getReader();
+      let buffer = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer = parseEvents(buffer + value, onEvent);
+      }
+    } catch (error) {
+      if (signal.aborted) return;
+      console.error("Event stream error:", error);
+    }
+
+    // the server ends streams after a while, on overload and on restarts
+    await new Promise((resolve) => setTimeout(resolve, RECONNECT_DELAY_MS));
+  }
+};